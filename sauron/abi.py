@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import time
+import struct
+import asks
+import logging
+import msgspec
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Callable, Optional
+from .types import *
+from .rpcstats import rpc_stats
+
+
+logger = logging.getLogger(__name__)
+
+
+NAME_CHARS = '.12345abcdefghijklmnopqrstuvwxyz'
+
+# block timestamps count half seconds from 2000-01-01
+BLOCK_EPOCH_MS = 946684800000
+
+
+@lru_cache(maxsize=4096)
+def name_to_str(value: int) -> str:
+    chars = []
+    for index in range(13):
+        chars.append(NAME_CHARS[value & (0x0f if index == 0 else 0x1f)])
+        value >>= 4 if index == 0 else 5
+    return ''.join(reversed(chars)).rstrip('.')
+
+
+def symbol_code_to_str(value: int) -> str:
+    return value.to_bytes(8, 'little').rstrip(b'\0').decode()
+
+
+def symbol_to_str(value: int) -> str:
+    return f'{value & 0xff},{symbol_code_to_str(value >> 8)}'
+
+
+def asset_to_str(value: tuple[int, int]) -> str:
+    amount, symbol = value
+    precision = symbol & 0xff
+    whole, fraction = divmod(abs(amount), 10 ** precision)
+    sign = '-' if amount < 0 else ''
+    number = f'{sign}{whole}.{fraction:0{precision}d}' if precision else f'{sign}{whole}'
+    return f'{number} {symbol_code_to_str(symbol >> 8)}'
+
+
+def format_ms(ms: int) -> str:
+    moment = datetime.fromtimestamp(ms // 1000, timezone.utc)
+    return f"{moment.strftime('%Y-%m-%dT%H:%M:%S')}.{ms % 1000:03d}"
+
+
+def read_varuint32(data: bytes, offset: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+def read_varint32(data: bytes, offset: int) -> tuple[int, int]:
+    value, offset = read_varuint32(data, offset)
+    return (value >> 1) ^ -(value & 1), offset
+
+
+def read_bytes(data: bytes, offset: int) -> tuple[bytes, int]:
+    size, offset = read_varuint32(data, offset)
+    return data[offset:offset + size], offset + size
+
+
+def read_string(data: bytes, offset: int) -> tuple[str, int]:
+    value, offset = read_bytes(data, offset)
+    return value.decode(), offset
+
+
+def read_hex(data: bytes, offset: int) -> tuple[str, int]:
+    value, offset = read_bytes(data, offset)
+    return value.hex(), offset
+
+
+def skip_public_key(data: bytes, offset: int) -> tuple[None, int]:
+    key_type = data[offset]
+    offset += 34
+    if key_type == 2:
+        # webauthn keys carry the user presence and the relying party id
+        _, offset = read_bytes(data, offset + 1)
+    return None, offset
+
+
+def skip_signature(data: bytes, offset: int) -> tuple[None, int]:
+    signature_type = data[offset]
+    offset += 66
+    if signature_type == 2:
+        _, offset = read_bytes(data, offset)
+        _, offset = read_bytes(data, offset)
+    return None, offset
+
+
+# abi type -> struct format and conversion of the unpacked value
+FIXED = {
+    'bool': ('?', None),
+    'int8': ('b', None),
+    'uint8': ('B', None),
+    'int16': ('h', None),
+    'uint16': ('H', None),
+    'int32': ('i', None),
+    'uint32': ('I', None),
+    'int64': ('q', None),
+    'uint64': ('Q', None),
+    'int128': ('16s', lambda value: int.from_bytes(value, 'little', signed=True)),
+    'uint128': ('16s', lambda value: int.from_bytes(value, 'little')),
+    'float32': ('f', None),
+    'float64': ('d', None),
+    'float128': ('16s', bytes.hex),
+    'name': ('Q', name_to_str),
+    'time_point': ('q', lambda value: format_ms(value // 1000)),
+    'time_point_sec': ('I', lambda value: format_ms(value * 1000)[:-4]),
+    'block_timestamp_type': ('I', lambda value: format_ms(value * 500 + BLOCK_EPOCH_MS)),
+    'symbol': ('Q', symbol_to_str),
+    'symbol_code': ('Q', symbol_code_to_str),
+    'asset': ('qQ', asset_to_str),
+    'checksum160': ('20s', bytes.hex),
+    'checksum256': ('32s', bytes.hex),
+    'checksum512': ('64s', bytes.hex),
+}
+
+VARIABLE = {
+    'string': read_string,
+    'bytes': read_hex,
+    'varuint32': read_varuint32,
+    'varint32': read_varint32,
+}
+
+# keys and signatures are only stepped over, they need base58 to print
+SKIPPED = {
+    'public_key': skip_public_key,
+    'signature': skip_signature,
+}
+
+
+def slots(layout: struct.Struct) -> int:
+    '''How many items `layout` unpacks to.'''
+    return len(layout.unpack(bytes(layout.size)))
+
+
+def fixed_step(layout: struct.Struct, fields: list[tuple[Optional[str], Optional[Callable], int]]):
+    '''Unpacks a run of fixed width fields with one `unpack_from`.'''
+    size = layout.size
+    unpack = layout.unpack_from
+
+    def step(data: bytes, offset: int, values: dict) -> int:
+        items = unpack(data, offset)
+        index = 0
+        for name, convert, width in fields:
+            if name is not None:
+                value = items[index] if width == 1 else items[index:index + width]
+                values[name] = convert(value) if convert else value
+            index += width
+        return offset + size
+
+    return step
+
+
+def variable_step(name: Optional[str], read: Callable):
+    def step(data: bytes, offset: int, values: dict) -> int:
+        value, offset = read(data, offset)
+        if name is not None:
+            values[name] = value
+        return offset
+
+    return step
+
+
+class AbiDecoder:
+    """Decodes raw table rows with the struct layouts of an ABI.
+
+    A table is compiled once per row type into a list of steps: runs of
+    fixed width fields are fused into a single `struct` unpack, strings,
+    arrays and other variable fields are read one by one. Only the fields
+    the row type declares are converted and decoding stops after the last
+    of them, so the tail of a row costs nothing.
+    """
+
+    def __init__(self, abi: dict):
+        # `get_abi` responses wrap the abi itself
+        abi = abi.get('abi', abi)
+        self.typedefs = {item['new_type_name']: item['type'] for item in abi.get('types', [])}
+        self.structs = {item['name']: item for item in abi.get('structs', [])}
+        self.variants = {item['name']: item['types'] for item in abi.get('variants', [])}
+        self.tables = {item['name']: item['type'] for item in abi.get('tables', [])}
+        self.compiled: dict[tuple[str, type], Callable[[bytes], Any]] = {}
+
+    @classmethod
+    def from_file(cls, path: str):
+        with open(path) as file:
+            return cls(json.load(file))
+
+    def resolve(self, type_name: str) -> str:
+        seen = set()
+        while type_name in self.typedefs and type_name not in seen:
+            seen.add(type_name)
+            type_name = self.typedefs[type_name]
+        return type_name
+
+    def fields(self, struct_name: str) -> list[tuple[str, str]]:
+        definition = self.structs[struct_name]
+        base = self.resolve(definition.get('base') or '')
+        fields = self.fields(base) if base else []
+        return fields + [(field['name'], field['type']) for field in definition['fields']]
+
+    def reader(self, type_name: str) -> Callable[[bytes, int], tuple[Any, int]]:
+        '''A `read(data, offset) -> (value, offset)` for any abi type.'''
+        if type_name.endswith('$'):
+            return self.reader(type_name[:-1])
+        if type_name.endswith('?'):
+            inner = self.reader(type_name[:-1])
+
+            def read_optional(data: bytes, offset: int):
+                if not data[offset]:
+                    return None, offset + 1
+                return inner(data, offset + 1)
+
+            return read_optional
+        if type_name.endswith('[]'):
+            inner = self.reader(type_name[:-2])
+
+            def read_array(data: bytes, offset: int):
+                count, offset = read_varuint32(data, offset)
+                items = []
+                for _ in range(count):
+                    item, offset = inner(data, offset)
+                    items.append(item)
+                return items, offset
+
+            return read_array
+        resolved = self.resolve(type_name)
+        if resolved in FIXED:
+            fmt, convert = FIXED[resolved]
+            layout = struct.Struct(f'<{fmt}')
+            width = slots(layout)
+
+            def read_fixed(data: bytes, offset: int):
+                items = layout.unpack_from(data, offset)
+                value = items[0] if width == 1 else items
+                return (convert(value) if convert else value), offset + layout.size
+
+            return read_fixed
+        if resolved in VARIABLE:
+            return VARIABLE[resolved]
+        if resolved in SKIPPED:
+            return SKIPPED[resolved]
+        if resolved in self.variants:
+            options = [(name, self.reader(name)) for name in self.variants[resolved]]
+
+            def read_variant(data: bytes, offset: int):
+                index, offset = read_varuint32(data, offset)
+                name, inner = options[index]
+                value, offset = inner(data, offset)
+                return [name, value], offset
+
+            return read_variant
+        if resolved in self.structs:
+            decode = self.compile_struct(resolved, dict)
+
+            def read_struct(data: bytes, offset: int):
+                return decode(data, offset)
+
+            return read_struct
+        raise ValueError(f'Unknown abi type {type_name}')
+
+    def compile_struct(self, struct_name: str, row_type: type = dict):
+        '''Compiles `struct_name` into `decode(data, offset) -> (row, offset)`.'''
+        fields = self.fields(struct_name)
+        if row_type is dict:
+            wanted = {name for name, _ in fields}
+        else:
+            wanted = set(row_type.__struct_fields__) & {name for name, _ in fields}
+        last = max((index for index, (name, _) in enumerate(fields) if name in wanted), default=-1)
+
+        steps: list[tuple[bool, Callable]] = []
+        formats: list[str] = []
+        run: list[tuple[Optional[str], Optional[Callable], int]] = []
+
+        def flush():
+            if run:
+                steps.append((False, fixed_step(struct.Struct('<' + ''.join(formats)), list(run))))
+                formats.clear()
+                run.clear()
+
+        for name, type_name in fields[:last + 1]:
+            keep = name if name in wanted else None
+            extension = type_name.endswith('$')
+            resolved = self.resolve(type_name.rstrip('$'))
+            if keep is not None and resolved in SKIPPED and row_type is not dict:
+                raise ValueError(f'{struct_name}.{name} is a {resolved}, it can not be decoded to {row_type.__name__}')
+            if resolved in FIXED and not extension:
+                fmt, convert = FIXED[resolved]
+                formats.append(fmt)
+                run.append((keep, convert, slots(struct.Struct(f'<{fmt}'))))
+                continue
+            flush()
+            steps.append((extension, variable_step(keep, self.reader(type_name))))
+        flush()
+
+        def decode(data: bytes, offset: int = 0):
+            values = {}
+            size = len(data)
+            for extension, step in steps:
+                if extension and offset >= size:
+                    # binary extensions are absent from older rows
+                    break
+                offset = step(data, offset, values)
+            return (values if row_type is dict else row_type(**values)), offset
+
+        return decode
+
+    def table_decoder(self, table: str, row_type: type = dict) -> Callable[[bytes], Any]:
+        '''Returns `decode(raw_row) -> row_type` for `table`, compiled once.'''
+        decoder = self.compiled.get((table, row_type))
+        if decoder is None:
+            if table not in self.tables:
+                raise ValueError(f'Table {table} is not in the abi')
+            decode = self.compile_struct(self.resolve(self.tables[table]), row_type)
+
+            def decoder(data: bytes):
+                return decode(data)[0]
+
+            self.compiled[(table, row_type)] = decoder
+        return decoder
+
+
+table_abis: dict[str, AbiDecoder] = {}
+
+# reads the cursor of a page, whatever its rows are
+cursor_decoder = msgspec.json.Decoder(TablePage[msgspec.Raw])
+
+
+def load_table_abi(abi_path: str) -> Optional[AbiDecoder]:
+    '''The decoder of the abi cached at `abi_path`, None until `get_abi`
+    wrote it.
+    '''
+    decoder = table_abis.get(abi_path)
+    if decoder is None:
+        try:
+            decoder = table_abis[abi_path] = AbiDecoder.from_file(abi_path)
+        except (OSError, ValueError) as e:
+            logger.warning('Reading tables as JSON, the abi at %s could not be loaded: %s', abi_path, e)
+            return None
+    return decoder
+
+
+def get_table_abi(config: Config) -> Optional[AbiDecoder]:
+    if not config.binary_tables:
+        return None
+    return load_table_abi(config.abi_path)
+
+
+def forget_table_abi(abi_path: str):
+    table_abis.pop(abi_path, None)
+
+
+async def fetch_table_pages(
+    url: str,
+    code: str,
+    scope: str,
+    table: str,
+    as_json: bool,
+    limit: int = 1000,
+) -> list[bytes]:
+    '''The raw `get_table_rows` bodies of a whole table.'''
+    pages = []
+    lower_bound = ''
+    while True:
+        response = await rpc_stats.call(
+            url,
+            'get_table_rows',
+            asks.post,
+            f'{url}/v1/chain/get_table_rows',
+            json={
+                'json': as_json,
+                'code': code,
+                'scope': scope,
+                'table': table,
+                'lower_bound': lower_bound,
+                'limit': limit,
+            },
+        )
+        pages.append(response.content)
+        page = cursor_decoder.decode(response.content)
+        if not page.more or not page.next_key or page.next_key == lower_bound:
+            return pages
+        lower_bound = page.next_key
+
+
+async def benchmark_table(
+    url: str,
+    abi: AbiDecoder,
+    table: str,
+    row_type: type,
+    rounds: int = 5,
+    code: str = 'eosio',
+    scope: str = 'eosio',
+) -> list[TableBenchmark]:
+    '''Times fetching and decoding `table` in json and binary mode, the
+    medians over `rounds`.
+    '''
+    json_decoder = msgspec.json.Decoder(TablePage[row_type], strict=False)
+    raw_decoder = msgspec.json.Decoder(TablePage[str])
+    decode_row = abi.table_decoder(table, row_type)
+
+    def decode_json(pages: list[bytes]) -> int:
+        return sum(len(json_decoder.decode(page).rows) for page in pages)
+
+    def decode_binary(pages: list[bytes]) -> int:
+        rows = 0
+        for page in pages:
+            for row in raw_decoder.decode(page).rows:
+                decode_row(bytes.fromhex(row))
+                rows += 1
+        return rows
+
+    results = []
+    for mode, as_json, decode in (('json', True, decode_json), ('binary', False, decode_binary)):
+        fetches, decodes = [], []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            pages = await fetch_table_pages(url, code, scope, table, as_json)
+            fetches.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            rows = decode(pages)
+            decodes.append((time.perf_counter() - start) * 1000)
+        results.append(TableBenchmark(
+            table=table,
+            mode=mode,
+            rows=rows,
+            bytes=sum(len(page) for page in pages),
+            fetch_ms=round(sorted(fetches)[len(fetches) // 2], 3),
+            decode_ms=round(sorted(decodes)[len(decodes) // 2], 3),
+        ))
+    return results
+
+
+async def fetch_abi(url: str, account: str = 'eosio') -> AbiDecoder:
+    response = await rpc_stats.call(
+        url,
+        'get_abi',
+        asks.post,
+        f'{url}/v1/chain/get_abi',
+        json={'account_name': account},
+    )
+    return AbiDecoder(msgspec.json.decode(response.content))
+
+
+async def benchmark_tables(config: Config, rounds: int = 5) -> list[TableBenchmark]:
+    '''Benchmarks the producers and payments tables, with the cached abi
+    or the one of the node when `get_abi` has not written it yet.
+    '''
+    abi = None
+    if os.path.exists(config.abi_path):
+        abi = load_table_abi(config.abi_path)
+    if abi is None:
+        abi = await fetch_abi(config.node_url)
+    results = []
+    for table, row_type in (('producers', ProducerRow), ('payments', PaymentRow)):
+        results += await benchmark_table(config.node_url, abi, table, row_type, rounds)
+    return results
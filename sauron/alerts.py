@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+import time
+from typing import Optional
+from .types import *
+
+
+PENDING = 'pending'
+FIRING = 'firing'
+ACKNOWLEDGED = 'acknowledged'
+RESOLVED = 'resolved'
+
+
+class AlertEntry:
+    """Tracked state of a single alert key."""
+    __slots__ = (
+        'key', 'state', 'alert', 'hits', 'clears', 'since', 'notified_at',
+        'escalated', 'acked_by'
+    )
+
+    def __init__(self, key: str, alert: Alert):
+        self.key = key
+        self.state = PENDING
+        self.alert = alert
+        self.hits = 0
+        self.clears = 0
+        self.since = None
+        self.notified_at = None
+        self.escalated = False
+        self.acked_by = None
+
+
+class AlertManager:
+    """Alert state machine with hysteresis, deduplication and escalation.
+
+    An alert key enters `firing` after `enter_after` consecutive cycles
+    with the condition present and is `resolved` after `exit_after`
+    consecutive cycles without it. Firing alerts ping `users` at most once
+    per `dedup_window` seconds, and `escalation_users` are added once an
+    alert has been firing for `escalate_after` seconds without an `/ack`.
+    Only tracked keys are visited, so each cycle is O(active alerts).
+    """
+
+    def __init__(
+        self,
+        users: list[str],
+        escalation_users: Optional[list[str]] = None,
+        enter_after: int = 1,
+        exit_after: int = 3,
+        dedup_window: float = 900,
+        escalate_after: float = 600,
+    ):
+        self.users = users
+        self.escalation_users = escalation_users or []
+        self.enter_after = max(enter_after, 1)
+        self.exit_after = max(exit_after, 1)
+        self.dedup_window = dedup_window
+        self.escalate_after = escalate_after
+        self.entries: dict[str, AlertEntry] = {}
+        self.last_notice = AlertNotice()
+
+    @classmethod
+    def from_config(cls, config: Config):
+        manager = cls([])
+        manager.reconfigure(config)
+        return manager
+
+    def reconfigure(self, config: Config):
+        '''Applies recipients and thresholds, tracked alerts are kept.'''
+        self.users = parse_users(config.users_alerted)
+        self.escalation_users = parse_users(config.users_escalated)
+        self.enter_after = max(config.alert_enter_after, 1)
+        self.exit_after = max(config.alert_exit_after, 1)
+        self.dedup_window = config.alert_dedup_window * 60
+        self.escalate_after = config.alert_escalate_after * 60
+
+    def update(self, alerts: list[Alert], now: Optional[float] = None) -> AlertNotice:
+        '''Advances the state machine one cycle with the alerts currently
+        present and returns who has to be pinged.
+        '''
+        if now is None:
+            now = time.time()
+
+        active = {alert.metric: alert for alert in alerts}
+        raised = []
+        resolved = []
+
+        for key, alert in active.items():
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = AlertEntry(key, alert)
+            entry.alert = alert
+            entry.hits += 1
+            entry.clears = 0
+            if entry.state == PENDING and entry.hits >= self.enter_after:
+                entry.state = FIRING
+                entry.since = now
+                raised.append(key)
+
+        for key, entry in list(self.entries.items()):
+            if key in active:
+                continue
+            entry.hits = 0
+            entry.clears += 1
+            if entry.state == PENDING:
+                del self.entries[key]
+            elif entry.clears >= self.exit_after:
+                entry.state = RESOLVED
+                resolved.append(key)
+                del self.entries[key]
+
+        users = []
+        notified = []
+        for entry in self.entries.values():
+            if entry.state != FIRING:
+                continue
+            recipients = []
+            if entry.notified_at is None or now - entry.notified_at >= self.dedup_window:
+                recipients += self.users
+            if now - entry.since >= self.escalate_after:
+                if not entry.escalated:
+                    entry.escalated = True
+                    recipients = self.users + self.escalation_users
+                elif recipients:
+                    recipients += self.escalation_users
+            if recipients:
+                entry.notified_at = now
+                notified.append(entry.key)
+                users += [user for user in recipients if user not in users]
+
+        self.last_notice = AlertNotice(users=users, raised=raised, resolved=resolved, notified=notified)
+        return self.last_notice
+
+    def acknowledge(self, user: str, key: Optional[str] = None) -> list[str]:
+        '''Acknowledges a firing alert, or all of them if `key` is None,
+        returns the acknowledged keys.
+        '''
+        acked = []
+        for entry in self.entries.values():
+            if entry.state != FIRING or (key is not None and entry.key != key):
+                continue
+            entry.state = ACKNOWLEDGED
+            entry.acked_by = user
+            acked.append(entry.key)
+        return acked
+
+    def active(self) -> list[AlertEntry]:
+        return [
+            entry for entry in self.entries.values()
+            if entry.state in (FIRING, ACKNOWLEDGED)
+        ]
+
+
+def parse_users(users: Optional[str]) -> list[str]:
+    if users is None:
+        return []
+    return [user.strip() for user in users.split(',') if user.strip()]
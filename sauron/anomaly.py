@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+import os
+import math
+import time
+from typing import Optional
+from .types import *
+
+
+DEFAULT_RULES = {
+    'cpu': MetricRule(),
+    'ram': MetricRule(),
+    # df reports whole percents, a single step between two samples is
+    # normal growth, only several percent a minute is a runaway writer
+    'disk': MetricRule(rate_max=5.0),
+}
+
+UNITS = {
+    'cpu': '%',
+    'ram': '%',
+    'disk': '%',
+}
+
+
+class MetricState:
+    """Online state of a single metric.
+
+    Keeps an EWMA baseline plus a fixed size ring buffer with running sums
+    for the rolling z-score, so every update is O(1) in time and memory.
+    """
+    __slots__ = (
+        'rule', 'count', 'ewma', 'ring', 'index', 'total', 'total_sq',
+        'last_value', 'last_time'
+    )
+
+    def __init__(self, rule: MetricRule):
+        self.rule = rule
+        self.count = 0
+        self.ewma = 0.0
+        self.ring = [0.0] * max(rule.window, 2)
+        self.index = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.last_value = None
+        self.last_time = None
+
+    def filled(self) -> int:
+        return min(self.count, len(self.ring))
+
+    def std(self) -> float:
+        n = self.filled()
+        if n < 2:
+            return 0.0
+        mean = self.total / n
+        return math.sqrt(max(self.total_sq / n - mean * mean, 0.0))
+
+    def push(self, value: float, now: float):
+        if self.count == 0:
+            self.ewma = value
+        else:
+            self.ewma += self.rule.alpha * (value - self.ewma)
+
+        if self.count >= len(self.ring):
+            old = self.ring[self.index]
+            self.total -= old
+            self.total_sq -= old * old
+        self.ring[self.index] = value
+        self.index = (self.index + 1) % len(self.ring)
+        self.total += value
+        self.total_sq += value * value
+
+        self.count += 1
+        self.last_value = value
+        self.last_time = now
+
+
+class AnomalyDetector:
+    """Streaming anomaly detector over the system metrics.
+
+    Every metric is checked against three rules: an absolute `limit`, a
+    z-score of the deviation from its EWMA baseline measured with the
+    rolling standard deviation, and a per minute rate of change. Each rule
+    yields a score, where 1 means the rule threshold was just reached.
+    """
+
+    def __init__(self, rules: Optional[dict[str, MetricRule]] = None):
+        self.rules = {**DEFAULT_RULES, **(rules or {})}
+        self.states = {
+            metric: MetricState(rule) for metric, rule in self.rules.items()
+        }
+
+    def update(self, metric: str, value: float, now: Optional[float] = None):
+        '''Feeds a sample of `metric` and returns an `Alert` if any rule
+        scored 1 or more, else None.
+        '''
+        state = self.states.get(metric)
+        if state is None:
+            return None
+        if now is None:
+            now = time.monotonic()
+
+        rule = state.rule
+        unit = UNITS.get(metric, '')
+        scores = []
+
+        if rule.limit is not None and rule.limit > 0:
+            scores.append((
+                'limit',
+                value / rule.limit,
+                f'{metric} {value:.2f} {unit} >= limit {rule.limit:.2f} {unit}'
+            ))
+
+        if state.count >= rule.warmup:
+            std = max(state.std(), rule.min_std)
+            z = (value - state.ewma) / std
+            scores.append((
+                'zscore',
+                abs(z) / rule.z_max,
+                f'{metric} z-score {z:+.2f} over baseline {state.ewma:.2f} ± {std:.2f} {unit}'
+            ))
+
+            if (rule.rate_max is not None and
+                state.last_time is not None and now > state.last_time):
+                rate = (value - state.last_value) * 60 / (now - state.last_time)
+                scores.append((
+                    'rate',
+                    abs(rate) / rule.rate_max,
+                    f'{metric} changing {rate:+.2f} {unit}/min, max {rule.rate_max:.2f} {unit}/min'
+                ))
+
+        state.push(value, now)
+
+        fired = [score for score in scores if score[1] >= 1]
+        if not fired:
+            return None
+        rule_name, score, _ = max(fired, key=lambda item: item[1])
+        return Alert(**{
+            'metric': metric,
+            'rule': rule_name,
+            'value': value,
+            'score': round(score, 2),
+            'reason': '; '.join(reason for _, _, reason in fired)
+        })
+
+    def evaluate(self, system: System, now: Optional[float] = None) -> list[Alert]:
+        alerts = []
+        for metric, value in system_metrics(system).items():
+            alert = self.update(metric, value, now)
+            if alert is not None:
+                alerts.append(alert)
+        return alerts
+
+
+def system_metrics(system: System) -> dict[str, float]:
+    '''Normalizes a `System` sample into percentages, cpu load is
+    expressed relative to the cores of the host the sample was taken on.
+    '''
+    # samples of older agents carry no core count
+    cores = system.cpu_cores or os.cpu_count() or 1
+    return {
+        'cpu': round(float(system.cpu_load.min_5) * 100 / cores, 2),
+        'ram': float(system.ram_usage.percent),
+        'disk': float(system.disk_usage.percent),
+    }
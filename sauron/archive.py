@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+
+import os
+import math
+import mmap
+import time
+import shutil
+import struct
+import bisect
+import logging
+import threading
+import msgspec
+import zstandard
+from datetime import datetime, timezone
+from typing import Callable, Iterator, Optional
+from .types import *
+
+
+logger = logging.getLogger(__name__)
+
+
+# native order, matching memoryview.cast('d') on read
+pack_value = struct.Struct('d').pack
+ITEM_SIZE = struct.calcsize('d')
+
+# every column is a float64, missing values are stored as NaN
+COLUMNS: dict[str, Callable[[System, Network, BlockProducer], float]] = {
+    'cpu_1': lambda system, network, bp: system.cpu_load.min_1,
+    'cpu_5': lambda system, network, bp: system.cpu_load.min_5,
+    'cpu_15': lambda system, network, bp: system.cpu_load.min_15,
+    'ram_percent': lambda system, network, bp: system.ram_usage.percent,
+    'ram_used_gb': lambda system, network, bp: system.ram_usage.used_gb,
+    'disk_percent': lambda system, network, bp: system.disk_usage.percent,
+    'disk_used_gb': lambda system, network, bp: system.disk_usage.used_gb,
+    'nodeos_up': lambda system, network, bp: float(system.nodeos_status == 'is running.'),
+    'ping': lambda system, network, bp: network.ping,
+    'down': lambda system, network, bp: network.down,
+    'up': lambda system, network, bp: network.up,
+    'total_votes': lambda system, network, bp: bp.total_votes,
+    'produced_blocks': lambda system, network, bp: bp.lifetime_produced_blocks,
+    'missed_blocks': lambda system, network, bp: bp.lifetime_missed_blocks,
+    'missed_bpr': lambda system, network, bp: bp.missed_blocks_per_rotation,
+    'unpaid_blocks': lambda system, network, bp: bp.unpaid_blocks,
+}
+
+cold_encoder = msgspec.msgpack.Encoder()
+cold_decoder = msgspec.msgpack.Decoder(dict[str, bytes])
+
+
+def segment_name(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d')
+
+
+class Segment:
+    """One day of samples, each column viewed as a float64 memoryview.
+
+    Hot segments are directories of `<column>.f64` files that are memory
+    mapped, cold ones a zstd compressed msgpack map of the column bytes.
+    Views are only valid until `close`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.maps: list[mmap.mmap] = []
+        self.views: dict[str, memoryview] = {}
+        self.blob: Optional[dict[str, bytes]] = None
+        if path.endswith('.zst'):
+            with open(path, 'rb') as file:
+                self.blob = cold_decoder.decode(zstandard.ZstdDecompressor().decompress(file.read()))
+        self.rows = self._rows()
+
+    def _size(self, column: str) -> int:
+        if self.blob is not None:
+            return len(self.blob.get(column, b''))
+        try:
+            return os.path.getsize(os.path.join(self.path, f'{column}.f64'))
+        except OSError:
+            return 0
+
+    def _rows(self) -> int:
+        # a crash between column writes leaves a partial row, ignore it
+        return min(self._size(column) for column in ('ts', *COLUMNS)) // ITEM_SIZE
+
+    def column(self, name: str) -> memoryview:
+        view = self.views.get(name)
+        if view is not None:
+            return view
+        if name != 'ts' and name not in COLUMNS:
+            raise KeyError(f'Unknown column {name}')
+        size = self.rows * ITEM_SIZE
+        if size == 0:
+            raw = memoryview(b'')
+        elif self.blob is not None:
+            raw = memoryview(self.blob[name])[:size]
+        else:
+            with open(os.path.join(self.path, f'{name}.f64'), 'rb') as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps.append(mapped)
+            raw = memoryview(mapped)[:size]
+        view = self.views[name] = raw.cast('d')
+        raw.release()
+        return view
+
+    def close(self):
+        for view in self.views.values():
+            view.release()
+        self.views = {}
+        for mapped in self.maps:
+            mapped.close()
+        self.maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MetricArchive:
+    """Append-only columnar archive of the per-cycle metrics.
+
+    Samples go to a segment per UTC day, one fixed width float64 file per
+    column, so a range scan only maps the columns it reads and bisects
+    the sorted `ts` column. Segments older than `hot_days` are compressed
+    when a new day starts.
+    """
+
+    def __init__(self, path: str, hot_days: int = 2):
+        self.path = path
+        self.hot_days = hot_days
+        self.current: Optional[str] = None
+        self.files: dict[str, object] = {}
+        # compression replaces segment directories, readers map under it
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config: Config):
+        return cls(config.archive_dir, config.archive_hot_days)
+
+    def append(self, system: System, network: Network, bp_status: BlockProducer, ts: Optional[float] = None):
+        ts = time.time() if ts is None else ts
+        name = segment_name(ts)
+        if name != self.current:
+            self._roll(name)
+        values = {'ts': ts}
+        for column, extract in COLUMNS.items():
+            value = extract(system, network, bp_status)
+            values[column] = math.nan if value is None else float(value)
+        for column, value in values.items():
+            self.files[column].write(pack_value(value))
+        for file in self.files.values():
+            file.flush()
+
+    def _roll(self, name: str):
+        self.close()
+        directory = os.path.join(self.path, name)
+        os.makedirs(directory, exist_ok=True)
+        # realign the columns after a partial write before appending
+        rows = Segment(directory).rows
+        for column in ('ts', *COLUMNS):
+            path = os.path.join(directory, f'{column}.f64')
+            if os.path.exists(path) and os.path.getsize(path) > rows * ITEM_SIZE:
+                os.truncate(path, rows * ITEM_SIZE)
+        self.files = {
+            column: open(os.path.join(directory, f'{column}.f64'), 'ab')
+            for column in ('ts', *COLUMNS)
+        }
+        self.current = name
+        self.compress_cold(name)
+
+    def compress_cold(self, today: str):
+        '''Compresses hot segments more than `hot_days` before `today`.'''
+        hot = sorted(name for name in self.segments() if not name.endswith('.zst'))
+        cutoff = datetime.strptime(today, '%Y-%m-%d').toordinal() - self.hot_days
+        for name in hot:
+            if datetime.strptime(name, '%Y-%m-%d').toordinal() > cutoff:
+                continue
+            directory = os.path.join(self.path, name)
+            with Segment(directory) as segment:
+                blob = {
+                    column: bytes(segment.column(column))
+                    for column in ('ts', *COLUMNS)
+                }
+            with open(f'{directory}.zst.tmp', 'wb') as file:
+                file.write(zstandard.ZstdCompressor(level=10).compress(cold_encoder.encode(blob)))
+            with self.lock:
+                os.replace(f'{directory}.zst.tmp', f'{directory}.zst')
+                shutil.rmtree(directory)
+            logger.info('Compressed archive segment %s', name)
+
+    def segments(self) -> list[str]:
+        return sorted(
+            name for name in os.listdir(self.path)
+            if len(name.split('.')[0]) == 10 and not name.endswith('.tmp')
+        )
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+        self.files = {}
+        self.current = None
+
+    def scan(self, column: str, start: float, end: float) -> Iterator[tuple[memoryview, memoryview]]:
+        '''Yields `(ts, values)` views of `column` for every segment
+        overlapping `[start, end)`, the views are released once the
+        iteration moves to the next segment.
+        '''
+        if column not in COLUMNS:
+            raise KeyError(f'Unknown column {column}')
+        first, last = segment_name(start), segment_name(end)
+        with self.lock:
+            names = [
+                name for name in self.segments()
+                if first <= name.split('.')[0] <= last
+            ]
+        for name in names:
+            with self.lock:
+                path = os.path.join(self.path, name)
+                if not os.path.exists(path):
+                    path = f"{os.path.join(self.path, name.split('.')[0])}.zst"
+                segment = Segment(path)
+                ts, values = segment.column('ts'), segment.column(column)
+            with segment:
+                lo = bisect.bisect_left(ts, start)
+                hi = bisect.bisect_left(ts, end)
+                if lo < hi:
+                    parts = ts[lo:hi], values[lo:hi]
+                    try:
+                        yield parts
+                    finally:
+                        # the maps can't close while slices are exported
+                        for part in parts:
+                            part.release()
+
+    def window(self, column: str, start: float, end: float) -> WindowAggregate:
+        count = 0
+        total = 0.0
+        low = math.inf
+        high = -math.inf
+        last = None
+        for _, values in self.scan(column, start, end):
+            present = [value for value in values if not math.isnan(value)]
+            if not present:
+                continue
+            count += len(present)
+            total += math.fsum(present)
+            low = min(low, min(present))
+            high = max(high, max(present))
+            last = present[-1]
+        if count == 0:
+            return WindowAggregate(column=column, start=start, end=end)
+        return WindowAggregate(
+            column=column,
+            start=start,
+            end=end,
+            count=count,
+            min=low,
+            max=high,
+            mean=total / count,
+            last=last,
+        )
+
+    def downsample(self, column: str, start: float, end: float, step: float) -> list[tuple[float, float]]:
+        '''Mean of `column` per `step` seconds bucket, empty buckets are
+        skipped.
+        '''
+        buckets: dict[int, list[float]] = {}
+        for ts, values in self.scan(column, start, end):
+            for moment, value in zip(ts, values):
+                if not math.isnan(value):
+                    bucket = buckets.setdefault(int((moment - start) // step), [0.0, 0])
+                    bucket[0] += value
+                    bucket[1] += 1
+        return [
+            (start + index * step, total / count)
+            for index, (total, count) in sorted(buckets.items())
+        ]
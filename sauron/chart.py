@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+import re
+import time
+import zlib
+import struct
+import asyncio
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from .types import *
+from .archive import MetricArchive
+from .rpcstats import RpcStats, rpc_stats
+
+
+logger = logging.getLogger(__name__)
+
+
+# chart names to archive columns, `rpc` is the p99 of the rpc stats
+METRICS = {
+    'cpu': 'cpu_5',
+    'ram': 'ram_percent',
+    'disk': 'disk_percent',
+    'missed': 'missed_bpr',
+    'votes': 'total_votes',
+    'rpc': None,
+}
+
+WINDOW_UNITS = {'m': 60, 'h': 3600, 'd': 24 * 3600}
+MAX_WINDOW = 30 * 24 * 3600
+
+# points per chart, downsampled from the archive
+RESOLUTION = 240
+
+WIDTH = 720
+HEIGHT = 320
+MARGIN = 12
+
+BACKGROUND = bytes((255, 255, 255))
+GRID = bytes((226, 230, 236))
+LINE = bytes((33, 102, 172))
+FILL = bytes((209, 226, 243))
+
+
+def parse_window(text: str) -> float:
+    '''`30m`, `6h` or `7d` in seconds.'''
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([mhd])', text.strip().lower())
+    if match is None:
+        raise ValueError(f'Window must look like 30m, 6h or 7d, got {text}')
+    seconds = float(match.group(1)) * WINDOW_UNITS[match.group(2)]
+    if not 0 < seconds <= MAX_WINDOW:
+        raise ValueError(f'Window must be between 1m and 30d, got {text}')
+    return seconds
+
+
+def encode_png(width: int, height: int, pixels: bytearray) -> bytes:
+    '''8 bit RGB png of `pixels`, rows top to bottom.'''
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    stride = width * 3
+    raw = b''.join(
+        b'\x00' + bytes(pixels[y * stride:(y + 1) * stride])
+        for y in range(height)
+    )
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(raw, 6))
+        + chunk(b'IEND', b'')
+    )
+
+
+def render_chart(points: list[tuple[float, float]], width: int = WIDTH, height: int = HEIGHT) -> bytes:
+    '''Area chart of `(ts, value)` points as png bytes. Gaps longer than
+    three times the median spacing are left blank. Runs in the chart
+    process pool, so it only takes and returns plain values.
+    '''
+    pixels = bytearray(BACKGROUND * (width * height))
+
+    def paint(x: int, y: int, color: bytes):
+        i = (y * width + x) * 3
+        pixels[i:i + 3] = color
+
+    left, right = MARGIN, width - MARGIN - 1
+    top, bottom = MARGIN, height - MARGIN - 1
+    for i in range(5):
+        y = top + (bottom - top) * i // 4
+        for x in range(left, right + 1):
+            paint(x, y, GRID)
+
+    if not points:
+        return encode_png(width, height, pixels)
+    start, end = points[0][0], points[-1][0]
+    low = min(value for _, value in points)
+    high = max(value for _, value in points)
+    if high == low:
+        low, high = low - 1, high + 1
+    spacing = sorted(b[0] - a[0] for a, b in zip(points, points[1:]))
+    gap = 3 * spacing[len(spacing) // 2] if spacing else 0
+
+    def to_x(ts: float) -> float:
+        return left + (ts - start) / ((end - start) or 1) * (right - left)
+
+    def to_y(value: float) -> int:
+        return round(bottom - (value - low) / (high - low) * (bottom - top))
+
+    columns: dict[int, int] = {}
+    for (ts_a, value_a), (ts_b, value_b) in zip(points, points[1:]):
+        if ts_b - ts_a > gap:
+            continue
+        x_a, x_b = to_x(ts_a), to_x(ts_b)
+        for x in range(round(x_a), round(x_b) + 1):
+            share = (x - x_a) / ((x_b - x_a) or 1)
+            columns[x] = to_y(value_a + (value_b - value_a) * min(max(share, 0), 1))
+    if len(points) == 1 or not columns:
+        columns = {round(to_x(ts)): to_y(value) for ts, value in points}
+
+    previous = None
+    for x in sorted(columns):
+        y = columns[x]
+        for fill_y in range(y + 1, bottom + 1):
+            paint(x, fill_y, FILL)
+        # join steep segments with a vertical run, 2 px thick
+        span = (y, y) if previous is None or x - previous[0] > 1 else sorted((y, previous[1]))
+        for line_y in range(span[0], span[1] + 1):
+            paint(x, line_y, LINE)
+            paint(x, max(line_y - 1, top), LINE)
+        previous = (x, y)
+    return encode_png(width, height, pixels)
+
+
+class ChartRenderer:
+    """Renders metric charts in a process pool and caches the png of
+    every `(metric, window, version)`, the version being the status
+    snapshot the data was archived with. Concurrent requests for the same
+    chart share one render.
+    """
+
+    def __init__(
+        self,
+        archive: Optional[MetricArchive],
+        stats: RpcStats = rpc_stats,
+        workers: int = 1,
+        cache_size: int = 32,
+    ):
+        self.archive = archive
+        self.stats = stats
+        self.workers = workers
+        self.cache_size = cache_size
+        self.cache: OrderedDict[tuple[str, float, int], asyncio.Task] = OrderedDict()
+        self.pool: Optional[ProcessPoolExecutor] = None
+
+    def points(self, metric: str, window: float, now: Optional[float] = None) -> list[tuple[float, float]]:
+        if metric not in METRICS:
+            raise KeyError(f'Unknown metric {metric}')
+        if now is None:
+            now = time.time()
+        if METRICS[metric] is None:
+            return [point for point in self.stats.series(0.99, now) if point[0] >= now - window]
+        if self.archive is None:
+            return []
+        return self.archive.downsample(
+            METRICS[metric], now - window, now, max(window / RESOLUTION, 60))
+
+    async def render(self, metric: str, window: float, version: int) -> tuple[bytes, list[tuple[float, float]]]:
+        '''Returns the png and the points it was drawn from.'''
+        key = (metric, window, version)
+        task = self.cache.get(key)
+        if task is None:
+            task = self.cache[key] = asyncio.create_task(self._render(metric, window))
+            task.add_done_callback(lambda done: self._rendered(key, done))
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        return await asyncio.shield(task)
+
+    async def _render(self, metric: str, window: float) -> tuple[bytes, list[tuple[float, float]]]:
+        points = await asyncio.to_thread(self.points, metric, window)
+        if self.pool is None:
+            # spawn, forking the threaded bot process is unsafe
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        pool = self.pool
+        try:
+            png = await asyncio.get_running_loop().run_in_executor(pool, render_chart, points)
+        except BrokenProcessPool:
+            # a dead worker breaks the pool for good, the next render starts a new one
+            if self.pool is pool:
+                self.pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        return png, points
+
+    def _rendered(self, key: tuple[str, float, int], task: asyncio.Task):
+        if task.cancelled() or task.exception() is not None:
+            # failures are not cached
+            if self.cache.get(key) is task:
+                del self.cache[key]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+import logging
+import time
+import asyncio
+from typing import Callable
+from datetime import datetime, timezone
+from collections import deque
+from .types import *
+
+
+logger = logging.getLogger(__name__)
+
+
+CLAIM_INTERVAL = 24 * 60 * 60
+
+# connection failures and timeouts, the errors of requests derive from
+# OSError too. A transaction the chain rejected fails the same way again.
+TRANSPORT_ERRORS = (OSError,)
+
+# a claim the chain rejected is tried again at the next hourly check
+RECHECK_INTERVAL = 60 * 60
+
+
+class ClaimScheduler:
+    """Background `claimrewards` scheduler.
+
+    Reads the last claim time of the producer, sleeps until the 24h
+    window opens and claims through the transaction pipeline, retrying
+    transport errors with exponential backoff. Runs as its own task so it
+    never delays the status notifications. The lock is only held while
+    pushing, a manual claim does not wait out the backoff of another. A
+    claim the chain rejected is logged once and not pushed again before
+    the next hourly check.
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        producer_name: str,
+        fetch_last_claim: Callable[[], float],
+        interval: float = CLAIM_INTERVAL,
+        retries: int = 5,
+        backoff: float = 30,
+        history_size: int = 90,
+    ):
+        self.pipeline = pipeline
+        self.producer_name = producer_name
+        self.fetch_last_claim = fetch_last_claim
+        self.interval = interval
+        self.retries = retries
+        self.backoff = backoff
+        self.history: deque[ClaimRecord] = deque(maxlen=history_size)
+        self.last_claim = 0.0
+        # the last claim time the chain rejected a claim at
+        self.rejected: float | None = None
+        self._lock = asyncio.Lock()
+
+    async def next_claim_in(self) -> float:
+        last_claim = await asyncio.to_thread(self.fetch_last_claim)
+        self.last_claim = max(self.last_claim, last_claim)
+        return max(self.last_claim + self.interval - time.time(), 0)
+
+    async def claim(self) -> ClaimRecord:
+        claimed = self.last_claim
+        ex = None
+        for attempt in range(1, self.retries + 1):
+            async with self._lock:
+                if self.last_claim > claimed and self.history:
+                    # claimed by someone else while we were backing off
+                    return self.history[0]
+                try:
+                    res = await self.pipeline.push('claimrewards')
+                except TRANSPORT_ERRORS as e:
+                    ex = e
+                    logger.warning('Claim attempt %d failed: %s', attempt, e, extra={'attempt': attempt})
+                else:
+                    return self.record(res, attempt)
+            if attempt < self.retries:
+                await asyncio.sleep(min(self.backoff * 2 ** (attempt - 1), 3600))
+        raise ex
+
+    def record(self, res: TxResult, attempts: int) -> ClaimRecord:
+        self.last_claim = time.time()
+        record = ClaimRecord(**{
+            'claimed_at': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+            'quantity': get_claimed_quantity(res.response, self.producer_name),
+            'transaction_id': res.transaction_id,
+            'latency_ms': res.latency_ms,
+            'attempts': attempts,
+        })
+        self.history.appendleft(record)
+        return record
+
+    async def run(self):
+        while True:
+            try:
+                delay = await self.next_claim_in()
+                if delay > 0:
+                    # re-check at least hourly in case someone claimed by hand
+                    await asyncio.sleep(min(delay, RECHECK_INTERVAL))
+                    continue
+                try:
+                    await self.claim()
+                except TRANSPORT_ERRORS:
+                    raise
+                except Exception as e:
+                    if self.rejected != self.last_claim:
+                        self.rejected = self.last_claim
+                        logger.exception('The chain rejected the rewards claim: %s', e)
+                    else:
+                        logger.debug('The chain rejected the rewards claim again: %s', e)
+                    # pushing it again fails the same way until something changes
+                    await asyncio.sleep(RECHECK_INTERVAL)
+            except Exception as e:
+                logger.exception('An exception occurred while claiming rewards: %s', e)
+                await asyncio.sleep(self.backoff)
+
+
+def parse_time_point(value: str) -> float:
+    '''Parses an eosio `time_point` string (UTC without offset).'''
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+
+
+def get_claimed_quantity(res: dict, producer_name: str) -> str:
+    '''Sums the token transfers to `producer_name` in a `claimrewards`
+    trace, tolerating missing or reshaped trace fields.
+    '''
+    total = 0
+    symbol = 'TLOS'
+    traces = list((res.get('processed') or {}).get('action_traces') or [])
+    while traces:
+        trace = traces.pop()
+        traces += trace.get('inline_traces') or []
+        act = trace.get('act') or {}
+        data = act.get('data')
+        if (act.get('name') != 'transfer' or
+            not isinstance(data, dict) or
+            data.get('to') != producer_name or
+            trace.get('receiver', act.get('account')) != act.get('account')):
+            continue
+        try:
+            amount, symbol = data['quantity'].split()
+            total += int(amount.replace('.', ''))
+        except (KeyError, ValueError):
+            continue
+    return f'{total // 10000}.{total % 10000:04d} {symbol}'
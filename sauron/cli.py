@@ -2,8 +2,6 @@
 
 import click
 
-from .telegram import launch_telegram
-
 
 @click.group()
 def sauron(*args, **kwargs):
@@ -12,6 +10,107 @@ def sauron(*args, **kwargs):
 @sauron.command()
 @click.argument('filename', type=click.Path(exists=True))
 def telegram(filename):
+    from .telegram import launch_telegram
     launch_telegram(filename)
 
 
+@sauron.command()
+@click.argument('url')
+@click.option('--host', default=None, help='Host name reported, defaults to the hostname.')
+@click.option('--token', default='', help='Shared fleet token.')
+@click.option('--interval', default=15.0, help='Seconds between samples.')
+@click.option('--batch-size', default=4, help='Samples per push.')
+def agent(url, host, token, interval, batch_size):
+    from .fleet import launch_agent
+    launch_agent(url, host, token, interval, batch_size)
+
+
+@sauron.command()
+@click.argument('filename', type=click.Path(exists=True))
+@click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON.')
+@click.option('--deadline', default=10.0, help='Seconds before unanswered sections are reported as errors.')
+def status(filename, as_json, deadline):
+    '''One-shot status, exits 0 ok, 1 warning, 2 critical or 3 unknown.'''
+    import os
+    import sys
+    import asyncio
+    import msgspec
+    from .service import get_config
+    from .probe import collect_status, get_summary
+    report = asyncio.run(collect_status(get_config(filename), deadline))
+    click.echo(msgspec.json.encode(report).decode() if as_json else get_summary(report))
+    sys.stdout.flush()
+    # calls stuck past the deadline must not keep the process alive
+    os._exit(report.exit_code)
+
+
+@sauron.command()
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.argument('column')
+@click.option('--hours', default=24.0, help='Window ending now, in hours.')
+@click.option('--step', default=None, type=float, help='Downsample to the mean per STEP seconds.')
+def archive(directory, column, hours, step):
+    '''Window aggregate of an archived metric, as JSON.'''
+    import time
+    import msgspec
+    from .archive import COLUMNS, MetricArchive
+    if column not in COLUMNS:
+        raise click.BadParameter(f"one of {', '.join(COLUMNS)}", param_hint='COLUMN')
+    end = time.time()
+    start = end - hours * 3600
+    metric_archive = MetricArchive(directory)
+    result = {'window': metric_archive.window(column, start, end)}
+    if step:
+        result['points'] = metric_archive.downsample(column, start, end, step)
+    click.echo(msgspec.json.encode(result).decode())
+
+
+@sauron.command()
+@click.argument('filename', type=click.Path(exists=True))
+@click.argument('recording', type=click.Path(exists=True))
+@click.option('--messages', is_flag=True, help='Include the rendered messages.')
+def replay(filename, recording, messages):
+    import asyncio
+    import msgspec
+    from .service import get_config
+    from .replay import replay as replay_recording
+    report = asyncio.run(replay_recording(recording, get_config(filename), messages))
+    click.echo(msgspec.json.encode(report).decode())
+
+
+@sauron.command()
+@click.argument('filename', type=click.Path(exists=True))
+@click.option('--updates', default=200, help='Synthetic updates dispatched.')
+@click.option('--concurrency', default=20, help='Updates handled at once.')
+@click.option('--commands', default='s,schedule,history', help='Commands sent round robin.')
+@click.option('--interval', default=2, help='Seconds between notifier cycles.')
+@click.option('--rpc-latency-ms', default=20.0, help='Latency of the fake nodeos.')
+def loadtest(filename, updates, concurrency, commands, interval, rpc_latency_ms):
+    '''Load test of the command handlers against fake Telegram and nodeos servers, as JSON.'''
+    import asyncio
+    import msgspec
+    from .service import get_config
+    from .loadtest import run_load
+    commands = [f"/{command.strip().lstrip('/')}" for command in commands.split(',') if command.strip()]
+    report = asyncio.run(run_load(
+        get_config(filename),
+        updates,
+        concurrency,
+        commands,
+        interval,
+        rpc_latency_ms / 1000,
+    ))
+    click.echo(msgspec.json.encode(report).decode())
+
+
+@sauron.command()
+@click.argument('filename', type=click.Path(exists=True))
+@click.option('--rounds', default=5, help='Reads per table and mode.')
+def tables(filename, rounds):
+    '''Reads the producers and payments tables as JSON and as binary rows, as JSON.'''
+    import asyncio
+    import msgspec
+    from .service import get_config
+    from .abi import benchmark_tables
+    report = asyncio.run(benchmark_tables(get_config(filename), rounds))
+    click.echo(msgspec.json.encode(report).decode())
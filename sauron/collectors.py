@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+import time
+import asyncio
+import logging
+import msgspec
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from .types import *
+
+
+logger = logging.getLogger(__name__)
+
+
+class CollectorError(Exception):
+    pass
+
+
+def serve(conn):
+    '''Loop of an isolated worker process: runs `(func, args)` requests
+    and sends back `(ok, result or error)`.
+    '''
+    while True:
+        try:
+            func, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send((True, func(*args)))
+        except Exception as e:
+            conn.send((False, f'{type(e).__name__}: {e}'))
+
+
+class ProcessWorker:
+    """A long lived worker process for calls that can't be interrupted,
+    killed and started again when a call misses its deadline.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.context = multiprocessing.get_context('spawn')
+        self.process = None
+        self.conn = None
+
+    def start(self):
+        # the pipe of a worker that exited on its own
+        self.kill()
+        self.conn, child = self.context.Pipe()
+        self.process = self.context.Process(
+            target=serve, args=(child,), name=f'sauron-{self.name}', daemon=True)
+        self.process.start()
+        child.close()
+
+    async def call(self, func: Callable, args: tuple, timeout: float) -> Any:
+        if self.process is None or not self.process.is_alive():
+            self.start()
+        loop = asyncio.get_running_loop()
+        answered = loop.create_future()
+        fd = self.conn.fileno()
+        loop.add_reader(fd, lambda: answered.done() or answered.set_result(None))
+        try:
+            self.conn.send((func, args))
+            await asyncio.wait_for(answered, timeout)
+        except BaseException:
+            # a late answer would be read by the next call, start over
+            loop.remove_reader(fd)
+            self.kill()
+            raise
+        loop.remove_reader(fd)
+        try:
+            ok, result = self.conn.recv()
+        except EOFError:
+            self.kill()
+            raise CollectorError(f'worker {self.name} exited')
+        if not ok:
+            raise CollectorError(result)
+        return result
+
+    def kill(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.join(5)
+            self.conn.close()
+        self.process = None
+        self.conn = None
+
+
+class CollectorRunner:
+    """Runs blocking collectors under hard deadlines.
+
+    Collectors run on a bounded thread pool, one call per collector at a
+    time, so a call stuck past its deadline holds at most one thread until
+    it returns. `isolated` collectors run in their own worker process
+    instead, which is killed and restarted when a call times out, and
+    coroutine collectors are cancelled at their deadline. Runs, failures,
+    timeouts and durations are kept per collector, and a collector whose
+    last call failed is alerted until one succeeds.
+    """
+
+    def __init__(self, workers: int = 4):
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='sauron-collector')
+        self.collectors: dict[str, tuple[Callable, float, Optional[ProcessWorker]]] = {}
+        self.stats: dict[str, CollectorStats] = {}
+        self.running: dict[str, asyncio.Future] = {}
+        self.failures: dict[str, Alert] = {}
+
+    def register(self, name: str, func: Callable, timeout: float, isolated: bool = False):
+        worker = ProcessWorker(name) if isolated else None
+        self.collectors[name] = (func, timeout, worker)
+        self.stats[name] = CollectorStats(name, isolated)
+
+    def set_timeout(self, name: str, timeout: float):
+        func, _, worker = self.collectors[name]
+        self.collectors[name] = (func, timeout, worker)
+
+    async def run(self, name: str, *args) -> Any:
+        '''Returns what the collector returned, raises `TimeoutError` past
+        its deadline and `CollectorError` while a timed out call is still
+        running or when an isolated call failed. A failure stays in
+        `alerts` until the next successful call.
+        '''
+        func, timeout, worker = self.collectors[name]
+        stats = self.stats[name]
+        if name in self.running:
+            stats.failures += 1
+            stats.last_error = 'previous call still running'
+            self.fail(name, 'timeout', stats.last_error)
+            raise CollectorError(stats.last_error)
+
+        start = time.perf_counter()
+        stats.runs += 1
+        try:
+            if worker is not None:
+                result = await worker.call(func, args, timeout)
+            elif asyncio.iscoroutinefunction(func):
+                result = await asyncio.wait_for(func(*args), timeout)
+            else:
+                future = self.running[name] = asyncio.get_running_loop().run_in_executor(
+                    self.executor, func, *args)
+                # the thread can't be stopped, `running` holds it until it returns
+                future.add_done_callback(lambda _: self.running.pop(name, None))
+                result = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except TimeoutError:
+            stats.timeouts += 1
+            stats.restarts += worker is not None
+            stats.last_error = f'no answer within {timeout:g}s'
+            logger.warning('Collector %s timed out after %gs', name, timeout)
+            self.fail(name, 'timeout', stats.last_error)
+            raise
+        except CollectorError as e:
+            stats.failures += 1
+            stats.last_error = str(e)
+            self.fail(name, 'failure', stats.last_error)
+            raise
+        except Exception as e:
+            stats.failures += 1
+            stats.last_error = f'{type(e).__name__}: {e}'
+            self.fail(name, 'failure', stats.last_error)
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            stats.last_ms = round(elapsed_ms, 2)
+            stats.max_ms = round(max(stats.max_ms, elapsed_ms), 2)
+            stats.total_ms = round(stats.total_ms + elapsed_ms, 2)
+        self.failures.pop(name, None)
+        return result
+
+    def fail(self, name: str, rule: str, error: str):
+        self.failures[name] = Alert(**{
+            'metric': f'collector.{name}',
+            'rule': rule,
+            'value': 0,
+            'score': 1,
+            'reason': f'{name} collector: {error}',
+        })
+
+    def alerts(self) -> list[Alert]:
+        return list(self.failures.values())
+
+    def report(self) -> list[CollectorStats]:
+        return [
+            msgspec.structs.replace(stats, running=name in self.running)
+            for name, stats in self.stats.items()
+        ]
+
+    def close(self):
+        for _, _, worker in self.collectors.values():
+            if worker is not None:
+                worker.kill()
+        self.executor.shutdown(wait=False, cancel_futures=True)
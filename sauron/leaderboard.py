@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+import math
+import time
+import asyncio
+import hashlib
+import logging
+from array import array
+from bisect import bisect_right
+from typing import Optional
+from .types import *
+from .abi import load_table_abi
+from .service import iter_table_rows
+from .votes import SCHEDULE_SIZE, vote_weight
+
+
+logger = logging.getLogger(__name__)
+
+
+def miss_rate(row: ProducerRow) -> float:
+    blocks = row.lifetime_produced_blocks + row.lifetime_missed_blocks
+    return row.lifetime_missed_blocks / blocks * 100 if blocks else 0
+
+
+# column name -> value of a producers table row
+COLUMNS = {
+    'missed_rotation': lambda row: row.missed_blocks_per_rotation,
+    'missed': lambda row: row.lifetime_missed_blocks,
+    'produced': lambda row: row.lifetime_produced_blocks,
+    'miss_rate': miss_rate,
+    'unpaid': lambda row: row.unpaid_blocks,
+    'votes': lambda row: vote_weight(row.total_votes),
+}
+
+# columns where being far above the others is bad
+OUTLIER_COLUMNS = ('missed_rotation', 'miss_rate')
+
+# a value is an outlier past this many median absolute deviations
+OUTLIER_MADS = 3
+
+# share of the schedule missing blocks at once that makes it a network event
+CHAIN_WIDE_SHARE = 1 / 3
+
+
+def quantile(ordered: list[float], q: float) -> float:
+    if not ordered:
+        return 0
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def load_columns(rows: list[ProducerRow]) -> tuple[list[str], dict[str, array]]:
+    '''Lays the rows out as one `array('d')` per column, in table order.'''
+    owners = []
+    columns = {name: array('d') for name in COLUMNS}
+    for row in rows:
+        owners.append(row.owner)
+        for name, value in COLUMNS.items():
+            columns[name].append(value(row))
+    return owners, columns
+
+
+def snapshot_key(owners: list[str], columns: dict[str, array]) -> str:
+    digest = hashlib.blake2b(','.join(owners).encode(), digest_size=8)
+    for name in COLUMNS:
+        digest.update(columns[name].tobytes())
+    return digest.hexdigest()
+
+
+def rank_columns(
+    producer_name: str,
+    owners: list[str],
+    columns: dict[str, array],
+    snapshot: str,
+    now: float,
+) -> Leaderboard:
+    '''Percentiles, our position and the outliers of every column.'''
+    ours = owners.index(producer_name) if producer_name in owners else None
+    stats = []
+    outliers = []
+    for name, column in columns.items():
+        ordered = sorted(column)
+        value = column[ours] if ours is not None else None
+        stats.append(ColumnStats(
+            column=name,
+            p50=quantile(ordered, 0.5),
+            p90=quantile(ordered, 0.9),
+            max=ordered[-1] if ordered else 0,
+            ours=value,
+            position=round(bisect_right(ordered, value) / len(ordered), 4) if value is not None else None,
+        ))
+        if name not in OUTLIER_COLUMNS or not ordered:
+            continue
+        median = quantile(ordered, 0.5)
+        mad = quantile(sorted(abs(item - median) for item in column), 0.5)
+        # a column of mostly equal values has no spread, count whole units
+        limit = median + OUTLIER_MADS * max(mad, 1)
+        outliers += [
+            Outlier(owners[index], name, column[index])
+            for index in sorted(range(len(column)), key=column.__getitem__, reverse=True)
+            if column[index] > limit
+        ]
+
+    scheduled = min(SCHEDULE_SIZE, len(owners))
+    missing = sum(1 for value in columns['missed_rotation'][:scheduled] if value > 0)
+    return Leaderboard(
+        snapshot=snapshot,
+        updated_at=now,
+        producers=len(owners),
+        scheduled=scheduled,
+        missing=missing,
+        chain_wide=missing >= max(2, math.ceil(scheduled * CHAIN_WIDE_SHARE)),
+        rank=ours + 1 if ours is not None else 0,
+        columns=stats,
+        outliers=outliers,
+    )
+
+
+class ProducerLeaderboard:
+    """Ranks our producer against every active producer on chain.
+
+    The producers table is streamed once per `max_age` seconds into one
+    column array per field, the active rows first as ordered by votes.
+    Percentiles, our position and the outliers of every column are then
+    computed over the arrays, once per table snapshot: a snapshot equal
+    to the last one returns the last board. Concurrent callers share one
+    fetch.
+    """
+
+    def __init__(
+        self,
+        node_url: str,
+        producer_name: str,
+        max_age: float = 60,
+        abi_path: Optional[str] = None,
+    ):
+        self.node_url = node_url
+        self.producer_name = producer_name
+        self.max_age = max_age
+        self.abi_path = abi_path
+        self.board: Optional[Leaderboard] = None
+        self.fetched_at = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_config(cls, config: Config):
+        leaderboard = cls(config.node_url, config.producer_name)
+        leaderboard.reconfigure(config)
+        return leaderboard
+
+    def reconfigure(self, config: Config):
+        self.node_url = config.node_url
+        self.producer_name = config.producer_name
+        # the abi is loaded on first use, get_abi writes it at startup
+        self.abi_path = config.abi_path if config.binary_tables else None
+
+    async def get_rows(self) -> list[ProducerRow]:
+        rows = []
+        async for row in iter_table_rows(
+            self.node_url,
+            'eosio',
+            'eosio',
+            'producers',
+            index_position=2,
+            key_type='float64',
+            row_type=ProducerRow,
+            abi=load_table_abi(self.abi_path) if self.abi_path else None,
+        ):
+            if not row.is_active:
+                break
+            rows.append(row)
+        return rows
+
+    async def get(self) -> Leaderboard:
+        '''Returns the cached board, fetching the table when older than
+        `max_age`.
+        '''
+        if self.board is None or time.time() - self.fetched_at > self.max_age:
+            await self.refresh()
+        return self.board
+
+    async def refresh(self) -> Leaderboard:
+        if self._refreshing is None:
+            self._refreshing = asyncio.create_task(self._refresh())
+            self._refreshing.add_done_callback(self._refreshed)
+        return await asyncio.shield(self._refreshing)
+
+    async def _refresh(self) -> Leaderboard:
+        return self.update(await self.get_rows())
+
+    def _refreshed(self, task: asyncio.Task):
+        self._refreshing = None
+
+    def update(self, rows: list[ProducerRow], now: Optional[float] = None) -> Leaderboard:
+        '''Ranks the active `rows`, the status cycle feeds its own fetch
+        of the table through here so `get` rarely needs one.
+        '''
+        now = time.time() if now is None else now
+        self.fetched_at = now
+        owners, columns = load_columns(rows)
+        snapshot = snapshot_key(owners, columns)
+        if self.board is not None and self.board.snapshot == snapshot:
+            return self.board
+        self.board = rank_columns(
+            self.producer_name,
+            owners,
+            columns,
+            snapshot,
+            now,
+        )
+        return self.board
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+
+import time
+import asyncio
+import logging
+import threading
+import msgspec
+from aiohttp import web
+from collections import Counter
+from contextvars import ContextVar
+from types import SimpleNamespace
+from typing import Optional
+from telebot import asyncio_helper
+from telebot.types import Update
+from .types import *
+from .rpcstats import RpcStats, rpc_stats
+from .telegram import build_telegram
+
+
+logger = logging.getLogger(__name__)
+
+
+COMMANDS = ('/s', '/schedule', '/history')
+
+# synthetic operators write from their own chat, the notifier keeps chat_id
+OPERATOR_CHAT = -4242
+OPERATORS = 5
+
+# the command of the update being handled, None for background tasks
+current_command: ContextVar[Optional[str]] = ContextVar('current_command', default=None)
+
+
+def quantile_ms(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0
+    return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 2)
+
+
+def fake_producers(producer_name: str, count: int, inactive: int = 10) -> list[dict]:
+    '''Producers table rows ordered by votes, ours fifth.'''
+    owners = [f'bp{index}' for index in range(count)]
+    owners[min(4, count - 1)] = producer_name
+    return [
+        {
+            'owner': owner,
+            'total_votes': f'{(count - index) * 1e12:.1f}',
+            'is_active': int(index < count - inactive),
+            'url': f'https://{owner}.example',
+            'unpaid_blocks': 500,
+            'last_claim_time': '2024-01-01T00:00:00.000',
+            'lifetime_produced_blocks': 100000,
+            'lifetime_missed_blocks': 10,
+            'missed_blocks_per_rotation': 0,
+        }
+        for index, owner in enumerate(owners)
+    ]
+
+
+def synthetic_update(update_id: int, command: str) -> Update:
+    operator = 1000 + update_id % OPERATORS
+    return Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': OPERATOR_CHAT, 'type': 'group', 'title': 'ops'},
+            'from': {'id': operator, 'is_bot': False, 'first_name': f'operator{operator}'},
+            'text': command,
+            'entities': [{'offset': 0, 'length': len(command), 'type': 'bot_command'}],
+        },
+    })
+
+
+class LocalClock:
+    """Answers NTP requests with the local clock, so the test stays offline."""
+
+    def request(self, host: str, *args, **kwargs):
+        return SimpleNamespace(tx_time=time.time())
+
+
+class FakeServers:
+    """Fake Telegram Bot API and nodeos endpoints.
+
+    They are served from a thread with its own event loop: the bot reads
+    the producer row through the blocking cleos client, which would never
+    get an answer from a server sharing its loop. Every Bot API request
+    is kept in `sent` as `(monotonic time, method, chat_id, reply_to)`,
+    nodeos answers after `rpc_latency` seconds.
+    """
+
+    def __init__(self, producer_name: str, producers: int = 60, rpc_latency: float = 0.02):
+        self.producer_name = producer_name
+        self.producers = fake_producers(producer_name, producers)
+        self.rpc_latency = rpc_latency
+        self.sent: list[tuple[float, str, str, Optional[int]]] = []
+        self.message_id = 0
+        self.port: Optional[int] = None
+        self.ready = threading.Event()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def node_url(self) -> str:
+        return f'http://127.0.0.1:{self.port}'
+
+    @property
+    def telegram_url(self) -> str:
+        return f'http://127.0.0.1:{self.port}/bot{{0}}/{{1}}'
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/v1/chain/get_table_rows', self.get_table_rows)
+        app.router.add_post('/bot{token}/{method}', self.telegram)
+        return app
+
+    async def get_table_rows(self, request: web.Request):
+        await asyncio.sleep(self.rpc_latency)
+        body = await request.json()
+        limit = int(body.get('limit') or 10)
+        rows, next_key = [], ''
+        if body.get('table') == 'payments':
+            rows = [{'bp': self.producer_name, 'pay': '1.0000 TLOS'}]
+        elif str(body.get('index_position', 1)) not in ('1', 'primary'):
+            start = int(body.get('lower_bound') or 0)
+            rows = self.producers[start:start + limit]
+            if start + limit < len(self.producers):
+                next_key = str(start + limit)
+        else:
+            owner = body.get('lower_bound')
+            rows = [row for row in self.producers if row['owner'] == owner][:limit]
+        return web.json_response({'rows': rows, 'more': bool(next_key), 'next_key': next_key})
+
+    async def telegram(self, request: web.Request):
+        method = request.match_info['method']
+        form = await request.post()
+        chat_id = str(form.get('chat_id', ''))
+        reply = form.get('reply_parameters')
+        reply_to = msgspec.json.decode(reply).get('message_id') if reply else None
+        self.sent.append((time.monotonic(), method, chat_id, reply_to))
+        if method not in ('sendMessage', 'sendPhoto'):
+            return web.json_response({'ok': True, 'result': True})
+        self.message_id += 1
+        return web.json_response({'ok': True, 'result': {
+            'message_id': self.message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id) if chat_id.lstrip('-').isdigit() else 0, 'type': 'group'},
+            'text': form.get('text', ''),
+        }})
+
+    def serve(self):
+        self.loop = asyncio.new_event_loop()
+        runner = web.AppRunner(self.app())
+        self.loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        self.loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(runner.cleanup())
+            self.loop.close()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve, name='sauron-fake-servers', daemon=True)
+        self.thread.start()
+        self.ready.wait()
+
+    def stop(self):
+        if self.thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.thread = None
+
+    def deliveries(self, chat_id: str) -> list[float]:
+        '''Times of the messages sent to `chat_id` that answer no one.'''
+        return [
+            at for at, method, chat, reply_to in self.sent
+            if method == 'sendMessage' and chat == chat_id and reply_to is None
+        ]
+
+    def replied(self) -> set[int]:
+        return {reply_to for _, _, _, reply_to in self.sent if reply_to is not None}
+
+
+class CallCounter:
+    """Counts the calls recorded in `stats` by the command being handled
+    when they were made, calls of background tasks count under None.
+    """
+
+    def __init__(self, stats: RpcStats = rpc_stats):
+        self.stats = stats
+        self.calls: dict[Optional[str], Counter] = {}
+
+    def __enter__(self):
+        record = self.stats.record
+
+        def counted(endpoint: str, method: str, *args, **kwargs):
+            self.calls.setdefault(current_command.get(), Counter())[method] += 1
+            return record(endpoint, method, *args, **kwargs)
+
+        self.stats.record = counted
+        return self
+
+    def __exit__(self, *exc):
+        del self.stats.record
+
+
+def get_timing(gaps: list[tuple[float, float]], interval: float) -> NotifierTiming:
+    '''How late each `(previous, next)` pair of deliveries was.'''
+    late = [(current - previous - interval) * 1000 for previous, current in gaps]
+    if not late:
+        return NotifierTiming(0)
+    return NotifierTiming(
+        cycles=len(late),
+        late_mean_ms=round(sum(late) / len(late), 2),
+        late_max_ms=round(max(late), 2),
+    )
+
+
+async def wait_deliveries(servers: FakeServers, chat_id: str, count: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    while len(servers.deliveries(chat_id)) < count:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f'the notifier sent {len(servers.deliveries(chat_id))} of {count} messages in {timeout:g}s')
+        await asyncio.sleep(0.05)
+
+
+async def drive(bot, commands: list[str], updates: int, concurrency: int) -> list[tuple[str, int, float]]:
+    '''Dispatches `updates` synthetic commands, `concurrency` at a time,
+    returns `(command, message_id, latency_ms)` for each.
+    '''
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def dispatch(index: int):
+        command = commands[index % len(commands)]
+        update = synthetic_update(index + 1, command)
+        async with semaphore:
+            # each dispatch runs in its own task, the command stays local to it
+            current_command.set(command)
+            start = time.perf_counter()
+            await bot.process_new_updates([update])
+            return command, update.message.message_id, (time.perf_counter() - start) * 1000
+
+    return await asyncio.gather(*[dispatch(index) for index in range(updates)])
+
+
+async def run_load(
+    config: Config,
+    updates: int = 200,
+    concurrency: int = 20,
+    commands: list[str] = list(COMMANDS),
+    interval: int = 2,
+    rpc_latency: float = 0.02,
+    warmup: int = 3,
+) -> LoadReport:
+    '''Builds the bot of `config` against fake Telegram and nodeos servers
+    and runs the real handlers. The notifier runs every `interval` seconds
+    and is timed for `warmup` cycles alone, then while the updates are
+    handled and for one cycle after them.
+    '''
+    servers = FakeServers(config.producer_name, rpc_latency=rpc_latency)
+    servers.start()
+    config = msgspec.structs.replace(
+        config,
+        node_url=servers.node_url,
+        local_node_url=servers.node_url,
+        status_interval=interval,
+        chats={},
+        archive_dir=None,
+        record_file=None,
+    )
+    chat_id = str(config.chat_id)
+    api_url = asyncio_helper.API_URL
+    asyncio_helper.API_URL = servers.telegram_url
+    bot, start = build_telegram(config, ntp_client=LocalClock())
+    tasks = []
+    try:
+        with CallCounter() as counter:
+            tasks = await start(serve=False)
+            # the first cycle also fills the snapshot /s answers from
+            await wait_deliveries(servers, chat_id, warmup + 1, (warmup + 2) * interval + 30)
+            load_start = time.monotonic()
+            results = await drive(bot, commands, updates, concurrency)
+            load_end = time.monotonic()
+            elapsed = load_end - load_start
+            count = len(servers.deliveries(chat_id))
+            await wait_deliveries(servers, chat_id, count + 1, interval + 30)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await bot.close_session()
+        asyncio_helper.API_URL = api_url
+        servers.stop()
+
+    replied = servers.replied()
+    deliveries = servers.deliveries(chat_id)
+    gaps = list(zip(deliveries, deliveries[1:]))
+    latencies = [latency for _, _, latency in results]
+    per_command = []
+    for command in dict.fromkeys(commands):
+        handled = [(message_id, latency) for name, message_id, latency in results if name == command]
+        calls = counter.calls.get(command, Counter())
+        per_command.append(CommandLoad(
+            command=command,
+            updates=len(handled),
+            unanswered=sum(1 for message_id, _ in handled if message_id not in replied),
+            p50_ms=quantile_ms([latency for _, latency in handled], 0.5),
+            p99_ms=quantile_ms([latency for _, latency in handled], 0.99),
+            max_ms=quantile_ms([latency for _, latency in handled], 1),
+            calls={method: round(total / max(len(handled), 1), 2) for method, total in sorted(calls.items())},
+        ))
+    return LoadReport(
+        updates=updates,
+        concurrency=concurrency,
+        elapsed_s=round(elapsed, 3),
+        throughput=round(updates / elapsed, 2) if elapsed else 0,
+        p50_ms=quantile_ms(latencies, 0.5),
+        p99_ms=quantile_ms(latencies, 0.99),
+        max_ms=quantile_ms(latencies, 1),
+        commands=per_command,
+        background_calls=dict(sorted(counter.calls.get(None, Counter()).items())),
+        baseline=get_timing([gap for gap in gaps if gap[1] <= load_start], interval),
+        # the waits the load overlapped
+        under_load=get_timing([gap for gap in gaps if gap[1] > load_start and gap[0] < load_end], interval),
+    )
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+import os
+import copy
+import sys
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+import msgspec
+import zstandard
+
+
+# attributes every LogRecord has, anything else was passed through `extra`
+RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message'}
+
+json_encoder = msgspec.json.Encoder(enc_hook=str)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json_encoder.encode(entry).decode('utf-8')
+
+
+class StructQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that keeps records structured for the listener,
+    only the message and traceback are rendered in the calling thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def zstd_rotator(source: str, dest: str):
+    with open(source, 'rb') as src, open(dest, 'wb') as dst:
+        zstandard.ZstdCompressor().copy_stream(src, dst)
+    os.remove(source)
+
+
+class ZstdRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotates when the file exceeds `max_bytes` or every `interval`
+    seconds, whichever comes first, compressing rotated files with zstd.
+    """
+
+    def __init__(self, filename: str, max_bytes: int, interval: float, backup_count: int):
+        super().__init__(
+            filename,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding='utf-8',
+            delay=True
+        )
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+        self.namer = lambda name: f'{name}.zst'
+        self.rotator = zstd_rotator
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.interval > 0 and time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+def parse_levels(levels: str | None) -> dict[str, str]:
+    '''Parses `component:LEVEL` pairs, components are module names inside
+    the sauron package, e.g. `service:DEBUG, telegram:WARNING`.
+    '''
+    if not levels:
+        return {}
+    parsed = {}
+    for item in levels.split(','):
+        component, _, level = item.strip().partition(':')
+        if component and level:
+            parsed[component.strip()] = level.strip().upper()
+    return parsed
+
+
+def check_levels(level: str = 'INFO', levels: str | None = None):
+    '''Raises ValueError on a level name `logging` does not know, so a
+    config is rejected before any of it is applied.
+    '''
+    names = [level.upper(), *parse_levels(levels).values()]
+    unknown = [name for name in names if not isinstance(logging.getLevelName(name), int)]
+    if unknown:
+        raise ValueError(f"Unknown log level {', '.join(unknown)}")
+
+
+def setup_logging(
+    level: str = 'INFO',
+    levels: str | None = None,
+    filename: str | None = None,
+    max_bytes: int = 10 * 1024 * 1024,
+    interval: float = 24 * 60 * 60,
+    backup_count: int = 14,
+) -> logging.handlers.QueueListener:
+    '''Routes the `sauron` loggers through a queue so callers never block
+    on I/O, formatting and writing happen in the listener thread.
+    '''
+    if filename:
+        handler = ZstdRotatingFileHandler(filename, max_bytes, interval, backup_count)
+    else:
+        handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+
+    root = logging.getLogger('sauron')
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(StructQueueHandler(log_queue))
+    root.propagate = False
+    set_levels(level, levels)
+
+    listener.start()
+    atexit.register(stop_listener, listener)
+    return listener
+
+
+def set_levels(level: str = 'INFO', levels: str | None = None):
+    '''Sets the package level and the component overrides, components
+    missing from `levels` go back to inheriting the package level.
+    '''
+    logging.getLogger('sauron').setLevel(level.upper())
+    overrides = parse_levels(levels)
+    for name, logger in logging.Logger.manager.loggerDict.items():
+        if name.startswith('sauron.') and isinstance(logger, logging.Logger):
+            logger.setLevel(logging.NOTSET)
+    for component, component_level in overrides.items():
+        logging.getLogger(f'sauron.{component}').setLevel(component_level)
+
+
+def stop_listener(listener: logging.handlers.QueueListener):
+    '''Flushes the pending records, safe to call more than once.'''
+    if listener._thread is not None:
+        listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+def setup_logging_from_config(config) -> logging.handlers.QueueListener:
+    return setup_logging(
+        level=config.log_level,
+        levels=config.log_levels,
+        filename=config.log_file,
+        max_bytes=config.log_max_bytes,
+        interval=config.log_rotate_hours * 60 * 60,
+        backup_count=config.log_backup_count,
+    )
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+import time
+import asks
+import asyncio
+import logging
+import msgspec
+from collections import deque
+from typing import Optional
+from .types import *
+from .rpcstats import rpc_stats
+
+
+logger = logging.getLogger(__name__)
+
+
+CHURN_WINDOW = 60 * 60
+
+connections_decoder = msgspec.json.Decoder(list[NetConnection], strict=False)
+
+
+def parse_peers(peers: Optional[str]) -> list[str]:
+    if not peers:
+        return []
+    return [item.strip() for item in peers.split(',') if item.strip()]
+
+
+def split_address(address: str) -> tuple[str, int]:
+    '''`host:port` or `[v6]:port`, the port defaults to 9876.'''
+    host, _, port = address.rpartition(':')
+    if not host or (']' in port):
+        return address.strip('[]'), 9876
+    return host.strip('[]'), int(port)
+
+
+class PeerMonitor:
+    """Tracks the p2p peers of the local node.
+
+    Each poll reads the connections of the node from its net API and, for
+    the addresses in `peers`, times a TCP handshake, at most `concurrency`
+    at a time. The connected set is diffed against the previous poll to
+    count churn, and fewer than `min_peers` connected peers is reported
+    as a starvation alert.
+    """
+
+    def __init__(
+        self,
+        node_url: Optional[str],
+        peers: list[str] = [],
+        min_peers: int = 3,
+        concurrency: int = 64,
+        timeout: float = 3,
+        interval: float = 60,
+    ):
+        self.node_url = node_url
+        self.peers = peers
+        self.min_peers = min_peers
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.timeout = timeout
+        self.interval = interval
+        self.connected: Optional[set[str]] = None
+        self.churn: deque[tuple[float, int]] = deque()
+        self.last: Optional[PeerReport] = None
+
+    @classmethod
+    def from_config(cls, config: Config):
+        return cls(
+            config.local_node_url if config.peer_net_api else None,
+            parse_peers(config.peers),
+            config.peer_min,
+            config.peer_concurrency,
+            config.peer_timeout,
+            config.peer_interval,
+        )
+
+    def reconfigure(self, config: Config):
+        self.node_url = config.local_node_url if config.peer_net_api else None
+        self.peers = parse_peers(config.peers)
+        self.min_peers = config.peer_min
+        self.timeout = config.peer_timeout
+        self.interval = config.peer_interval
+
+    async def get_connections(self) -> list[NetConnection]:
+        response = await rpc_stats.call(
+            self.node_url,
+            'net_connections',
+            asks.post,
+            f'{self.node_url}/v1/net/connections',
+            timeout=self.timeout,
+        )
+        if response.status_code != 200:
+            raise ConnectionError(f'net api answered {response.status_code}, is net_api_plugin enabled?')
+        return connections_decoder.decode(response.content)
+
+    async def probe(self, address: str) -> PeerState:
+        host, port = split_address(address)
+        async with self.semaphore:
+            start = time.perf_counter()
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.timeout)
+            except (OSError, TimeoutError) as e:
+                error = f'no handshake within {self.timeout:g}s' if isinstance(e, TimeoutError) else str(e)
+                return PeerState(address, False, error=error)
+            latency_ms = round((time.perf_counter() - start) * 1000, 2)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+        return PeerState(address, True, latency_ms)
+
+    async def poll(self, now: Optional[float] = None) -> PeerReport:
+        states: dict[str, PeerState] = {}
+        error = None
+        connections = None
+        if self.node_url:
+            try:
+                connections = await self.get_connections()
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                logger.warning('Could not read the net connections: %s', error)
+
+        for connection in connections or []:
+            address = connection.peer or connection.last_handshake.p2p_address
+            states[address] = PeerState(
+                address,
+                connection.is_socket_open and not connection.connecting,
+                syncing=connection.syncing,
+                head_num=connection.last_handshake.head_num,
+            )
+        # with the net api the node's own connections count, else reachability
+        connected = {address for address, state in states.items() if state.connected}
+        for state in await asyncio.gather(*[self.probe(address) for address in self.peers]):
+            known = states.get(state.address)
+            if known is not None:
+                # the node says whether it is connected, the probe how fast
+                state = msgspec.structs.replace(known, latency_ms=state.latency_ms, error=state.error)
+            elif connections is None and state.connected:
+                connected.add(state.address)
+            states[state.address] = state
+        return self.update(sorted(states.values(), key=lambda state: state.address), connected, error, now)
+
+    def update(
+        self,
+        peers: list[PeerState],
+        connected: set[str],
+        error: Optional[str] = None,
+        now: Optional[float] = None,
+    ) -> PeerReport:
+        if now is None:
+            now = time.time()
+        added = sorted(connected - self.connected) if self.connected is not None else []
+        removed = sorted(self.connected - connected) if self.connected is not None else []
+        self.connected = connected
+        if added or removed:
+            self.churn.append((now, len(added) + len(removed)))
+        while self.churn and self.churn[0][0] <= now - CHURN_WINDOW:
+            self.churn.popleft()
+
+        latencies = sorted(peer.latency_ms for peer in peers if peer.latency_ms is not None)
+        self.last = PeerReport(
+            updated_at=now,
+            connected=len(connected),
+            syncing=sum(peer.syncing for peer in peers),
+            latency_p50_ms=latencies[len(latencies) // 2] if latencies else None,
+            latency_max_ms=latencies[-1] if latencies else None,
+            added=added,
+            removed=removed,
+            churn_1h=sum(count for _, count in self.churn),
+            peers=peers,
+            error=error,
+        )
+        return self.last
+
+    def alerts(self) -> list[Alert]:
+        if self.last is None or self.last.connected >= self.min_peers:
+            return []
+        if self.last.error is not None and not self.peers:
+            # nothing was measured, a down node has its own alert
+            return []
+        connected = self.last.connected
+        return [Alert(**{
+            'metric': 'peers',
+            'rule': 'starvation',
+            'value': connected,
+            'score': 2 if connected == 0 else 1,
+            'reason': f'only {connected} p2p peers connected, want {self.min_peers}',
+        })]
+
+    async def run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.warning('An exception occurred while polling peers: %s', e)
+            await asyncio.sleep(max(self.interval - (time.monotonic() - started), 1))
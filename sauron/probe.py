@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from ntplib import NTPClient
+from leap.cleos import CLEOS
+from .types import *
+from .service import (
+    collect_system, get_all_producers, get_clock_offset, get_neighbors,
+    get_producer_rank, get_producer_status, health_check
+)
+from .anomaly import AnomalyDetector
+from .utils import get_cycle_alerts
+from .votes import STANDBY_SIZE
+
+
+# nagios plugin exit codes
+OK = 0
+WARNING = 1
+CRITICAL = 2
+UNKNOWN = 3
+
+STATES = {OK: 'ok', WARNING: 'warning', CRITICAL: 'critical', UNKNOWN: 'unknown'}
+
+# alerts on these keys are critical whatever their score
+CRITICAL_METRICS = frozenset({'nodeos', 'missed_blocks', 'schedule'})
+
+
+def get_exit_code(alerts: list[Alert], errors: dict[str, str]) -> int:
+    if any(alert.score >= 2 or alert.metric in CRITICAL_METRICS for alert in alerts):
+        return CRITICAL
+    if errors:
+        return UNKNOWN
+    if alerts:
+        return WARNING
+    return OK
+
+
+async def collect_status(config: Config, deadline: float = 10) -> StatusReport:
+    '''Collects the system sample, producer row, producers table and clock
+    concurrently. Sections not done after `deadline` seconds are reported
+    as errors, blocking calls run on a private pool so nothing waits for
+    them once the report is built.
+    '''
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='sauron-status')
+    cleos = CLEOS(endpoint=config.node_url)
+
+    tasks = {
+        'system': loop.run_in_executor(executor, collect_system),
+        'bp_status': loop.run_in_executor(
+            executor, get_producer_status, cleos, config.producer_name, 0),
+        'producers': asyncio.ensure_future(get_all_producers(config.node_url)),
+        'clock_offset': loop.run_in_executor(
+            executor, get_clock_offset, NTPClient(), 3),
+    }
+    done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in pending:
+        task.cancel()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    results = {}
+    errors = {}
+    for name, task in tasks.items():
+        if task in pending:
+            errors[name] = f'no answer within {deadline:g}s'
+        elif task.exception() is not None:
+            errors[name] = f'{type(task.exception()).__name__}: {task.exception()}'
+        else:
+            results[name] = task.result()
+
+    report = StatusReport(producer=config.producer_name)
+    cache = Cache()
+    if 'system' in results:
+        report.system = cache.system = results['system']
+        await health_check(cache, AnomalyDetector(config.anomaly))
+    if 'bp_status' in results:
+        report.bp_status = results['bp_status'][0]
+    if 'producers' in results:
+        producers = results['producers']
+        report.rank = get_producer_rank(producers, config.producer_name)
+        report.rotation = Rotation(*get_neighbors(producers[:STANDBY_SIZE], config.producer_name))
+    report.clock_offset = results.get('clock_offset')
+
+    context = StatusContext(
+        report.clock_offset or 'Synced',
+        report.rank or 0,
+        report.rotation or Rotation(False),
+    )
+    bp_status = report.bp_status or BlockProducer(config.producer_name, 0, 0, 0, 0, 0, 0, 0)
+    report.alerts = get_cycle_alerts(context, bp_status, cache)
+    report.errors = errors
+    report.exit_code = get_exit_code(report.alerts, errors)
+    report.state = STATES[report.exit_code]
+    report.elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+    return report
+
+
+def get_summary(report: StatusReport) -> str:
+    '''One line nagios style summary.'''
+    details = [f'rank {report.rank}' if report.rank else 'unranked']
+    details += [alert.reason for alert in report.alerts]
+    details += [f'{name}: {error}' for name, error in report.errors.items()]
+    return (
+        f"{report.state.upper()} - {report.producer} {', '.join(details)}"
+        f" | elapsed_ms={report.elapsed_ms} alerts={len(report.alerts)}"
+    )
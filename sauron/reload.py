@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import os
+import asyncio
+import configparser
+import logging
+import msgspec
+from typing import Callable, Optional
+from .types import *
+
+
+logger = logging.getLogger(__name__)
+
+
+# read once at startup, a change is logged but only applied on restart
+RESTART_FIELDS = frozenset({
+    'abi_path', 'bot_token', 'producer_name', 'record_file', 'anomaly',
+    'webhook_url', 'webhook_path', 'webhook_listen', 'webhook_port',
+    'webhook_secret', 'webhook_workers', 'webhook_queue_size', 'auto_claim',
+    'fleet_listen', 'fleet_port', 'fleet_path', 'fleet_token',
+    'fleet_stale_after', 'fleet_hosts', 'fleet_max_hosts', 'log_file', 'log_max_bytes', 'log_rotate_hours',
+    'log_backup_count', 'config_reload_interval', 'archive_dir',
+    'archive_hot_days', 'collector_workers', 'peer_concurrency',
+})
+
+
+def changed_fields(old: Config, new: Config) -> list[str]:
+    return [
+        field for field in old.__struct_fields__
+        if getattr(old, field) != getattr(new, field)
+    ]
+
+
+class ConfigWatcher:
+    """Watches the config file and swaps in validated changes.
+
+    Every `interval` seconds the file is `stat`ed, only when its inode,
+    mtime or size changed it is parsed into a new `Config`. The new config
+    is handed to `on_change(old, new)`, which builds everything that can
+    fail before applying it, and is only kept if that succeeds, otherwise
+    the running config stays untouched until the file changes again.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        config: Config,
+        load: Callable[[str], Config],
+        on_change: Callable[[Config, Config], None],
+        interval: float = 5,
+    ):
+        self.filename = filename
+        self.config = config
+        self.load = load
+        self.on_change = on_change
+        self.interval = interval
+        self.stamp = self.read_stamp()
+
+    def read_stamp(self) -> Optional[tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def check(self) -> list[str]:
+        '''Reloads the config if the file changed, returns the names of
+        the fields that were applied.
+        '''
+        stamp = self.read_stamp()
+        if stamp is None or stamp == self.stamp:
+            return []
+        self.stamp = stamp
+        try:
+            new = self.load(self.filename)
+        except (KeyError, ValueError, configparser.Error, msgspec.ValidationError) as e:
+            logger.error('Keeping the running config, %s is invalid: %s', self.filename, e)
+            return []
+        changed = changed_fields(self.config, new)
+        if not changed:
+            return []
+        try:
+            self.on_change(self.config, new)
+        except Exception as e:
+            logger.exception('Keeping the running config, could not apply %s: %s', self.filename, e)
+            return []
+        self.config = new
+        logger.info('Reloaded %s: %s', self.filename, ', '.join(changed))
+        pending = [field for field in changed if field in RESTART_FIELDS]
+        if pending:
+            logger.warning('Changes to %s apply after a restart', ', '.join(pending))
+        return changed
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.check()
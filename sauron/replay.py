@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+
+import time
+import struct
+import logging
+import msgspec
+from collections import defaultdict, deque
+from typing import Iterator
+from .types import *
+from .anomaly import AnomalyDetector
+from .alerts import AlertManager
+from .votes import VoteTracker
+from .peers import PeerMonitor
+from .resources import ResourceMonitor
+from .leaderboard import ProducerLeaderboard
+from .collectors import CollectorRunner
+from .service import evaluate_cycle, get_producer_status, health_check
+from .utils import render_status_message
+
+
+logger = logging.getLogger(__name__)
+
+
+frame_encoder = msgspec.msgpack.Encoder()
+frame_decoder = msgspec.msgpack.Decoder(Frame)
+length_prefix = struct.Struct('<I')
+
+
+class Recorder:
+    """Appends rpc responses and collector samples to a recording.
+
+    The file is a sequence of length prefixed msgpack `Frame`s, a `start`
+    frame opens every notification cycle and a `cycle` frame closes it
+    and flushes the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'ab')
+
+    def record(self, kind: str, name: str = '', data=None, args: dict | None = None, ts: float | None = None):
+        frame = frame_encoder.encode(Frame(
+            ts=time.time() if ts is None else ts,
+            kind=kind,
+            name=name,
+            args=args or {},
+            data=data
+        ))
+        # one write, a collector thread may record while the loop does
+        self.file.write(length_prefix.pack(len(frame)) + frame)
+
+    def start_cycle(self, ts: float | None = None):
+        self.record('start', ts=ts)
+
+    def record_cycle(
+        self,
+        cache: Cache,
+        clock_offset: str,
+        producers: list[ProducerRow],
+        peers: PeerReport | None = None,
+        resources: list[ResourceUsage] = [],
+        failures: list[Alert] = [],
+        ts: float | None = None
+    ):
+        '''Records every input of the cycle alerts, once they are all
+        gathered, and closes the cycle.
+        '''
+        ts = time.time() if ts is None else ts
+        self.record('system', data=cache.system, ts=ts)
+        self.record('network', data=cache.network, ts=ts)
+        self.record('hosts', data=cache.hosts, ts=ts)
+        self.record('clock', data=clock_offset, ts=ts)
+        self.record('producers', data=producers, ts=ts)
+        self.record('peers', data=peers, ts=ts)
+        self.record('resources', data=resources, ts=ts)
+        self.record('failures', data=failures, ts=ts)
+        self.record('cycle', ts=ts)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class RecordingCleos:
+    """Proxy over `CLEOS` recording every table read."""
+
+    def __init__(self, cleos, recorder: Recorder):
+        self.cleos = cleos
+        self.recorder = recorder
+
+    def get_table(self, **kwargs):
+        rows = self.cleos.get_table(**kwargs)
+        self.recorder.record('rpc', 'get_table', rows, kwargs)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self.cleos, name)
+
+
+class ReplayCleos:
+    """Serves the table reads recorded during one cycle, in order."""
+
+    def __init__(self, frames: list[Frame]):
+        self.responses = defaultdict(deque)
+        for frame in frames:
+            if frame.kind == 'rpc':
+                self.responses[(frame.name, frame.args.get('table'))].append(frame.data)
+
+    def get_table(self, **kwargs):
+        responses = self.responses[('get_table', kwargs.get('table'))]
+        if not responses:
+            raise LookupError(f"No recorded get_table response for {kwargs.get('table')}")
+        return responses.popleft()
+
+
+def read_frames(path: str) -> Iterator[Frame]:
+    with open(path, 'rb') as file:
+        while True:
+            prefix = file.read(length_prefix.size)
+            if len(prefix) < length_prefix.size:
+                return
+            (size,) = length_prefix.unpack(prefix)
+            payload = file.read(size)
+            if len(payload) < size:
+                # truncated by a crash while recording
+                return
+            yield frame_decoder.decode(payload)
+
+
+def read_cycles(path: str) -> Iterator[list[Frame]]:
+    cycle = []
+    for frame in read_frames(path):
+        if frame.kind == 'start':
+            # the frames of a cycle that failed before it was closed
+            cycle = []
+            continue
+        cycle.append(frame)
+        if frame.kind == 'cycle':
+            yield cycle
+            cycle = []
+
+
+async def replay(path: str, config: Config, messages: bool = False) -> ReplayReport:
+    '''Feeds a recording through `get_producer_status`, `evaluate_cycle`
+    and the renderer on the recorded clock, as fast as possible. The
+    alerts, votes and leaderboard are rebuilt from the recorded inputs the
+    same way the live bot builds them.
+    '''
+    detector = AnomalyDetector(config.anomaly)
+    alert_manager = AlertManager.from_config(config)
+    tracker = VoteTracker.from_config(config)
+    leaderboard = ProducerLeaderboard.from_config(config)
+    peer_monitor = PeerMonitor.from_config(config)
+    resource_monitor = ResourceMonitor.from_config(config)
+    # only holds the recorded collector failures, nothing runs on it
+    collectors = CollectorRunner(workers=1)
+    cache = Cache()
+    missed_bpr_cache = 0
+    report = ReplayReport()
+    first_ts = None
+    chain_wide = False
+    started = time.perf_counter()
+
+    for cycle in read_cycles(path):
+        now = cycle[-1].ts
+        if first_ts is None:
+            first_ts = now
+        samples = {frame.kind: frame.data for frame in cycle}
+        if 'system' not in samples or not ('producers' in samples or 'context' in samples):
+            report.skipped += 1
+            continue
+
+        cache.system = msgspec.convert(samples['system'], System)
+        cache.network = msgspec.convert(samples.get('network', {}), Network)
+        cache.hosts = msgspec.convert(samples.get('hosts', {}), dict[str, Cache])
+        peer_monitor.last = msgspec.convert(samples.get('peers'), PeerReport | None)
+        resource_monitor.usage = {
+            usage.account: usage
+            for usage in msgspec.convert(samples.get('resources', []), list[ResourceUsage])
+        }
+        collectors.failures = {
+            alert.metric: alert
+            for alert in msgspec.convert(samples.get('failures', []), list[Alert])
+        }
+        cleos = ReplayCleos(cycle)
+        try:
+            bp_status, missed_bpr_cache = get_producer_status(
+                cleos,
+                config.producer_name,
+                missed_bpr_cache
+            )
+        except LookupError as e:
+            logger.warning('Skipping cycle at %s: %s', now, e)
+            report.skipped += 1
+            continue
+
+        if 'producers' in samples:
+            context = await evaluate_cycle(
+                cache,
+                msgspec.convert(samples['producers'], list[ProducerRow]),
+                samples.get('clock', ''),
+                config,
+                detector,
+                tracker,
+                leaderboard,
+                (peer_monitor, resource_monitor, collectors),
+                now,
+            )
+            if leaderboard.board.chain_wide and not chain_wide:
+                report.chain_wide.append(now)
+            chain_wide = leaderboard.board.chain_wide
+        else:
+            # recorded before the producers pages were, only the context is known
+            context = msgspec.convert(samples['context'], StatusContext)
+            await health_check(cache, detector, now)
+
+        message = render_status_message(
+            bp_status,
+            cache,
+            context,
+            config,
+            alert_manager,
+            now=now,
+        )
+        report.cycles += 1
+
+        notice = alert_manager.last_notice
+        if notice.users or notice.raised or notice.resolved:
+            report.notices.append(ReplayNotice(
+                ts=now,
+                users=notice.users,
+                raised=notice.raised,
+                resolved=notice.resolved,
+                message=message if messages else ''
+            ))
+
+    collectors.close()
+    report.elapsed_s = round(time.perf_counter() - started, 3)
+    if first_ts is not None:
+        report.span_s = round(now - first_ts, 3)
+    if report.elapsed_s > 0:
+        report.speedup = round(report.span_s / report.elapsed_s, 1)
+    return report
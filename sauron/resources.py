@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+import time
+import asks
+import asyncio
+import logging
+import msgspec
+from collections import deque
+from typing import Optional
+from .types import *
+from .rpcstats import rpc_stats
+
+
+logger = logging.getLogger(__name__)
+
+
+RESOURCES = ('cpu', 'net', 'ram')
+
+# usage trends are taken over the last hour
+TREND_WINDOW = 60 * 60
+
+account_decoder = msgspec.json.Decoder(AccountResources, strict=False)
+
+
+class ResourceError(Exception):
+    pass
+
+
+def usage_percent(used: int, limit: int) -> float:
+    # a negative limit is unlimited
+    if limit <= 0:
+        return 0
+    return round(min(used / limit, 1) * 100, 2)
+
+
+def get_usage(account: AccountResources) -> dict[str, float]:
+    return {
+        'cpu': usage_percent(account.cpu_limit.used, account.cpu_limit.max),
+        'net': usage_percent(account.net_limit.used, account.net_limit.max),
+        'ram': usage_percent(account.ram_usage, account.ram_quota),
+    }
+
+
+class ResourceMonitor:
+    """Tracks the CPU, NET and RAM of the accounts that sign for us.
+
+    `get_account` is fetched for every account concurrently at most once
+    per `max_age` seconds, concurrent callers share one fetch. The usage
+    of the last hour gives a trend, accounts above `warn_percent` or
+    due to run out within `warn_hours` are alerted. `check` answers
+    from the cached usage, so checking before a push costs no request
+    unless the cache says the account is exhausted, which is confirmed
+    with a fresh `get_account` first.
+    """
+
+    def __init__(
+        self,
+        node_url: str,
+        accounts: list[str],
+        max_age: float = 60,
+        warn_percent: float = 90,
+        warn_hours: float = 6,
+    ):
+        self.node_url = node_url
+        self.accounts = accounts
+        self.max_age = max_age
+        self.warn_percent = warn_percent
+        self.warn_hours = warn_hours
+        self.usage: dict[str, ResourceUsage] = {}
+        self.history: dict[str, deque[tuple[float, dict[str, float]]]] = {}
+        self.updated_at = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_config(cls, config: Config):
+        monitor = cls(config.node_url, [])
+        monitor.reconfigure(config)
+        return monitor
+
+    def reconfigure(self, config: Config):
+        accounts = [config.producer_name]
+        for account in (config.resource_accounts or '').split(','):
+            if account.strip() and account.strip() not in accounts:
+                accounts.append(account.strip())
+        self.node_url = config.node_url
+        self.accounts = accounts
+        self.max_age = config.resource_interval
+        self.warn_percent = config.resource_warn_percent
+        self.warn_hours = config.resource_warn_hours
+
+    async def get_account(self, account: str) -> AccountResources:
+        response = await rpc_stats.call(
+            self.node_url,
+            'get_account',
+            asks.post,
+            f'{self.node_url}/v1/chain/get_account',
+            json={'account_name': account},
+        )
+        if response.status_code != 200:
+            raise ResourceError(f'get_account {account} answered {response.status_code}')
+        return account_decoder.decode(response.content)
+
+    async def get(self) -> dict[str, ResourceUsage]:
+        '''Returns the cached usage, fetching it when older than `max_age`.'''
+        if time.time() - self.updated_at > self.max_age:
+            await self.refresh()
+        return self.usage
+
+    async def refresh(self) -> dict[str, ResourceUsage]:
+        if self._refreshing is None:
+            self._refreshing = asyncio.create_task(self._refresh())
+            self._refreshing.add_done_callback(self._refreshed)
+        return await asyncio.shield(self._refreshing)
+
+    async def _refresh(self) -> dict[str, ResourceUsage]:
+        results = await asyncio.gather(
+            *[self.get_account(account) for account in self.accounts],
+            return_exceptions=True,
+        )
+        now = time.time()
+        for account, result in zip(self.accounts, results):
+            if isinstance(result, BaseException):
+                logger.warning('Could not read the resources of %s: %s', account, result)
+                continue
+            self.update(result, now)
+        self.updated_at = now
+        return self.usage
+
+    def _refreshed(self, task: asyncio.Task):
+        self._refreshing = None
+
+    def update(self, account: AccountResources, now: float) -> ResourceUsage:
+        usage = get_usage(account)
+        history = self.history.setdefault(account.account_name, deque())
+        history.append((now, usage))
+        while history[0][0] < now - TREND_WINDOW:
+            history.popleft()
+
+        etas = {}
+        then, old = history[0]
+        for resource in RESOURCES:
+            rate = (usage[resource] - old[resource]) / (now - then) if now > then else 0
+            etas[resource] = round((100 - usage[resource]) / rate, 0) if rate > 0 else None
+        result = self.usage[account.account_name] = ResourceUsage(
+            account=account.account_name,
+            cpu_percent=usage['cpu'],
+            net_percent=usage['net'],
+            ram_percent=usage['ram'],
+            cpu_eta_s=etas['cpu'],
+            net_eta_s=etas['net'],
+            ram_eta_s=etas['ram'],
+            balance=account.core_liquid_balance,
+            updated_at=now,
+        )
+        return result
+
+    def blocker(self, account: str, now: Optional[float] = None) -> Optional[str]:
+        '''Why `account` can't transact right now, None when it can or
+        when its usage is unknown or stale.
+        '''
+        usage = self.usage.get(account)
+        if usage is None:
+            return None
+        if now is None:
+            now = time.time()
+        if now - usage.updated_at > 3 * self.max_age:
+            return None
+        exhausted = [
+            resource for resource in RESOURCES
+            if getattr(usage, f'{resource}_percent') >= 100
+        ]
+        if exhausted:
+            return f"{account} has no {', '.join(resource.upper() for resource in exhausted)} left"
+        return None
+
+    async def check(self, account: str) -> Optional[str]:
+        '''`blocker` on the cached usage, confirmed on a fresh read of the
+        account before refusing. None when that read fails, the chain has
+        the last word then.
+        '''
+        if self.blocker(account) is None:
+            return None
+        try:
+            self.update(await self.get_account(account), time.time())
+        except Exception as e:
+            logger.warning('Could not read the resources of %s again: %s', account, e)
+            return None
+        return self.blocker(account)
+
+    def alerts(self) -> list[Alert]:
+        alerts = []
+        for account, usage in self.usage.items():
+            for resource in RESOURCES:
+                percent = getattr(usage, f'{resource}_percent')
+                eta = getattr(usage, f'{resource}_eta_s')
+                if percent >= self.warn_percent:
+                    alerts.append(Alert(**{
+                        'metric': f'{account}.{resource}',
+                        'rule': 'usage',
+                        'value': percent,
+                        'score': 2 if percent >= 100 else 1,
+                        'reason': f'{account} {resource.upper()} at {percent:.0f}%',
+                    }))
+                elif eta is not None and eta < self.warn_hours * 3600:
+                    alerts.append(Alert(**{
+                        'metric': f'{account}.{resource}',
+                        'rule': 'trend',
+                        'value': percent,
+                        'score': 1,
+                        'reason': f'{account} {resource.upper()} runs out in {eta / 3600:.1f}h at the current rate',
+                    }))
+        return alerts
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning('An exception occurred while reading resources: %s', e)
+            await asyncio.sleep(self.max_age)
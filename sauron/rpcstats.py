@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+import math
+import time
+import threading
+from array import array
+from contextlib import contextmanager
+from typing import Optional
+from .types import *
+
+
+# latency buckets grow by 2 ** 0.25 (~19 %) from 0.5 ms, the last one
+# is open ended at ~2 min
+BUCKET_GROWTH = 2 ** 0.25
+BUCKET_MIN_MS = 0.5
+BUCKETS = 72
+
+# request counters are kept in 5 min slots for a day, the latency
+# histograms for the last hour
+SLOT_SECONDS = 300
+DAY_SLOTS = 24 * 60 * 60 // SLOT_SECONDS
+HOUR_SLOTS = 60 * 60 // SLOT_SECONDS
+
+# only these cleos methods talk to the node
+RPC_PREFIXES = ('get_', 'push_')
+
+
+def bucket_index(latency_ms: float) -> int:
+    if latency_ms <= BUCKET_MIN_MS:
+        return 0
+    return min(int(math.log(latency_ms / BUCKET_MIN_MS, BUCKET_GROWTH)) + 1, BUCKETS - 1)
+
+
+def bucket_value(index: int) -> float:
+    '''Upper bound of a bucket in ms.'''
+    return BUCKET_MIN_MS * BUCKET_GROWTH ** index
+
+
+class EndpointStats:
+    """Fixed memory request counters and latency histograms of one
+    endpoint and method, ~8 KB regardless of traffic.
+    """
+    __slots__ = ('slots', 'requests', 'errors', 'hist_slots', 'histograms', 'total', 'last_error')
+
+    def __init__(self):
+        self.slots = array('q', [-1]) * DAY_SLOTS
+        self.requests = array('I', [0]) * DAY_SLOTS
+        self.errors = array('I', [0]) * DAY_SLOTS
+        self.hist_slots = array('q', [-1]) * HOUR_SLOTS
+        self.histograms = array('I', [0]) * (HOUR_SLOTS * BUCKETS)
+        self.total = 0
+        self.last_error = None
+
+    def record(self, latency_ms: Optional[float], ok: bool, now: float):
+        slot = int(now // SLOT_SECONDS)
+        i = slot % DAY_SLOTS
+        if self.slots[i] != slot:
+            self.slots[i] = slot
+            self.requests[i] = 0
+            self.errors[i] = 0
+        self.requests[i] += 1
+        self.errors[i] += not ok
+        self.total += 1
+        if latency_ms is None:
+            return
+
+        j = slot % HOUR_SLOTS
+        if self.hist_slots[j] != slot:
+            self.hist_slots[j] = slot
+            for k in range(j * BUCKETS, (j + 1) * BUCKETS):
+                self.histograms[k] = 0
+        self.histograms[j * BUCKETS + bucket_index(latency_ms)] += 1
+
+    def window(self, seconds: float, now: float) -> tuple[int, int]:
+        '''Requests and errors in the last `seconds`.'''
+        current = int(now // SLOT_SECONDS)
+        oldest = current - min(int(seconds // SLOT_SECONDS), DAY_SLOTS) + 1
+        requests = errors = 0
+        for i, slot in enumerate(self.slots):
+            if oldest <= slot <= current:
+                requests += self.requests[i]
+                errors += self.errors[i]
+        return requests, errors
+
+    def merge(self, merged: list[int], slot: int):
+        '''Adds the latency histogram of `slot` to `merged`.'''
+        j = slot % HOUR_SLOTS
+        if self.hist_slots[j] == slot:
+            for k in range(BUCKETS):
+                merged[k] += self.histograms[j * BUCKETS + k]
+
+    def quantile(self, q: float, now: float) -> Optional[float]:
+        '''Latency quantile over the last hour in ms, None without data.'''
+        current = int(now // SLOT_SECONDS)
+        merged = [0] * BUCKETS
+        for slot in range(current - HOUR_SLOTS + 1, current + 1):
+            self.merge(merged, slot)
+        return histogram_quantile(merged, q)
+
+
+def histogram_quantile(merged: list[int], q: float) -> Optional[float]:
+    count = sum(merged)
+    if count == 0:
+        return None
+    rank = q * count
+    seen = 0
+    for k, hits in enumerate(merged):
+        seen += hits
+        if seen >= rank:
+            return round(bucket_value(k), 2)
+    return round(bucket_value(BUCKETS - 1), 2)
+
+
+class RpcStats:
+    """Registry of `EndpointStats` keyed by endpoint and method."""
+
+    def __init__(self):
+        self.endpoints: dict[tuple[str, str], EndpointStats] = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint: str, method: str, latency_ms: Optional[float], ok: bool = True,
+               error: Optional[Exception] = None, now: Optional[float] = None):
+        # called from the event loop and from cleos worker threads
+        with self.lock:
+            stats = self.endpoints.get((endpoint, method))
+            if stats is None:
+                stats = self.endpoints[(endpoint, method)] = EndpointStats()
+            stats.record(latency_ms, ok, time.time() if now is None else now)
+            if error is not None:
+                stats.last_error = f'{type(error).__name__}: {error}'
+
+    @contextmanager
+    def timed(self, endpoint: str, method: str, latency: bool = True):
+        '''Records the call, with `latency=False` only its outcome is
+        counted and the latency histogram is left out.
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record(endpoint, method, (time.perf_counter() - start) * 1000 if latency else None, False, e)
+            raise
+        self.record(endpoint, method, (time.perf_counter() - start) * 1000 if latency else None)
+
+    async def call(self, endpoint: str, method: str, call, *args, **kwargs):
+        with self.timed(endpoint, method):
+            return await call(*args, **kwargs)
+
+    def report(
+        self,
+        availability_target: float = 99.5,
+        now: Optional[float] = None,
+    ) -> list[RpcReport]:
+        '''Summarizes every endpoint, burn is the error rate over the
+        error budget left by `availability_target`, 1 spends the budget
+        exactly over the window.
+        '''
+        if now is None:
+            now = time.time()
+        budget = max(1 - availability_target / 100, 1e-9)
+        reports = []
+        with self.lock:
+            for (endpoint, method), stats in sorted(self.endpoints.items()):
+                windows = {}
+                for label, seconds in (('1h', 60 * 60), ('24h', 24 * 60 * 60)):
+                    requests, errors = stats.window(seconds, now)
+                    error_rate = errors / requests if requests else 0
+                    windows[label] = (requests, round(100 * (1 - error_rate), 3), round(error_rate / budget, 2))
+                reports.append(RpcReport(**{
+                    'endpoint': endpoint,
+                    'method': method,
+                    'requests_1h': windows['1h'][0],
+                    'requests_24h': windows['24h'][0],
+                    'p50_ms': stats.quantile(0.5, now),
+                    'p99_ms': stats.quantile(0.99, now),
+                    'availability_1h': windows['1h'][1],
+                    'availability_24h': windows['24h'][1],
+                    'burn_1h': windows['1h'][2],
+                    'burn_24h': windows['24h'][2],
+                    'last_error': stats.last_error,
+                }))
+        return reports
+
+    def series(self, q: float = 0.99, now: Optional[float] = None) -> list[tuple[float, float]]:
+        '''Latency quantile of every endpoint together per 5 min slot of
+        the last hour, slots without calls are skipped.
+        '''
+        if now is None:
+            now = time.time()
+        current = int(now // SLOT_SECONDS)
+        points = []
+        with self.lock:
+            for slot in range(current - HOUR_SLOTS + 1, current + 1):
+                merged = [0] * BUCKETS
+                for stats in self.endpoints.values():
+                    stats.merge(merged, slot)
+                value = histogram_quantile(merged, q)
+                if value is not None:
+                    points.append((float(slot * SLOT_SECONDS), value))
+        return points
+
+
+rpc_stats = RpcStats()
+
+
+class InstrumentedCleos:
+    """Proxy over `CLEOS` timing every call that reaches the node."""
+
+    def __init__(self, cleos, endpoint: str, stats: RpcStats = rpc_stats):
+        self.cleos = cleos
+        self.endpoint = endpoint
+        self.stats = stats
+
+    def __getattr__(self, name):
+        attr = getattr(self.cleos, name)
+        if not callable(attr) or not name.startswith(RPC_PREFIXES):
+            return attr
+
+        def timed_call(*args, **kwargs):
+            with self.stats.timed(self.endpoint, name):
+                return attr(*args, **kwargs)
+
+        return timed_call
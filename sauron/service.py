@@ -1,15 +1,30 @@
 #!/usr/bin/env python3
 
+import logging
 import os
 import asks
 import json
-import speedtest
+import msgspec
 import subprocess
 from ntplib import NTPClient
 from leap.cleos import CLEOS
+from typing import AsyncIterator
 from datetime import datetime
 from configparser import ConfigParser
 from .types import *
+from .anomaly import AnomalyDetector
+from .claims import parse_time_point
+from .votes import STANDBY_SIZE, VoteTracker, vote_weight
+from .rpcstats import rpc_stats
+from .abi import AbiDecoder, forget_table_abi, get_table_abi
+from .log import check_levels
+
+
+logger = logging.getLogger(__name__)
+
+
+# seconds before free, df or ps are killed, df hangs on stale mounts
+SUBPROCESS_TIMEOUT = 10
 
 
 def get_cpu_load():
@@ -21,13 +36,13 @@ def get_cpu_load():
             'min_15': round(load15, 2)
         })
     except Exception as e:
-        print('An exception occurred while getting cpu usage information: {e}')
+        logger.exception('An exception occurred while getting cpu usage information')
         raise
 
 
 def get_ram_usage():
     try:
-        free_output = subprocess.check_output(['free', '-m']).decode('utf-8')
+        free_output = subprocess.check_output(['free', '-m'], timeout=SUBPROCESS_TIMEOUT).decode('utf-8')
         lines = free_output.split('\n')
         mem_line = lines[1].split()
 
@@ -45,13 +60,13 @@ def get_ram_usage():
             'percent': percent
         })
     except Exception as e:
-        print('An exception occurred while getting ram usage information: {e}')
+        logger.exception('An exception occurred while getting ram usage information')
         raise
 
 
 def get_disk_usage():
     try:
-        df_output = subprocess.check_output(['df', '-m', '/']).decode('utf-8')
+        df_output = subprocess.check_output(['df', '-m', '/'], timeout=SUBPROCESS_TIMEOUT).decode('utf-8')
         lines = df_output.split('\n')
         disk_line = lines[1].split()
 
@@ -67,26 +82,28 @@ def get_disk_usage():
             'percent': percent
         })
     except Exception as e:
-        print('An exception occurred while getting disk usage information: {e}')
+        logger.exception('An exception occurred while getting disk usage information')
         raise
 
 
 def get_nodeos_status():
     try:
-        ps_out = subprocess.check_output(['ps', 'aux']).decode('utf-8')
+        ps_out = subprocess.check_output(['ps', 'aux'], timeout=SUBPROCESS_TIMEOUT).decode('utf-8')
         nodeos_ps = [line for line in ps_out.split('\n') if 'nodeos' in line and 'grep' not in line]
         process_count = len(nodeos_ps)
         if process_count > 0:
             return 'is running.'
         else:
             return 'is NOT running.'
-    except subprocess.CalledProcessError:
-        print('Unable to check nodeos status.')
+    except subprocess.SubprocessError:
+        logger.exception('Unable to check nodeos status.')
         raise
 
 
 def get_network_status():
     try:
+        # imported here, it is slow to import and only the bot measures speed
+        import speedtest
         st = speedtest.Speedtest()
         st.get_best_server()
         ping = st.results.ping
@@ -100,20 +117,25 @@ def get_network_status():
                 'updated_at': get_timestamp_utcnow() 
             })
     except Exception as e:
-        print(f"Couldn't retrieve network stats, an exception occurred: {e}")
+        logger.warning("Couldn't retrieve network stats, an exception occurred: %s", e)
         return Network(**{'updated_at': 'an error occurred.'})
 
 
-async def get_system_info():
+def collect_system():
     return System(**{
         'cpu_load': get_cpu_load(),
         'ram_usage': get_ram_usage(),
         'disk_usage': get_disk_usage(),
         'nodeos_status': get_nodeos_status(),
-        'updated_at': get_timestamp_utcnow()
+        'updated_at': get_timestamp_utcnow(),
+        'cpu_cores': os.cpu_count() or 0,
     })
 
 
+async def get_system_info():
+    return collect_system()
+
+
 def get_payment(cleos: CLEOS, producer_name: str):
     payment_status = cleos.get_table(
         account='eosio',
@@ -140,9 +162,7 @@ def get_producer_status(
         upper_bound=producer_name,
         lower_bound=producer_name
     )
-    total_votes = 0
-    if int(float(producer_status[0].get('total_votes'))) > 0:
-        total_votes =  int(float(producer_status[0].get('total_votes'))) / 10000
+    total_votes = vote_weight(producer_status[0].get('total_votes'))
 
     bp_status = BlockProducer(**{
         'owner': producer_status[0].get('owner'),
@@ -164,11 +184,25 @@ def get_producer_status(
     return bp_status, missed_bpr_cache
 
 
+def get_last_claim_time(cleos: CLEOS, producer_name: str):
+    producer_status = cleos.get_table(
+        account='eosio',
+        scope='eosio',
+        table='producers',
+        limit=1,
+        upper_bound=producer_name,
+        lower_bound=producer_name
+    )
+    return parse_time_point(producer_status[0].get('last_claim_time'))
+
+
 def get_abi(cleos: CLEOS, abi_path: str):
     abi = cleos.get_abi('eosio')
     with open(abi_path, 'w') as file:
         json.dump(abi, file, indent=4)
+    forget_table_abi(abi_path)
     cleos.load_abi('eosio', abi)
+    return abi
 
 
 def get_timestamp_utcnow():
@@ -177,17 +211,22 @@ def get_timestamp_utcnow():
 
 def get_ntp_time(client: NTPClient):
     try:
-        response = client.request('pool.ntp.org')
+        with rpc_stats.timed('pool.ntp.org', 'ntp'):
+            response = client.request('pool.ntp.org')
         return response.tx_time
     except Exception as e:
-        print(f"Failed to get NTP time: {e}")
+        logger.warning("Failed to get NTP time: %s", e)
         return None
 
 
-def get_clock_offset(client: NTPClient):
+def get_clock_offset(client: NTPClient, attempts: int | None = 3):
     ntp_time = get_ntp_time(client)
     import time
     while ntp_time is None:
+        if attempts is not None:
+            attempts -= 1
+            if attempts <= 0:
+                raise TimeoutError('NTP server did not answer')
         ntp_time = get_ntp_time(client)
     system_time = time.time()
     clock_offset = system_time - ntp_time
@@ -201,9 +240,25 @@ def get_config(filename: str):
     cfg = ConfigParser()
     cfg.read(filename)
     try:
-        return Config(**dict(cfg['config']))
-    except KeyError as err:
-        print(f"Config exception: {err=}, {type(err)=}")
+        config = msgspec.convert({
+            **dict(cfg['config']),
+            'anomaly': {
+                section.split('.', 1)[1]: dict(cfg[section])
+                for section in cfg.sections() if section.startswith('anomaly.')
+            },
+            'chats': {
+                section.split('.', 1)[1]: dict(cfg[section])
+                for section in cfg.sections() if section.startswith('chat.')
+            }
+        }, Config, strict=False)
+        check_levels(config.log_level, config.log_levels)
+        if config.webhook_url and not config.webhook_secret:
+            raise ValueError('webhook_url needs a webhook_secret')
+        if config.fleet_port and not config.fleet_token:
+            raise ValueError('fleet_port needs a fleet_token')
+        return config
+    except (KeyError, ValueError, msgspec.ValidationError) as err:
+        logger.error("Config exception: err=%r, type(err)=%r", err, type(err))
         raise
 
 
@@ -225,50 +280,138 @@ async def call_with_retry(
     raise ex
 
 
-async def get_all_producers(url: str):
-    producers = []
-    lower = 0
-    while len(producers) < 42:
+page_decoders: dict[type, msgspec.json.Decoder] = {}
+
+
+def get_page_decoder(row_type: type) -> msgspec.json.Decoder:
+    decoder = page_decoders.get(row_type)
+    if decoder is None:
+        decoder = page_decoders[row_type] = msgspec.json.Decoder(
+            TablePage[row_type], strict=False)
+    return decoder
+
+
+async def iter_table_rows(
+    url: str,
+    code: str,
+    scope: str,
+    table: str,
+    index_position: int = 1,
+    key_type: str = '',
+    lower_bound: str = '',
+    upper_bound: str = '',
+    limit: int = 100,
+    row_type: type = dict,
+    abi: AbiDecoder | None = None,
+) -> AsyncIterator:
+    '''Streams the rows of an on-chain table page by page, following the
+    `more`/`next_key` cursor returned by the node. Only one page is held
+    at a time and breaking out of the iteration stops the requests.
+
+    Rows are decoded straight from the response body into `row_type`,
+    fields the struct does not declare are skipped by the decoder. With
+    `abi` the node sends the raw rows instead of converting them to JSON
+    and they are decoded here with the table layout of the abi.
+    '''
+    row_decoder = abi.table_decoder(table, row_type) if abi is not None else None
+    decoder = get_page_decoder(str if abi is not None else row_type)
+    while True:
         response = await call_with_retry(
+            rpc_stats.call,
+            url,
+            'get_table_rows',
             asks.post,
             f'{url}/v1/chain/get_table_rows',
             json={
-                'json': 'true',
-                'code': 'eosio',
-                'scope': 'eosio',
-                'table': 'producers',
-                'index_position': 2,
-                'key_type': 'float64',
-                'lower': lower,
-                'limit': 42
+                'json': abi is None,
+                'code': code,
+                'scope': scope,
+                'table': table,
+                'index_position': index_position,
+                'key_type': key_type,
+                'lower_bound': lower_bound,
+                'upper_bound': upper_bound,
+                'limit': limit
             }
         )
-        response = response.json()
-
-        producers += response['rows']
+        page = decoder.decode(response.content)
+
+        for row in page.rows:
+            yield row_decoder(bytes.fromhex(row)) if row_decoder is not None else row
+
+        next_key = page.next_key
+        if not page.more or not next_key or next_key == lower_bound:
+            return
+        lower_bound = next_key
+        # release the page before waiting on the next request
+        del page, response
+
+
+def iter_producers(
+    url: str,
+    limit: int = 100,
+    abi: AbiDecoder | None = None,
+    row_type: type = ProducerVotes,
+) -> AsyncIterator[ProducerVotes]:
+    '''Streams the producers table ordered by votes, active producers
+    first, as compact `ProducerVotes` rows or `row_type`.
+    '''
+    return iter_table_rows(
+        url,
+        'eosio',
+        'eosio',
+        'producers',
+        index_position=2,
+        key_type='float64',
+        limit=limit,
+        row_type=row_type,
+        abi=abi
+    )
 
-        lower = response['rows'][0]['total_votes']
 
+async def get_all_producers(
+    url: str,
+    limit: int | None = None,
+    abi: AbiDecoder | None = None,
+    row_type: type = ProducerVotes,
+) -> list[ProducerVotes]:
+    producers = []
+    async for producer in iter_producers(url, abi=abi, row_type=row_type):
+        if not producer.is_active or (limit and len(producers) >= limit):
+            break
+        producers.append(producer)
     return producers
 
 
-async def get_producers_list(url: str) -> list[str]:
-    producers = await get_all_producers(url)
-    return [ producer['owner'] for producer in producers ]
+async def find_producer_rank(url: str, producer_name: str, abi: AbiDecoder | None = None):
+    rank = 0
+    async for producer in iter_producers(url, abi=abi):
+        if not producer.is_active:
+            break
+        rank += 1
+        if producer.owner == producer_name:
+            return rank
+    return 0
+
+
+async def get_producers_list(url: str, abi: AbiDecoder | None = None) -> list[str]:
+    producers = await get_all_producers(url, STANDBY_SIZE, abi)
+    return [ producer.owner for producer in producers ]
 
 
 def get_neighbors(producers: list, producer_name: str):
     for index in range(1, len(producers)):
-        if producers[index].get('owner') == producer_name:
+        if producers[index].owner == producer_name:
             active = True
-            prev_bp = producers[index - 1].get('owner') 
-            next_bp = producers[index + 1].get('owner')
+            prev_bp = producers[index - 1].owner
+            next_bp = producers[index + 1].owner if index + 1 < len(producers) else None
             return active, prev_bp, next_bp
     return False, None, None
 
 
 async def get_rotation(cleos: CLEOS, config: dict):
-    active, prev_bp, next_bp = get_neighbors(await get_all_producers(config.node_url), config.producer_name)
+    producers = await get_all_producers(config.node_url, STANDBY_SIZE, get_table_abi(config))
+    active, prev_bp, next_bp = get_neighbors(producers, config.producer_name)
     return Rotation(**{
         'active': active,
         'prev_bp': prev_bp,
@@ -277,25 +420,50 @@ async def get_rotation(cleos: CLEOS, config: dict):
 
 
 async def get_rank(cleos: CLEOS, config: dict):
-    producers = await get_all_producers(config.node_url)
-    return next((i for i, d in enumerate(producers) if d.get('owner') == config.producer_name), -1) + 1
+    return await find_producer_rank(config.node_url, config.producer_name, get_table_abi(config))
+
+
+def get_producer_rank(producers: list, producer_name: str):
+    return next((i for i, d in enumerate(producers) if d.owner == producer_name), -1) + 1
 
 
-def sleep_delta(elapse_time, resource):
+async def get_status_context(
+        cleos: CLEOS,
+        ntp_client: NTPClient,
+        config: Config,
+        tracker: VoteTracker | None = None
+):
+    producers = await get_all_producers(config.node_url, abi=get_table_abi(config))
+    return build_status_context(producers, get_clock_offset(ntp_client), config.producer_name, tracker)
+
+
+def build_status_context(
+        producers: list[ProducerVotes],
+        clock_offset: str,
+        producer_name: str,
+        tracker: VoteTracker | None = None,
+        now: float | None = None
+):
+    '''The context of the active `producers` ordered by votes, shared by
+    the live cycle and the replay.
+    '''
+    active, prev_bp, next_bp = get_neighbors(producers[:STANDBY_SIZE], producer_name)
+    return StatusContext(**{
+        'clock_offset': clock_offset,
+        'rank': get_producer_rank(producers, producer_name),
+        'rotation': Rotation(active, prev_bp, next_bp),
+        'votes': tracker.update(producers, now) if tracker is not None else None
+    })
+
+
+def sleep_delta(elapse_time, resource, interval=3600):
     if resource == 'network':
-        sleep_time = 3600 - elapse_time
+        sleep_time = interval - elapse_time
     else:
         sleep_time = 1
     return max(sleep_time, 1)
 
 
-def health_threshold(value):
-    if float(value) >= 80:
-        return True
-    else:
-        return False
-
-
 def nodeos_failed(status: str):
     if status != 'is running.':
         return True
@@ -303,14 +471,44 @@ def nodeos_failed(status: str):
         return False
 
 
-async def health_check(cache: Cache):
-    cache.alert = False
-    if (health_threshold(float(cache.system.cpu_load.min_5 * 100) / 5) or
-        health_threshold(cache.system.ram_usage.percent) or
-        health_threshold(cache.system.disk_usage.percent) or
-        nodeos_failed(cache.system.nodeos_status)
-    ):
-        cache.alert = True
+async def health_check(
+        cache: Cache,
+        detector: AnomalyDetector | None = None,
+        now: float | None = None
+):
+    if detector is None:
+        detector = AnomalyDetector()
+    alerts = detector.evaluate(cache.system, now)
+    if nodeos_failed(cache.system.nodeos_status):
+        alerts.append(Alert(**{
+            'metric': 'nodeos',
+            'rule': 'state',
+            'value': 0,
+            'score': 1,
+            'reason': f'nodeos {cache.system.nodeos_status}'
+        }))
+    cache.alerts = alerts
     return cache
 
 
+async def evaluate_cycle(
+        cache: Cache,
+        producers: list[ProducerRow],
+        clock_offset: str,
+        config: Config,
+        detector: AnomalyDetector | None = None,
+        tracker: VoteTracker | None = None,
+        leaderboard=None,
+        monitors: tuple = (),
+        now: float | None = None
+) -> StatusContext:
+    '''Turns the inputs of one cycle into its context and alerts, the
+    live bot and the replay both go through here.
+    '''
+    context = build_status_context(producers, clock_offset, config.producer_name, tracker, now)
+    if leaderboard is not None:
+        leaderboard.update(producers, now)
+    await health_check(cache, detector, now)
+    for monitor in monitors:
+        cache.alerts += monitor.alerts()
+    return context
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import time
+import asyncio
+import logging
+import msgspec
+from typing import Awaitable, Callable, Optional
+from .types import *
+
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+    """Keeps the latest `StatusSnapshot` and refreshes it single-flighted.
+
+    `collect` runs one full collection cycle and returns the producer
+    status, the health checked cache and the chain context. Concurrent
+    refreshes share one in-flight collection, and `get` answers from the
+    current snapshot right away, only scheduling a background refresh
+    when it is older than `max_age` seconds.
+    """
+
+    def __init__(
+        self,
+        collect: Callable[[], Awaitable[tuple[BlockProducer, Cache, StatusContext]]],
+        max_age: float = 90,
+    ):
+        self.collect = collect
+        self.max_age = max_age
+        self.snapshot: Optional[StatusSnapshot] = None
+        self.updated_at: dict[str, float] = {}
+        self.version = 0
+        self.refreshed_at = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+
+    def mark(self, section: str, now: Optional[float] = None):
+        '''Records that `section` was just collected.'''
+        self.updated_at[section] = time.time() if now is None else now
+
+    def age(self, now: Optional[float] = None) -> float:
+        if self.snapshot is None:
+            return float('inf')
+        if now is None:
+            now = time.time()
+        return now - self.refreshed_at
+
+    async def refresh(self) -> StatusSnapshot:
+        '''Runs a collection cycle, or joins the one already running.'''
+        # a cancelled caller must not cancel the collection others wait on
+        return await asyncio.shield(self._start())
+
+    async def get(self) -> StatusSnapshot:
+        '''Returns the current snapshot, collecting one only if there is
+        none yet.
+        '''
+        if self.snapshot is None:
+            return await self.refresh()
+        if self.age() > self.max_age:
+            self._start()
+        return self.snapshot
+
+    def _start(self) -> asyncio.Task:
+        if self._refreshing is None:
+            self._refreshing = asyncio.create_task(self._refresh())
+            self._refreshing.add_done_callback(self._refreshed)
+        return self._refreshing
+
+    async def _refresh(self) -> StatusSnapshot:
+        bp_status, cache, context = await self.collect()
+        self.version += 1
+        self.refreshed_at = time.time()
+        self.snapshot = StatusSnapshot(
+            version=self.version,
+            bp_status=bp_status,
+            cache=msgspec.structs.replace(cache, hosts=dict(cache.hosts)),
+            context=context,
+            updated_at=dict(self.updated_at),
+        )
+        return self.snapshot
+
+    def _refreshed(self, task: asyncio.Task):
+        self._refreshing = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error('Status refresh failed: %s', task.exception())
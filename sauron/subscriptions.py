@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+from .types import *
+from .alerts import parse_users
+
+
+logger = logging.getLogger(__name__)
+
+
+VIEWS = ('full', 'alerts', 'daily')
+
+
+def get_view(subscription: Subscription) -> View:
+    if subscription.view not in VIEWS:
+        raise ValueError(f'Unknown view {subscription.view} for chat {subscription.chat_id}')
+    if subscription.view == 'alerts':
+        return View(
+            'alerts',
+            tuple(parse_users(subscription.metrics)),
+            tuple(parse_users(subscription.users)),
+        )
+    if subscription.view == 'daily':
+        if not 0 <= subscription.daily_at < 24:
+            raise ValueError(f'daily_at must be an UTC hour, got {subscription.daily_at}')
+        return View('daily', daily_at=subscription.daily_at)
+    return View('full')
+
+
+class SubscriptionRegistry:
+    """Maps views to the chats subscribed to them.
+
+    Subscriptions come from the `[chat.<name>]` sections of the config,
+    without any the `chat_id` of the config gets the full view. Daily
+    views are due once per UTC day, at their `daily_at` hour.
+    """
+
+    def __init__(self, subscriptions: list[Subscription]):
+        self.groups: dict[View, list[str]] = {}
+        for subscription in subscriptions:
+            chats = self.groups.setdefault(get_view(subscription), [])
+            if subscription.chat_id not in chats:
+                chats.append(subscription.chat_id)
+        self.sent_on: dict[View, str] = {}
+
+    @classmethod
+    def from_config(cls, config: Config):
+        if config.chats:
+            return cls(list(config.chats.values()))
+        return cls([Subscription(config.chat_id)])
+
+    def due(self, now: Optional[float] = None) -> dict[View, list[str]]:
+        if now is None:
+            now = time.time()
+        moment = datetime.fromtimestamp(now, timezone.utc)
+        today = moment.strftime('%Y-%m-%d')
+        due = {}
+        for view, chats in self.groups.items():
+            if view.view == 'daily':
+                if moment.hour != view.daily_at or self.sent_on.get(view) == today:
+                    continue
+                self.sent_on[view] = today
+            due[view] = chats
+        return due
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second on average
+    and bursts of `burst`.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Fanout:
+    """Delivers messages to many chats concurrently within the Telegram
+    limits: `rate` messages per second overall and one message every
+    `chat_interval` seconds per chat. Messages to the same chat keep
+    their order, a failing chat does not hold back the others.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str, str], Awaitable],
+        rate: float = 25,
+        chat_interval: float = 1,
+        concurrency: int = 8,
+    ):
+        self.send = send
+        self.limiter = RateLimiter(rate, burst=max(int(rate), 1))
+        self.chat_interval = chat_interval
+        self.chat_limiters: dict[str, RateLimiter] = {}
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def deliver(self, messages: list[tuple[str, str]]) -> int:
+        '''Sends `(chat_id, text)` pairs, returns how many were sent.'''
+        per_chat: dict[str, list[str]] = {}
+        for chat_id, text in messages:
+            per_chat.setdefault(chat_id, []).append(text)
+        sent = await asyncio.gather(*[
+            self._deliver_chat(chat_id, texts) for chat_id, texts in per_chat.items()
+        ])
+        return sum(sent)
+
+    async def _deliver_chat(self, chat_id: str, texts: list[str]) -> int:
+        limiter = self.chat_limiters.get(chat_id)
+        if limiter is None:
+            limiter = self.chat_limiters[chat_id] = RateLimiter(1 / self.chat_interval)
+        sent = 0
+        async with self.semaphore:
+            for text in texts:
+                await limiter.acquire()
+                await self.limiter.acquire()
+                try:
+                    await self.send(chat_id, text)
+                    sent += 1
+                except Exception as e:
+                    logger.warning('Could not send to chat %s: %s', chat_id, e)
+        return sent
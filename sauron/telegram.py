@@ -1,3 +1,5 @@
+import logging
+import time
 import json
 import click
 import asyncio
@@ -6,178 +8,490 @@ import importlib
 from ntplib import NTPClient
 from leap.cleos import CLEOS
 from leap.protocol.ds import get_tapos_info 
-from telebot.async_telebot import AsyncTeleBot
+from telebot import asyncio_helper
+from telebot.async_telebot import AsyncTeleBot, ExceptionHandler
 from telebot.types import CallbackQuery, Message
 from .utils import *
 from .service import *
+from .alerts import AlertManager
+from .webhook import serve_webhook
+from .transactions import TransactionPipeline
+from .claims import ClaimScheduler
+from .fleet import FleetReceiver
+from .log import set_levels, setup_logging_from_config
+from .replay import Recorder, RecordingCleos
+from .archive import COLUMNS, MetricArchive
+from .chart import MAX_WINDOW, METRICS, ChartRenderer, parse_window
+from .collectors import CollectorError, CollectorRunner
+from .watchdog import LoopWatchdog
+from .peers import PeerMonitor
+from .resources import ResourceError, ResourceMonitor
+from .leaderboard import ProducerLeaderboard
+from .snapshot import SnapshotStore
+from .rpcstats import InstrumentedCleos, RpcStats, rpc_stats
+from .reload import ConfigWatcher
+from .subscriptions import Fanout, SubscriptionRegistry
 
 
-def launch_telegram(filename):
+logger = logging.getLogger(__name__)
 
-    config = get_config(filename)
 
-    ntp_client = NTPClient()
+class CustomExceptionHandler(ExceptionHandler):
+    """A custom exception handler for telebot."""
+    async def handle(self, exception):
+        logger.error("An exception occurred: %s", exception, exc_info=exception)
+
+
+def instrument_telegram(stats: RpcStats = rpc_stats):
+    '''Times every Bot API request, they all go through `_process_request`.'''
+    process_request = asyncio_helper._process_request
+    if getattr(process_request, 'instrumented', False):
+        return
+
+    async def timed_request(token, url, *args, **kwargs):
+        # getUpdates is a long poll held open by Telegram, its latency is
+        # the poll timeout, only whether it failed is counted
+        with stats.timed('api.telegram.org', url, latency=url != 'getUpdates'):
+            return await process_request(token, url, *args, **kwargs)
+
+    timed_request.instrumented = True
+    asyncio_helper._process_request = timed_request
+
+
+def build_telegram(config: Config, filename: str | None = None, ntp_client: NTPClient | None = None):
+    '''Builds the bot and everything it drives from `config`. Returns the
+    bot and `start`, which registers the command handlers, starts the
+    background tasks and serves updates until cancelled. `start(serve=False)`
+    only starts the notifier and returns its tasks, updates are then
+    dispatched by the caller through `bot.process_new_updates`.
+    '''
+    if ntp_client is None:
+        ntp_client = NTPClient()
     bot = AsyncTeleBot(config.bot_token, exception_handler=CustomExceptionHandler())
-    cleos = CLEOS(endpoint=config.node_url)
+    cleos = InstrumentedCleos(CLEOS(endpoint=config.node_url), config.node_url)
+    instrument_telegram()
 
     global system_status_cache
     global missed_bpr_cache
     system_status_cache = Cache()
     missed_bpr_cache = 0
+    anomaly_detector = AnomalyDetector(config.anomaly)
+    alert_manager = AlertManager.from_config(config)
+    tx_pipeline = TransactionPipeline.from_config(config)
+    claim_scheduler = ClaimScheduler(
+        tx_pipeline,
+        config.producer_name,
+        lambda: get_last_claim_time(cleos, config.producer_name),
+    )
+    vote_tracker = VoteTracker.from_config(config)
+    recorder = Recorder(config.record_file) if config.record_file else None
+    chain = RecordingCleos(cleos, recorder) if recorder else cleos
+    archive = MetricArchive.from_config(config) if config.archive_dir else None
+    charts = ChartRenderer(archive)
+    collectors = CollectorRunner(config.collector_workers)
+    collectors.register('system', collect_system, config.system_timeout)
+    collectors.register('producer', get_producer_status, config.chain_timeout)
+    collectors.register('producers', get_all_producers, config.chain_timeout)
+    collectors.register('ntp', get_clock_offset, config.ntp_timeout)
+    # speedtest sockets can hang for good, only a process can be killed
+    collectors.register('network', get_network_status, config.network_timeout, isolated=True)
+    watchdog = LoopWatchdog(config.loop_lag_threshold_ms / 1000)
+    peer_monitor = PeerMonitor.from_config(config)
+    resource_monitor = ResourceMonitor.from_config(config)
+    # pushes are checked against the cached usage, a refusal against a fresh get_account
+    tx_pipeline.guard = resource_monitor.check
+    leaderboard = ProducerLeaderboard.from_config(config)
+
+    # the samples kept while their collector fails, the failure is alerted
+    last_samples = {
+        'producer': BlockProducer(config.producer_name, 0, 0, 0, 0, 0, 0, 0),
+        'producers': [],
+        'ntp': 'Unknown',
+    }
 
-    async def _async_main():
+    async def collect(name: str, *args):
+        '''The sample of collector `name`, None when it failed.'''
+        try:
+            return await collectors.run(name, *args)
+        except Exception as e:
+            logger.warning('Collector %s failed, keeping its last sample: %s', name, e)
+            return None
+
+    async def collect_status():
+        global missed_bpr_cache
+        global system_status_cache
+        if recorder is not None:
+            recorder.start_cycle()
+        system_status_cache.system = await collect('system') or system_status_cache.system
+        status_snapshots.mark('system')
+        producer = await collect('producer', chain, config.producer_name, missed_bpr_cache)
+        if producer is not None:
+            bp_status, missed_bpr_cache = producer
+            last_samples['producer'] = bp_status
+        else:
+            # a stale sample must not raise its missed blocks alert again
+            bp_status = msgspec.structs.replace(last_samples['producer'], alert=False)
+        status_snapshots.mark('producer')
+        producers = last_samples['producers'] = await collect(
+            'producers',
+            config.node_url,
+            None,
+            get_table_abi(config),
+            ProducerRow
+        ) or last_samples['producers']
+        clock_offset = last_samples['ntp'] = await collect('ntp', ntp_client) or last_samples['ntp']
+        status_snapshots.mark('chain')
+        context = await evaluate_cycle(
+            system_status_cache,
+            producers,
+            clock_offset,
+            config,
+            anomaly_detector,
+            vote_tracker,
+            leaderboard,
+            (peer_monitor, resource_monitor, collectors),
+        )
+        if recorder is not None:
+            recorder.record_cycle(
+                system_status_cache,
+                clock_offset,
+                producers,
+                peer_monitor.last,
+                list(resource_monitor.usage.values()),
+                collectors.alerts(),
+            )
+        if archive is not None:
+            await asyncio.to_thread(
+                archive.append,
+                system_status_cache.system,
+                system_status_cache.network,
+                bp_status,
+            )
+        return bp_status, system_status_cache, context
+
+    status_snapshots = SnapshotStore(collect_status, config.status_interval * 1.5)
+    subscriptions = SubscriptionRegistry.from_config(config)
+    fanout = Fanout(lambda chat_id, text: bot.send_message(chat_id, text, parse_mode='HTML'))
+
+    def apply_config(old: Config, new: Config):
+        '''Swaps a reloaded config in, the handlers read `config`, `cleos`
+        and `chain` from this scope so they pick the new ones up on their
+        next access. Only the subscriptions and `reconfigure` of the
+        pipeline can fail and they run before anything is changed, log
+        levels were already checked by `get_config`.
+        '''
+        nonlocal config, cleos, chain
+        registry = SubscriptionRegistry.from_config(new)
+        tx_pipeline.reconfigure(new)
+        # daily views already sent today are not sent again
+        subscriptions.groups = registry.groups
+        if new.node_url != old.node_url:
+            cleos = InstrumentedCleos(CLEOS(endpoint=new.node_url), new.node_url)
+            for account, abi in tx_pipeline.abis.items():
+                cleos.load_abi(account, abi)
+            chain = RecordingCleos(cleos, recorder) if recorder else cleos
+        alert_manager.reconfigure(new)
+        vote_tracker.reconfigure(new)
+        set_levels(new.log_level, new.log_levels)
+        status_snapshots.max_age = new.status_interval * 1.5
+        collectors.set_timeout('system', new.system_timeout)
+        collectors.set_timeout('network', new.network_timeout)
+        collectors.set_timeout('producer', new.chain_timeout)
+        collectors.set_timeout('producers', new.chain_timeout)
+        collectors.set_timeout('ntp', new.ntp_timeout)
+        watchdog.threshold = new.loop_lag_threshold_ms / 1000
+        peer_monitor.reconfigure(new)
+        resource_monitor.reconfigure(new)
+        leaderboard.reconfigure(new)
+        config = new
+
+    async def start(serve: bool = True):
 
         async def refresh_status_cache(resource: str):
             while True:
                 global system_status_cache
                 import time
                 start_time = int(time.time())
-                system_status_cache.network = await asyncio.to_thread(get_network_status)
+                try:
+                    system_status_cache.network = await collectors.run('network')
+                except (TimeoutError, CollectorError):
+                    system_status_cache.network = Network(updated_at='timed out.')
+                status_snapshots.mark('network')
                 finished_time = int(time.time())
-                sleep_time = sleep_delta(finished_time - start_time, resource)
+                sleep_time = sleep_delta(finished_time - start_time, resource, config.network_interval)
                 await asyncio.sleep(sleep_time)
 
 
         async def send_notification():
             while True:
                 try:
-                    global missed_bpr_cache
-                    global system_status_cache
-                    system_status_cache.system = await get_system_info()
-                    bp_status, missed_bpr_cache = get_producer_status(
-                        cleos,
-                        config.producer_name,
-                        missed_bpr_cache
-                    )
-
-                    response = await build_producer_status_message(
-                        cleos,
-                        ntp_client,
-                        bp_status,
-                        system_status_cache,
+                    snapshot = await status_snapshots.refresh()
+                    response = render_status_message(
+                        snapshot.bp_status,
+                        snapshot.cache,
+                        snapshot.context,
                         config,
+                        alert_manager,
                     )
-                    await bot.send_message(config.chat_id, response, parse_mode='HTML')
+                    messages = []
+                    for view, chats in subscriptions.due().items():
+                        text = render_view(view, snapshot, response, config, alert_manager)
+                        if text:
+                            messages += [(chat_id, text) for chat_id in chats]
+                    await fanout.deliver(messages)
                 except Exception as e:
-                    print(f'An exception occurred: {e}')
+                    logger.exception('An exception occurred: %s', e)
                 finally:
-                    await asyncio.sleep(60)
+                    await asyncio.sleep(config.status_interval)
 
 
         @bot.message_handler(commands=['r'])
         async def send_regproducer(message):
-            ref_block_num, ref_block_prefix = get_tapos_info(
-                    cleos.get_info()['last_irreversible_block_id'])
-            data_regproducer = [
-                config.producer_name,
-                config.producer_public_key,
-                config.producer_url,
-                int(config.location)
-            ]
-            res = cleos.push_action(
-                account='eosio',
-                action='regproducer',
-                data=data_regproducer,
-                actor=config.producer_name,
-                key=config.register_private_key,
-                permission=config.register_permission,
-                ref_block_num=ref_block_num,
-                ref_block_prefix=ref_block_prefix
-            )
+            try:
+                res = await tx_pipeline.push('regproducer')
+            except ResourceError as e:
+                await bot.reply_to(message=message, text=get_resource_error_message(e), parse_mode='HTML')
+                return
             await bot.reply_to(
                     message=message,
                     text=(
                         f"<b>Bp Registered.</b>\n"
-                        f"<i><u>tx_id:</u></i> <code>{res['transaction_id']}</code>"
+                        f"<i><u>tx_id:</u></i> <code>{res.transaction_id}</code>\n"
+                        f"{get_latency_message(res)}"
                     ),
                     parse_mode='HTML')
 
 
         @bot.message_handler(commands=['u'])
         async def send_unregprod(message):
-            ref_block_num, ref_block_prefix = get_tapos_info(
-                    cleos.get_info()['last_irreversible_block_id'])
-            res = cleos.push_action(
-                account='eosio',
-                action='unregprod',
-                data=[config.producer_name],
-                actor=config.producer_name,
-                key=config.register_private_key,
-                permission=config.register_permission,
-                ref_block_num=ref_block_num,
-                ref_block_prefix=ref_block_prefix
-            )
+            try:
+                res = await tx_pipeline.push('unregprod')
+            except ResourceError as e:
+                await bot.reply_to(message=message, text=get_resource_error_message(e), parse_mode='HTML')
+                return
             await bot.reply_to(
                     message=message,
                     text=(
                         f"<b>BP Unregistered.</b>\n"
-                        f"<i><u>tx_id:</u></i> <code>{res['transaction_id']}</code>"
+                        f"<i><u>tx_id:</u></i> <code>{res.transaction_id}</code>\n"
+                        f"{get_latency_message(res)}"
                     ),
                     parse_mode='HTML')
 
 
-        #@bot.message_handler(commands=['c'])
+        @bot.message_handler(commands=['c'])
         async def request_claim_rewards(message):
-            ref_block_num, ref_block_prefix = get_tapos_info(
-                    cleos.get_info()['last_irreversible_block_id'])
-            res = cleos.push_action(
-                account='eosio',
-                action='claimrewards',
-                data=[config.producer_name],
-                actor=config.producer_name,
-                key=config.claimer_private_key,
-                permission=config.claimer_permission,
-                ref_block_num=ref_block_num,
-                ref_block_prefix=ref_block_prefix
-            )
+            try:
+                record = await claim_scheduler.claim()
+            except ResourceError as e:
+                await bot.reply_to(message=message, text=get_resource_error_message(e), parse_mode='HTML')
+                return
             await bot.reply_to(
                     message=message,
                     text=(
-                        f"<b>Claimed rewards:</b>"
-                        f"<code>{res['processed']['action_traces'][0]['inline_traces'][0]['act']['data']['quantity']}</code>\n"
-                        f"<i><u>tx_id:</u></i> <code>{res['transaction_id']}</code>\n"
+                        f"<b>Claimed rewards:</b> <code>{record.quantity}</code>\n"
+                        f"<i><u>tx_id:</u></i> <code>{record.transaction_id}</code>\n"
                     ),
                     parse_mode='HTML')
 
 
+        @bot.message_handler(commands=['history'])
+        async def request_claim_history(message):
+            await bot.reply_to(
+                    message=message,
+                    text=get_claim_history_message(claim_scheduler.history),
+                    parse_mode='HTML')
+
+
         @bot.message_handler(commands=['schedule'])
         async def request_producers_schedule(message):
-            producers = await get_producers_list(config.node_url)
+            producers = await get_producers_list(config.node_url, get_table_abi(config))
             schedule = get_schedule_message(producers, config.producer_name)
             await bot.reply_to(message=message, text=schedule, parse_mode='HTML')
 
 
         @bot.message_handler(commands=['s'])
         async def request_producer_status(message):
-            global system_status_cache
-            global missed_bpr_cache
-            system_status_cache.system = await get_system_info()
-            bp_status, missed_bpr_cache = get_producer_status(
-                cleos,
-                config.producer_name,
-                missed_bpr_cache
-            )
-
-            response = await build_producer_status_message(
-                cleos,
-                ntp_client,
-                bp_status,
-                system_status_cache,
+            snapshot = await status_snapshots.get()
+            response = render_status_message(
+                snapshot.bp_status,
+                snapshot.cache,
+                snapshot.context,
                 config,
+                alert_manager,
+                notify=False,
+                updated_at=snapshot.updated_at,
             )
             await bot.reply_to(message=message, text=response, parse_mode='HTML')
 
 
+        @bot.message_handler(commands=['ack'])
+        async def request_ack(message):
+            args = message.text.split()
+            key = args[1] if len(args) > 1 else None
+            user = f'@{message.from_user.username}' if message.from_user.username else message.from_user.first_name
+            acked = alert_manager.acknowledge(user, key)
+            text = '<b>No firing alerts.</b>'
+            if acked:
+                text = f"<b>Acknowledged:</b> <code>{', '.join(acked)}</code>"
+            await bot.reply_to(message=message, text=text, parse_mode='HTML')
+
+
+        @bot.message_handler(commands=['votes'])
+        async def request_vote_moves(message):
+            await bot.reply_to(
+                    message=message,
+                    text=get_vote_moves_message(vote_tracker.last_diff, config.producer_name),
+                    parse_mode='HTML')
+
+
+        @bot.message_handler(commands=['rpc'])
+        async def request_rpc_report(message):
+            reports = rpc_stats.report(config.rpc_slo_availability)
+            await bot.reply_to(
+                    message=message,
+                    text=get_rpc_message(reports, config),
+                    parse_mode='HTML')
+
+
+        @bot.message_handler(commands=['metric'])
+        async def request_metric(message):
+            args = message.text.split()
+            if archive is None:
+                text = '<i>Set archive_dir to keep a metric archive.</i>'
+            elif len(args) < 2 or args[1] not in COLUMNS:
+                text = f"<b>Columns:</b> <code>{', '.join(COLUMNS)}</code>"
+            else:
+                hours = float(args[2]) if len(args) > 2 and args[2].replace('.', '', 1).isdigit() else 24
+                # the same bounds as /chart, far past dates are out of datetime range
+                hours = min(hours, MAX_WINDOW / 3600) if hours > 0 else 24
+                end = time.time()
+                start = end - hours * 3600
+                aggregate = await asyncio.to_thread(archive.window, args[1], start, end)
+                points = await asyncio.to_thread(archive.downsample, args[1], start, end, hours * 3600 / 24)
+                text = get_metric_message(aggregate, points)
+            await bot.reply_to(message=message, text=text, parse_mode='HTML')
+
+
+        @bot.message_handler(commands=['chart'])
+        async def request_chart(message):
+            args = message.text.split()
+            metric = args[1] if len(args) > 1 else None
+            window_text = args[2] if len(args) > 2 else '24h'
+            try:
+                window = parse_window(window_text)
+            except ValueError as e:
+                await bot.reply_to(message=message, text=f'<i>{e}</i>', parse_mode='HTML')
+                return
+            if metric not in METRICS:
+                text = f"<b>Charts:</b> <code>{', '.join(METRICS)}</code> <i>/chart cpu 6h</i>"
+                await bot.reply_to(message=message, text=text, parse_mode='HTML')
+                return
+            png, points = await charts.render(metric, window, status_snapshots.version)
+            if not points:
+                await bot.reply_to(message=message, text='<i>No history for this chart yet.</i>', parse_mode='HTML')
+                return
+            await bot.send_photo(
+                    message.chat.id,
+                    photo=png,
+                    caption=get_chart_caption(metric, window_text, points),
+                    parse_mode='HTML',
+                    reply_to_message_id=message.message_id)
+
+
+        @bot.message_handler(commands=['collectors'])
+        async def request_collector_stats(message):
+            await bot.reply_to(
+                    message=message,
+                    text=get_collectors_message(collectors.report()),
+                    parse_mode='HTML')
+
+
+        @bot.message_handler(commands=['perf'])
+        async def request_loop_health(message):
+            await bot.reply_to(
+                    message=message,
+                    text=get_perf_message(watchdog.report(), collectors.report()),
+                    parse_mode='HTML')
+
+
+        @bot.message_handler(commands=['peers'])
+        async def request_peers(message):
+            await bot.reply_to(
+                    message=message,
+                    text=get_peers_message(peer_monitor.last, peer_monitor.min_peers),
+                    parse_mode='HTML')
+
+
+        @bot.message_handler(commands=['res'])
+        async def request_resources(message):
+            usage = await resource_monitor.get()
+            await bot.reply_to(
+                    message=message,
+                    text=get_resources_message(list(usage.values()), resource_monitor.warn_percent),
+                    parse_mode='HTML')
+
+
+        @bot.message_handler(commands=['network'])
+        async def request_network_board(message):
+            board = await leaderboard.get()
+            await bot.reply_to(
+                    message=message,
+                    text=get_network_message(board, config.producer_name),
+                    parse_mode='HTML')
+
+
         @bot.message_handler(commands=['h'])
         async def request_help_message(message):
             await bot.reply_to(message=message, text=build_help_message(), parse_mode='HTML')
 
 
-        get_abi(cleos, config.abi_path)
+        tasks = [
+            asyncio.create_task(watchdog.run()),
+            asyncio.create_task(send_notification()),
+        ]
+        if not serve:
+            return tasks
+        # the pipeline pushes through its own clients, they need the abi too
+        tx_pipeline.load_abi('eosio', get_abi(cleos, config.abi_path))
 
         asyncio.create_task(refresh_status_cache('network'))
-        asyncio.create_task(send_notification())  
-        await bot.infinity_polling()
+        if config.peers or config.peer_net_api:
+            asyncio.create_task(peer_monitor.run())
+        asyncio.create_task(resource_monitor.run())
+        asyncio.create_task(tx_pipeline.tapos.run())
+        if config.auto_claim:
+            asyncio.create_task(claim_scheduler.run())
+        if config.fleet_port:
+            fleet_receiver = FleetReceiver.from_config(system_status_cache, config)
+            await fleet_receiver.start(config.fleet_listen, config.fleet_port, config.fleet_path)
+            asyncio.create_task(fleet_receiver.watch())
+        if config.config_reload_interval > 0:
+            watcher = ConfigWatcher(
+                filename,
+                config,
+                get_config,
+                apply_config,
+                config.config_reload_interval,
+            )
+            asyncio.create_task(watcher.run())
+        try:
+            if config.webhook_url:
+                await serve_webhook(bot, config)
+            else:
+                await bot.infinity_polling()
+        finally:
+            charts.close()
+            collectors.close()
+
+    return bot, start
+
+
+def launch_telegram(filename):
+
+    config = get_config(filename)
+    setup_logging_from_config(config)
 
-    asyncio.run(_async_main())
+    bot, start = build_telegram(config, filename)
+    asyncio.run(start())
 
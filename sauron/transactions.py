@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+import logging
+import re
+import time
+import asyncio
+from typing import Awaitable, Callable, Optional
+from leap.cleos import CLEOS
+from leap.protocol.ds import get_tapos_info
+from .types import *
+from .rpcstats import InstrumentedCleos
+from .resources import ResourceError
+
+
+logger = logging.getLogger(__name__)
+
+
+NAME_PATTERN = re.compile(r'^[a-z1-5.]{1,12}$')
+
+
+class TaposCache:
+    """TaPoS reference block kept fresh in the background.
+
+    The last irreversible block stays a valid reference for hours, so it
+    is refreshed every `interval` seconds from whichever endpoint answers
+    first and transactions never wait on a `get_info` round trip.
+    """
+
+    def __init__(self, clients: list[CLEOS], interval: float = 30, max_age: float = 600):
+        self.clients = clients
+        self.interval = interval
+        self.max_age = max_age
+        self.ref_block_num = None
+        self.ref_block_prefix = None
+        self.updated_at = None
+
+    async def refresh(self):
+        info = await first_success([
+            asyncio.to_thread(client.get_info) for client in self.clients
+        ])
+        self.ref_block_num, self.ref_block_prefix = get_tapos_info(
+            info['last_irreversible_block_id'])
+        self.updated_at = time.monotonic()
+
+    async def get(self) -> tuple[int, int]:
+        if self.updated_at is None or time.monotonic() - self.updated_at > self.max_age:
+            await self.refresh()
+        return self.ref_block_num, self.ref_block_prefix
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning('An exception occurred while refreshing tapos: %s', e)
+            await asyncio.sleep(self.interval)
+
+
+def build_actions(config: Config) -> dict[str, PreparedAction]:
+    '''Builds and validates the producer actions once at startup, so a
+    broken config fails loudly instead of during an incident.
+    '''
+    if not NAME_PATTERN.match(config.producer_name):
+        raise ValueError(f'Invalid producer name: {config.producer_name}')
+    if not config.producer_public_key.startswith(('EOS', 'PUB_K1_')):
+        raise ValueError(f'Invalid producer public key: {config.producer_public_key}')
+    if len(config.producer_url) > 512:
+        raise ValueError('Producer url longer than 512 characters')
+
+    register = {
+        'actor': config.producer_name,
+        'key': config.register_private_key,
+        'permission': config.register_permission,
+    }
+    return {
+        'regproducer': PreparedAction(**register, **{
+            'action': 'regproducer',
+            'data': [
+                config.producer_name,
+                config.producer_public_key,
+                config.producer_url,
+                int(config.location)
+            ],
+        }),
+        'unregprod': PreparedAction(**register, **{
+            'action': 'unregprod',
+            'data': [config.producer_name],
+        }),
+        'claimrewards': PreparedAction(**{
+            'action': 'claimrewards',
+            'data': [config.producer_name],
+            'actor': config.producer_name,
+            'key': config.claimer_private_key,
+            'permission': config.claimer_permission,
+        }),
+    }
+
+
+async def first_success(coros: list):
+    '''Runs `coros` concurrently and returns the first successful result,
+    the rest are cancelled. Raises the last exception if all of them fail.
+    '''
+    if not coros:
+        raise ValueError('No endpoints to send the request to')
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    ex = None
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                return await next_done
+            except Exception as e:
+                ex = e
+    finally:
+        for task in tasks:
+            task.cancel()
+    raise ex
+
+
+class TransactionPipeline:
+    """Pushes prepared actions to several endpoints in parallel.
+
+    The first endpoint to accept the transaction wins. The producer
+    actions are idempotent, so a late duplicate from a slower endpoint
+    is harmless. A `guard` returning a reason for the signing account
+    stops the push before it reaches the chain. The abis loaded through
+    `load_abi` are kept and loaded into clients of endpoints added later.
+    """
+
+    def __init__(
+        self,
+        endpoints: list[str],
+        actions: dict[str, PreparedAction],
+        tapos: Optional[TaposCache] = None,
+        guard: Optional[Callable[[str], Awaitable[Optional[str]]]] = None,
+    ):
+        self.abis: dict[str, dict] = {}
+        self.clients = {endpoint: self.new_client(endpoint) for endpoint in endpoints}
+        self.actions = actions
+        self.tapos = tapos or TaposCache(list(self.clients.values()))
+        self.guard = guard
+
+    @classmethod
+    def from_config(cls, config: Config):
+        return cls(get_push_endpoints(config), build_actions(config))
+
+    def new_client(self, endpoint: str):
+        client = InstrumentedCleos(CLEOS(endpoint=endpoint), endpoint)
+        for account, abi in self.abis.items():
+            client.load_abi(account, abi)
+        return client
+
+    def load_abi(self, account: str, abi: dict):
+        '''Loads `abi` into every client, actions of `account` are
+        serialized with it.
+        '''
+        self.abis[account] = abi
+        for client in self.clients.values():
+            client.load_abi(account, abi)
+
+    def reconfigure(self, config: Config):
+        '''Swaps in the endpoints and actions of a new config, clients of
+        unchanged endpoints are kept and pushes in flight finish on the
+        clients they started with.
+        '''
+        actions = build_actions(config)
+        clients = {
+            endpoint: self.clients.get(endpoint) or self.new_client(endpoint)
+            for endpoint in get_push_endpoints(config)
+        }
+        self.clients = clients
+        self.actions = actions
+        self.tapos.clients = list(clients.values())
+
+    def _push(self, endpoint: str, client, prepared: PreparedAction, ref_block: tuple[int, int]):
+        res = client.push_action(
+            account='eosio',
+            action=prepared.action,
+            data=prepared.data,
+            actor=prepared.actor,
+            key=prepared.key,
+            permission=prepared.permission,
+            ref_block_num=ref_block[0],
+            ref_block_prefix=ref_block[1]
+        )
+        return endpoint, res
+
+    async def push(self, action: str) -> TxResult:
+        start = time.perf_counter()
+        prepared = self.actions[action]
+        reason = await self.guard(prepared.actor) if self.guard is not None else None
+        if reason:
+            raise ResourceError(reason)
+        ref_block = await self.tapos.get()
+        endpoint, res = await first_success([
+            asyncio.to_thread(self._push, endpoint, client, prepared, ref_block)
+            for endpoint, client in self.clients.items()
+        ])
+        return TxResult(**{
+            'action': action,
+            'transaction_id': res['transaction_id'],
+            'endpoint': endpoint,
+            'latency_ms': round((time.perf_counter() - start) * 1000, 2),
+            'response': res,
+        })
+
+
+def get_push_endpoints(config: Config) -> list[str]:
+    endpoints = [config.node_url, config.local_node_url]
+    if config.push_endpoints:
+        endpoints = [item.strip() for item in config.push_endpoints.split(',')]
+    return list(dict.fromkeys(endpoint for endpoint in endpoints if endpoint))
@@ -1,14 +1,39 @@
 #!/usr/bin/env python3
 
 import msgspec
-from typing import Optional
-from telebot.async_telebot import ExceptionHandler
+from typing import Any, Generic, Optional, TypeVar
 
 
-class CustomExceptionHandler(ExceptionHandler):
-    """A custom exception handler for telebot."""
-    async def handle(self, exception):
-        print(f"An exception occurred: {exception}")
+Row = TypeVar('Row')
+
+
+class MetricRule(msgspec.Struct, frozen=True):
+    """A struct describing the anomaly rules of a metric."""
+    alpha: float = 0.1
+    window: int = 30
+    warmup: int = 10
+    z_max: float = 4.0
+    min_std: float = 1.0
+    rate_max: Optional[float] = None
+    limit: Optional[float] = 80
+
+
+class Subscription(msgspec.Struct, frozen=True):
+    """A struct describing a chat subscribed to a view."""
+    chat_id: str
+    view: str = 'full'
+    metrics: Optional[str] = None
+    users: Optional[str] = None
+    daily_at: int = 9
+
+
+class View(msgspec.Struct, frozen=True):
+    """A struct describing what a group of chats receives, chats with
+    equal views share one render."""
+    view: str
+    metrics: tuple[str, ...] = ()
+    users: tuple[str, ...] = ()
+    daily_at: int = 0
 
 
 class Config(msgspec.Struct):
@@ -27,16 +52,72 @@ class Config(msgspec.Struct):
     register_permission: str
     register_private_key: str
     users_alerted: str
+    users_escalated: Optional[str] = None
+    alert_enter_after: int = 1
+    alert_exit_after: int = 3
+    alert_dedup_window: int = 15
+    alert_escalate_after: int = 10
+    webhook_url: Optional[str] = None
+    webhook_path: str = '/telegram'
+    webhook_listen: str = '0.0.0.0'
+    webhook_port: int = 8443
+    webhook_secret: Optional[str] = None
+    webhook_workers: int = 4
+    webhook_queue_size: int = 100
+    push_endpoints: Optional[str] = None
+    auto_claim: bool = False
+    fleet_listen: str = '0.0.0.0'
+    fleet_port: Optional[int] = None
+    fleet_path: str = '/fleet'
+    fleet_token: str = ''
+    fleet_stale_after: int = 180
+    fleet_hosts: Optional[str] = None
+    fleet_max_hosts: int = 32
+    log_level: str = 'INFO'
+    log_levels: Optional[str] = None
+    log_file: Optional[str] = None
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_rotate_hours: int = 24
+    log_backup_count: int = 14
+    record_file: Optional[str] = None
+    vote_warn_hours: float = 6
+    vote_warn_margin: float = 1.0
+    rpc_slo_availability: float = 99.5
+    rpc_slo_latency_ms: float = 2000
+    status_interval: int = 60
+    network_interval: int = 3600
+    config_reload_interval: int = 5
+    anomaly: dict[str, MetricRule] = {}
+    chats: dict[str, Subscription] = {}
+    archive_dir: Optional[str] = None
+    archive_hot_days: int = 2
+    collector_workers: int = 4
+    system_timeout: float = 20
+    network_timeout: float = 180
+    ntp_timeout: float = 20
+    chain_timeout: float = 30
+    loop_lag_threshold_ms: float = 250
+    peers: Optional[str] = None
+    peer_net_api: bool = True
+    peer_min: int = 3
+    peer_interval: int = 60
+    peer_concurrency: int = 64
+    peer_timeout: float = 3
+    resource_accounts: Optional[str] = None
+    resource_interval: int = 60
+    resource_warn_percent: float = 90
+    resource_warn_hours: float = 6
+    binary_tables: bool = False
 
 
-class CpuLoad(msgspec.Struct, frozen=True):
+class CpuLoad(msgspec.Struct, frozen=True, gc=False):
     """A struct describing the cpu loads."""
     min_1: float = 0
     min_5: float = 0
     min_15: float = 0
 
 
-class RamUsage(msgspec.Struct, frozen=True):
+class RamUsage(msgspec.Struct, frozen=True, gc=False):
     """A struct describing the ram usage."""
     total_gb: float  = 0
     used_gb: float = 0
@@ -45,7 +126,7 @@ class RamUsage(msgspec.Struct, frozen=True):
     percent: float = 0
 
 
-class DiskUsage(msgspec.Struct, frozen=True):
+class DiskUsage(msgspec.Struct, frozen=True, gc=False):
     """A struct describing the disk usage."""
     total_gb: float  = 0
     used_gb: float = 0
@@ -53,16 +134,17 @@ class DiskUsage(msgspec.Struct, frozen=True):
     percent: float = 0
 
 
-class System(msgspec.Struct, frozen=True):
+class System(msgspec.Struct, frozen=True, gc=False):
     """A struct describing the system."""
     cpu_load: CpuLoad = CpuLoad()
     ram_usage: RamUsage = RamUsage()
     disk_usage: DiskUsage = DiskUsage()
     nodeos_status: str = 'Waitting...'
     updated_at: str = 'Waitting...'
+    cpu_cores: int = 0
 
 
-class Network(msgspec.Struct, frozen=True):
+class Network(msgspec.Struct, frozen=True, gc=False):
     """A struct describing the network."""
     ping: Optional[float] = 0
     down: Optional[float] = 0
@@ -70,14 +152,49 @@ class Network(msgspec.Struct, frozen=True):
     updated_at: str = 'Waitting...'
 
 
+class Alert(msgspec.Struct, frozen=True, gc=False):
+    """A struct describing a scored anomaly alert."""
+    metric: str
+    rule: str
+    value: float
+    score: float
+    reason: str
+
+
+class AlertNotice(msgspec.Struct, frozen=True):
+    """A struct describing the outcome of an alert cycle."""
+    users: list[str] = []
+    raised: list[str] = []
+    resolved: list[str] = []
+    notified: list[str] = []
+
+
 class Cache(msgspec.Struct):
     """A struct describing the cache."""
     system: System = System()
     network: Network = Network()
-    alert: bool = False
+    alerts: list[Alert] = []
+    hosts: dict[str, 'Cache'] = {}
+
+    @property
+    def alert(self) -> bool:
+        return len(self.alerts) > 0
+
+
+class HostSample(msgspec.Struct, array_like=True, frozen=True, gc=False):
+    """A struct describing a system sample pushed by a fleet agent."""
+    host: str
+    sent_at: float
+    system: System
+
+
+class FleetBatch(msgspec.Struct, array_like=True, frozen=True):
+    """A struct describing a batch of fleet samples."""
+    token: str
+    samples: list[HostSample]
 
 
-class BlockProducer(msgspec.Struct):
+class BlockProducer(msgspec.Struct, gc=False):
     """A struct describing the block producer."""
     owner: str
     is_active: int
@@ -90,10 +207,372 @@ class BlockProducer(msgspec.Struct):
     alert: bool = False
 
 
-class Rotation(msgspec.Struct):
+class ProducerVotes(msgspec.Struct, frozen=True, gc=False):
+    """A struct describing the fields of a producers table row we keep."""
+    owner: str
+    total_votes: float
+    is_active: bool = True
+
+
+class TablePage(msgspec.Struct, Generic[Row]):
+    """A struct describing a page of `get_table_rows`."""
+    rows: list[Row]
+    more: bool = False
+    next_key: str = ''
+
+
+class PreparedAction(msgspec.Struct, frozen=True):
+    """A struct describing a validated eosio action ready to be pushed."""
+    action: str
+    data: list
+    actor: str
+    key: str
+    permission: str
+
+
+class TxResult(msgspec.Struct, frozen=True):
+    """A struct describing a pushed transaction."""
+    action: str
+    transaction_id: str
+    endpoint: str
+    latency_ms: float
+    response: dict = {}
+
+
+class ClaimRecord(msgspec.Struct, frozen=True):
+    """A struct describing a rewards claim."""
+    claimed_at: str
+    quantity: str
+    transaction_id: str
+    latency_ms: float
+    attempts: int = 1
+
+
+class Rotation(msgspec.Struct, gc=False):
     """A struct describing the block producer rotation."""
     active: bool
     prev_bp: Optional[str] = None
     next_bp: Optional[str] = None
 
 
+class RankMove(msgspec.Struct, frozen=True, gc=False):
+    """A struct describing a producer rank change, 0 means unranked."""
+    owner: str
+    old_rank: int
+    new_rank: int
+    votes_delta: float
+
+
+class VoteDiff(msgspec.Struct):
+    """A struct describing the changes between two producer snapshots."""
+    elapsed_s: float = 0
+    moves: list[RankMove] = []
+    entered_top21: list[str] = []
+    left_top21: list[str] = []
+    entered_top42: list[str] = []
+    left_top42: list[str] = []
+    rank: int = 0
+    votes: float = 0
+    votes_delta: float = 0
+    challenger: Optional[str] = None
+    margin: Optional[float] = None
+    eta_s: Optional[float] = None
+    alerts: list[Alert] = []
+
+
+class StatusContext(msgspec.Struct, frozen=True):
+    """A struct describing the chain and clock context of a status."""
+    clock_offset: str
+    rank: int
+    rotation: Rotation
+    votes: Optional[VoteDiff] = None
+
+
+class StatusSnapshot(msgspec.Struct, frozen=True):
+    """A struct describing a precomputed status, `updated_at` holds the
+    collection time of each section."""
+    version: int
+    bp_status: BlockProducer
+    cache: Cache
+    context: StatusContext
+    updated_at: dict[str, float] = {}
+
+
+class RpcReport(msgspec.Struct, frozen=True):
+    """A struct describing the latency and availability of an endpoint."""
+    endpoint: str
+    method: str
+    requests_1h: int
+    requests_24h: int
+    p50_ms: Optional[float]
+    p99_ms: Optional[float]
+    availability_1h: float
+    availability_24h: float
+    burn_1h: float
+    burn_24h: float
+    last_error: Optional[str] = None
+
+
+class StatusReport(msgspec.Struct):
+    """A struct describing a one-shot status, sections that failed or
+    missed the deadline are None and explained in `errors`."""
+    producer: str
+    state: str = 'ok'
+    exit_code: int = 0
+    elapsed_ms: float = 0
+    system: Optional[System] = None
+    bp_status: Optional[BlockProducer] = None
+    rank: Optional[int] = None
+    rotation: Optional[Rotation] = None
+    clock_offset: Optional[str] = None
+    alerts: list[Alert] = []
+    errors: dict[str, str] = {}
+
+
+class CollectorStats(msgspec.Struct):
+    """A struct describing the runs of a blocking collector, `restarts`
+    counts the isolated workers killed after a timeout."""
+    name: str
+    isolated: bool = False
+    runs: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    restarts: int = 0
+    running: bool = False
+    last_ms: float = 0
+    max_ms: float = 0
+    total_ms: float = 0
+    last_error: Optional[str] = None
+
+
+class Stall(msgspec.Struct, frozen=True):
+    """A struct describing a stretch the event loop could not run,
+    `stack` is where the loop thread was caught while blocked, one
+    `file:line in function: code` entry per frame."""
+    at: float
+    lag_ms: float
+    stack: list[str] = []
+
+
+class LoopHealth(msgspec.Struct, frozen=True):
+    """A struct describing the event loop lag over the last minute."""
+    samples: int
+    lag_p50_ms: float
+    lag_p99_ms: float
+    lag_max_ms: float
+    stalls: int
+    tasks: int
+    recent: list[Stall] = []
+
+
+class NetHandshake(msgspec.Struct, frozen=True):
+    """A struct describing the last handshake of a net api connection."""
+    p2p_address: str = ''
+    head_num: int = 0
+    last_irreversible_block_num: int = 0
+    agent: str = ''
+
+
+class NetConnection(msgspec.Struct, frozen=True):
+    """A struct describing a row of `/v1/net/connections`."""
+    peer: str = ''
+    connecting: bool = False
+    syncing: bool = False
+    is_socket_open: bool = True
+    last_handshake: NetHandshake = NetHandshake()
+
+
+class PeerState(msgspec.Struct, frozen=True, gc=False):
+    """A struct describing a p2p peer, `latency_ms` is the TCP handshake
+    time when the peer is probed."""
+    address: str
+    connected: bool
+    latency_ms: Optional[float] = None
+    syncing: bool = False
+    head_num: int = 0
+    error: Optional[str] = None
+
+
+class PeerReport(msgspec.Struct, frozen=True):
+    """A struct describing the peers of the node at a poll, `added` and
+    `removed` are the changes since the previous poll."""
+    updated_at: float
+    connected: int
+    syncing: int = 0
+    latency_p50_ms: Optional[float] = None
+    latency_max_ms: Optional[float] = None
+    added: list[str] = []
+    removed: list[str] = []
+    churn_1h: int = 0
+    peers: list[PeerState] = []
+    error: Optional[str] = None
+
+
+class ResourceLimit(msgspec.Struct, frozen=True, gc=False):
+    """A struct describing the cpu or net limit of an account."""
+    used: int = 0
+    available: int = 0
+    max: int = 0
+
+
+class AccountResources(msgspec.Struct, frozen=True):
+    """A struct describing the `get_account` fields we read."""
+    account_name: str
+    ram_quota: int = 0
+    ram_usage: int = 0
+    cpu_limit: ResourceLimit = ResourceLimit()
+    net_limit: ResourceLimit = ResourceLimit()
+    core_liquid_balance: Optional[str] = None
+
+
+class ResourceUsage(msgspec.Struct, frozen=True):
+    """A struct describing the resource usage of an account in percent,
+    the `*_eta_s` fields are the seconds left at the trend of the last
+    hour, None when usage is not growing."""
+    account: str
+    cpu_percent: float
+    net_percent: float
+    ram_percent: float
+    cpu_eta_s: Optional[float] = None
+    net_eta_s: Optional[float] = None
+    ram_eta_s: Optional[float] = None
+    balance: Optional[str] = None
+    updated_at: float = 0
+
+
+class ProducerRow(msgspec.Struct, frozen=True, gc=False):
+    """A struct describing the producers table fields of the leaderboard."""
+    owner: str
+    total_votes: float = 0
+    is_active: bool = True
+    lifetime_produced_blocks: int = 0
+    lifetime_missed_blocks: int = 0
+    missed_blocks_per_rotation: int = 0
+    unpaid_blocks: int = 0
+
+
+class ColumnStats(msgspec.Struct, frozen=True, gc=False):
+    """A struct describing the spread of a leaderboard column, `position`
+    is the share of producers at or below our value."""
+    column: str
+    p50: float
+    p90: float
+    max: float
+    ours: Optional[float] = None
+    position: Optional[float] = None
+
+
+class Outlier(msgspec.Struct, frozen=True, gc=False):
+    """A struct describing a producer far above the median of a column."""
+    owner: str
+    column: str
+    value: float
+
+
+class Leaderboard(msgspec.Struct, frozen=True):
+    """A struct describing the active producers of a table snapshot,
+    `missing` counts the scheduled producers missing blocks this rotation."""
+    snapshot: str
+    updated_at: float
+    producers: int
+    scheduled: int
+    missing: int
+    chain_wide: bool
+    rank: int
+    columns: list[ColumnStats] = []
+    outliers: list[Outlier] = []
+
+
+class CommandLoad(msgspec.Struct, frozen=True):
+    """A struct describing how one command was handled under load, `calls`
+    are the RPC calls per update by method."""
+    command: str
+    updates: int
+    unanswered: int
+    p50_ms: float
+    p99_ms: float
+    max_ms: float
+    calls: dict[str, float] = {}
+
+
+class NotifierTiming(msgspec.Struct, frozen=True):
+    """A struct describing how late the notifier delivered past
+    `status_interval`, the lateness is None without two deliveries."""
+    cycles: int
+    late_mean_ms: Optional[float] = None
+    late_max_ms: Optional[float] = None
+
+
+class LoadReport(msgspec.Struct, frozen=True):
+    """A struct describing a load test of the command handlers."""
+    updates: int
+    concurrency: int
+    elapsed_s: float
+    throughput: float
+    p50_ms: float
+    p99_ms: float
+    max_ms: float
+    commands: list[CommandLoad]
+    background_calls: dict[str, int]
+    baseline: NotifierTiming
+    under_load: NotifierTiming
+
+
+class PaymentRow(msgspec.Struct, frozen=True, gc=False):
+    """A struct describing a payments table row."""
+    bp: str
+    pay: str
+
+
+class TableBenchmark(msgspec.Struct, frozen=True):
+    """A struct describing the median cost of reading a whole table in
+    `json` or `binary` mode."""
+    table: str
+    mode: str
+    rows: int
+    bytes: int
+    fetch_ms: float
+    decode_ms: float
+
+
+class WindowAggregate(msgspec.Struct, frozen=True):
+    """A struct describing an archived metric over `[start, end)`, the
+    statistics are None when no sample falls in the window."""
+    column: str
+    start: float
+    end: float
+    count: int = 0
+    min: Optional[float] = None
+    max: Optional[float] = None
+    mean: Optional[float] = None
+    last: Optional[float] = None
+
+
+class Frame(msgspec.Struct, array_like=True, frozen=True):
+    """A struct describing a recorded rpc response or collector sample."""
+    ts: float
+    kind: str
+    name: str = ''
+    args: dict = {}
+    data: Any = None
+
+
+class ReplayNotice(msgspec.Struct, frozen=True):
+    """A struct describing an alert notification produced during a replay."""
+    ts: float
+    users: list[str]
+    raised: list[str]
+    resolved: list[str]
+    message: str = ''
+
+
+class ReplayReport(msgspec.Struct):
+    """A struct describing the outcome of a replay, `chain_wide` holds
+    the start of every chain wide miss event."""
+    cycles: int = 0
+    skipped: int = 0
+    span_s: float = 0
+    elapsed_s: float = 0
+    speedup: float = 0
+    notices: list[ReplayNotice] = []
+    chain_wide: list[float] = []
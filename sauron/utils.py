@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 
+import html
+import time
 import locale
+import msgspec
+from datetime import datetime, timezone
 from ntplib import NTPClient
 from leap.cleos import CLEOS
 from .types import *
 from .service import *
+from .alerts import AlertManager
 
 
 green_check_mark_emoji = f"<tg-emoji emoji-id='9989'>✅</tg-emoji>"
@@ -17,9 +22,40 @@ async def build_producer_status_message(
         bp_status: tuple[BlockProducer, int],
         cache_data: Cache,
         config: Config,
+        detector: AnomalyDetector | None = None,
+        alert_manager: AlertManager | None = None,
+        notify: bool = True,
+        context: StatusContext | None = None,
+        now: float | None = None,
     ):
 
-    sys_health_check = await health_check(cache_data)
+    if context is None:
+        context = await get_status_context(cleos, ntp_client, config)
+
+    sys_health_check = await health_check(cache_data, detector, now)
+    return render_status_message(
+        bp_status,
+        sys_health_check,
+        context,
+        config,
+        alert_manager,
+        notify,
+        now,
+    )
+
+
+def render_status_message(
+        bp_status: BlockProducer,
+        sys_health_check: Cache,
+        context: StatusContext,
+        config: Config,
+        alert_manager: AlertManager | None = None,
+        notify: bool = True,
+        now: float | None = None,
+        updated_at: dict[str, float] | None = None,
+    ):
+    '''Renders an already collected and health checked status, no I/O.'''
+    cache_data = sys_health_check
     locale.setlocale(locale.LC_ALL, 'en_US.UTF-8') 
     locale.setlocale(locale.LC_NUMERIC, 'en_US.UTF-8')
 
@@ -41,15 +77,15 @@ async def build_producer_status_message(
     up = formatting(network_stats.up)
     network_updated_at = network_stats.updated_at
 
-    clock_offset = get_clock_offset(ntp_client)
+    clock_offset = context.clock_offset
 
-    rank = await get_rank(cleos, config)
+    rank = context.rank
 
     accuracy = 0
     if bp_status.lifetime_produced_blocks > 0:
         accuracy = round(100 - ((bp_status.lifetime_missed_blocks * 100) / bp_status.lifetime_produced_blocks), 6)
 
-    rotation_message = get_rotation_message(await get_rotation(cleos, config))
+    rotation_message = get_rotation_message(context.rotation)
 
     system_message = (
         f"<b><u>System Information:</u></b>\n"
@@ -88,22 +124,139 @@ async def build_producer_status_message(
         f"{rotation_message}\n"
     )
 
-    if clock_offset != 'Synced' or bp_status.alert or sys_health_check.alert:
-        response += build_tags(config.users_alerted)
+    if cache_data.hosts:
+        response += f"\n{get_fleet_message(cache_data.hosts)}\n"
+
+    if context.votes is not None and context.votes.rank > 0:
+        response += f"\n{get_votes_message(context.votes)}\n"
+
+    if updated_at:
+        response += f"\n{get_data_age_message(updated_at, now)}\n"
+
+    alerts = get_cycle_alerts(context, bp_status, sys_health_check)
+    if alerts:
+        response += f"{get_alerts_message(alerts)}\n"
+
+    if alert_manager is None:
+        if alerts:
+            response += build_tags(config.users_alerted)
+            return response
+        response += f"\n{green_check_mark_emoji}"
+        return response
+
+    if notify:
+        notice = alert_manager.update(alerts, now)
+        if notice.resolved:
+            response += f"{get_resolved_message(notice.resolved)}\n"
+        if notice.users:
+            response += build_tags(notice.users)
+            return response
+
+    if alert_manager.active():
+        response += f"\n{get_alert_states_message(alert_manager.active())}\n"
         return response
     response += f"\n{green_check_mark_emoji}"
     return response
 
 
+def render_view(
+        view: View,
+        snapshot: StatusSnapshot,
+        full_message: str,
+        config: Config,
+        alert_manager: AlertManager,
+        now: float | None = None,
+    ):
+    '''Renders `view` for this cycle, None when it has nothing to send.
+    `full_message` is the status already rendered with notifications.
+    '''
+    if view.view == 'full':
+        return full_message
+    if view.view == 'daily':
+        return render_status_message(
+            snapshot.bp_status,
+            snapshot.cache,
+            snapshot.context,
+            config,
+            alert_manager,
+            notify=False,
+            now=now,
+        )
+    return get_alerts_view_message(view, alert_manager)
+
+
+def get_alerts_view_message(view: View, alert_manager: AlertManager):
+    def selected(key: str):
+        return not view.metrics or key.startswith(view.metrics)
+
+    notice = alert_manager.last_notice
+    notified = [key for key in notice.notified if selected(key)]
+    resolved = [key for key in notice.resolved if selected(key)]
+    if not (notified or resolved):
+        return None
+    msg = ''
+    active = [entry.alert for entry in alert_manager.active() if selected(entry.key)]
+    if active:
+        msg += f"{get_alerts_message(active)}\n"
+    if resolved:
+        msg += f"{get_resolved_message(resolved)}\n"
+    if notified:
+        msg += build_tags(list(view.users) or notice.users)
+    return msg
+
+
+def get_cycle_alerts(context: StatusContext, bp_status: BlockProducer, cache: Cache):
+    alerts = list(cache.alerts)
+    if context.votes is not None:
+        alerts += context.votes.alerts
+    for host, host_cache in cache.hosts.items():
+        alerts += [
+            msgspec.structs.replace(
+                alert,
+                metric=f'{host}.{alert.metric}',
+                reason=f'{host}: {alert.reason}'
+            )
+            for alert in host_cache.alerts
+        ]
+    if bp_status.alert:
+        alerts.append(Alert(**{
+            'metric': 'missed_blocks',
+            'rule': 'rotation',
+            'value': bp_status.missed_blocks_per_rotation,
+            'score': 1,
+            'reason': f'missed {bp_status.missed_blocks_per_rotation} blocks in rotation'
+        }))
+    if context.clock_offset != 'Synced':
+        alerts.append(Alert(**{
+            'metric': 'clock',
+            'rule': 'ntp',
+            'value': 0,
+            'score': 1,
+            'reason': f'clock {context.clock_offset}'
+        }))
+    return alerts
+
+
 def build_help_message():
     return (
         f"<b><u>Sauron Bot:</u></b>\n"
-        #f"{format_fixed_width('<i>/c</i>', '<i>Claim rewards.</i>')}\n"
+        f"{format_fixed_width('<i>/c</i>', '<i>Claim rewards.</i>')}\n"
         f"{format_fixed_width('<i>/h</i>', '<i>Display this help message.</i>')}\n"
+        f"{format_fixed_width('<i>/ack</i>', '<i>Acknowledge firing alerts.</i>')}\n"
         f"{format_fixed_width('<i>/r</i>', '<i>Register block producer.</i>')}\n"
         f"{format_fixed_width('<i>/u</i>', '<i>Unregister block producer.</i>')}\n"
         f"{format_fixed_width('<i>/s</i>', '<i>Server and bp status.</i>')}\n"
         f"{format_fixed_width('<i>/schedule</i>', '<i>BP Schedule.</i>')}\n"
+        f"{format_fixed_width('<i>/history</i>', '<i>Claim history.</i>')}\n"
+        f"{format_fixed_width('<i>/votes</i>', '<i>Rank moves since the last cycle.</i>')}\n"
+        f"{format_fixed_width('<i>/rpc</i>', '<i>RPC latency and availability.</i>')}\n"
+        f"{format_fixed_width('<i>/metric</i>', '<i>Archived metric, /metric cpu_5 24.</i>')}\n"
+        f"{format_fixed_width('<i>/chart</i>', '<i>Metric chart, /chart cpu 6h.</i>')}\n"
+        f"{format_fixed_width('<i>/collectors</i>', '<i>Collector runs and timeouts.</i>')}\n"
+        f"{format_fixed_width('<i>/perf</i>', '<i>Event loop lag and stalls.</i>')}\n"
+        f"{format_fixed_width('<i>/peers</i>', '<i>P2P peers, latency and churn.</i>')}\n"
+        f"{format_fixed_width('<i>/res</i>', '<i>Account CPU, NET and RAM.</i>')}\n"
+        f"{format_fixed_width('<i>/network</i>', '<i>Producer leaderboard and outliers.</i>')}\n"
     )
 
 
@@ -117,6 +270,62 @@ def get_schedule_message(schedule: list, producer_name):
     return msg
 
 
+def get_claim_history_message(history):
+    msg = f'<b><u>Claim history:</u></b>\n'
+    if not history:
+        return msg + '<i>No claims yet.</i>'
+    for record in history:
+        msg += f"<code>{record.claimed_at}  {record.quantity:>16}</code>\n"
+    return msg
+
+
+def get_fleet_message(hosts: dict[str, Cache]):
+    msg = f'<b><u>Fleet:</u></b>'
+    for host in sorted(hosts):
+        system = hosts[host].system
+        status = red_alert_emoji if hosts[host].alert else green_check_mark_emoji
+        msg += (
+            f"\n<code>{host[:12]:<12} "
+            f"{system.cpu_load.min_5:>5} {system.ram_usage.percent:>5}% {system.disk_usage.percent:>5}%</code> "
+            f"{status}"
+        )
+    return msg
+
+
+def get_votes_message(diff: VoteDiff):
+    msg = (
+        f"<b><u>Votes:</u></b>\n"
+        f"{format_fixed_width('Delta:', f'{diff.votes_delta:+,.0f}', 13, 26)}"
+    )
+    if diff.challenger is not None:
+        msg += f"\n{format_fixed_width('Margin:', f'{diff.margin:.2f} % over {diff.challenger}', 9, 28)}"
+    if diff.eta_s is not None:
+        msg += f"\n{format_fixed_width('Overtaken in:', f'{diff.eta_s / 3600:.1f} h', 6, 24)}"
+    return msg
+
+
+def get_vote_moves_message(diff: VoteDiff | None, producer_name: str):
+    msg = f'<b><u>Rank moves:</u></b>\n'
+    if diff is None or not (diff.moves or diff.left_top42 or diff.entered_top42):
+        return msg + '<i>No changes.</i>'
+    for move in diff.moves:
+        old = move.old_rank or '-'
+        new = move.new_rank or '-'
+        line = f"<code>{old:>3} → {new:<3} {move.owner:<12} {move.votes_delta:+,.0f}</code>"
+        if move.owner == producer_name:
+            line = f"<b>{line}</b> {rocket_emoji}"
+        msg += f"{line}\n"
+    for label, owners in (
+        ('Entered top 21', diff.entered_top21),
+        ('Left top 21', diff.left_top21),
+        ('Entered top 42', diff.entered_top42),
+        ('Left top 42', diff.left_top42),
+    ):
+        if owners:
+            msg += f"<i>{label}:</i> <code>{', '.join(owners)}</code>\n"
+    return msg
+
+
 def get_rotation_message(rotation: Rotation):
     msg = (
         f'<b><u>Rotation:</u></b>\n'
@@ -130,6 +339,224 @@ def get_rotation_message(rotation: Rotation):
     return msg
 
 
+def get_data_age_message(updated_at: dict[str, float], now: float | None = None):
+    if now is None:
+        now = time.time()
+    ages = ', '.join(
+        f'{section} {format_age(now - collected_at)}'
+        for section, collected_at in updated_at.items()
+    )
+    return f"<i>Data age: {ages}</i>"
+
+
+def format_age(seconds: float):
+    seconds = max(seconds, 0)
+    if seconds < 60:
+        return f'{seconds:.0f}s'
+    if seconds < 60 * 60:
+        return f'{seconds / 60:.0f}m'
+    return f'{seconds / 3600:.1f}h'
+
+
+def get_rpc_message(reports: list[RpcReport], config: Config):
+    msg = f'<b><u>RPC:</u></b>'
+    if not reports:
+        return msg + '\n<i>No calls yet.</i>'
+    for report in reports:
+        endpoint = report.endpoint.split('://', 1)[-1]
+        p50 = f'{report.p50_ms:.0f}' if report.p50_ms is not None else '-'
+        p99 = f'{report.p99_ms:.0f}' if report.p99_ms is not None else '-'
+        breached = (
+            report.burn_1h >= 1
+            or (report.p99_ms is not None and report.p99_ms > config.rpc_slo_latency_ms)
+        )
+        msg += (
+            f"\n<b>{endpoint}</b> <i>{report.method}</i>{f' {red_alert_emoji}' if breached else ''}\n"
+            f"<code>p50 {p50:>5} ms  p99 {p99:>5} ms  n {report.requests_1h}</code>\n"
+            f"<code>1h  {report.availability_1h:7.3f} %  burn {report.burn_1h:5.2f}</code>\n"
+            f"<code>24h {report.availability_24h:7.3f} %  burn {report.burn_24h:5.2f}</code>"
+        )
+        if breached and report.last_error:
+            msg += f"\n<i>{report.last_error[:120]}</i>"
+    return msg
+
+
+SPARK_LEVELS = '▁▂▃▄▅▆▇█'
+
+
+def get_sparkline(values: list[float]) -> str:
+    if not values:
+        return ''
+    low, high = min(values), max(values)
+    span = (high - low) or 1
+    return ''.join(
+        SPARK_LEVELS[round((value - low) / span * (len(SPARK_LEVELS) - 1))]
+        for value in values
+    )
+
+
+def get_metric_message(aggregate: WindowAggregate, points: list[tuple[float, float]]):
+    hours = (aggregate.end - aggregate.start) / 3600
+    msg = f'<b><u>{aggregate.column}</u></b> <i>last {hours:g}h</i>\n'
+    if not aggregate.count:
+        return msg + '<i>No samples archived.</i>'
+    msg += (
+        f"<code>min {aggregate.min:,.2f}  max {aggregate.max:,.2f}</code>\n"
+        f"<code>avg {aggregate.mean:,.2f}  now {aggregate.last:,.2f}</code>\n"
+        f"<code>n {aggregate.count}</code>"
+    )
+    if len(points) > 1:
+        msg += f"\n<code>{get_sparkline([value for _, value in points])}</code>"
+    return msg
+
+
+def get_chart_caption(metric: str, window: str, points: list[tuple[float, float]]):
+    values = [value for _, value in points]
+    unit = ' ms' if metric == 'rpc' else ''
+    return (
+        f"<b>{metric}</b> <i>last {window}</i>\n"
+        f"<code>min {min(values):,.2f}{unit}  max {max(values):,.2f}{unit}  now {values[-1]:,.2f}{unit}</code>"
+    )
+
+
+def get_collectors_message(reports: list[CollectorStats]):
+    msg = f'<b><u>Collectors:</u></b>'
+    for stats in reports:
+        average = stats.total_ms / stats.runs if stats.runs else 0
+        flags = ' isolated' if stats.isolated else ''
+        flags += ' running' if stats.running else ''
+        failing = stats.failures or stats.timeouts
+        msg += (
+            f"\n<b>{stats.name}</b><i>{flags}</i>{f' {red_alert_emoji}' if failing else ''}\n"
+            f"<code>runs {stats.runs}  failed {stats.failures}  timeouts {stats.timeouts}  restarts {stats.restarts}</code>\n"
+            f"<code>avg {average:,.0f} ms  max {stats.max_ms:,.0f} ms  last {stats.last_ms:,.0f} ms</code>"
+        )
+        if stats.last_error:
+            msg += f"\n<i>{stats.last_error[:120]}</i>"
+    return msg
+
+
+def get_perf_message(health: LoopHealth, collectors: list[CollectorStats] = []):
+    msg = (
+        f'<b><u>Event loop:</u></b>\n'
+        f"<code>lag p50 {health.lag_p50_ms:,.1f} ms  p99 {health.lag_p99_ms:,.1f} ms  max {health.lag_max_ms:,.1f} ms</code>\n"
+        f"<code>stalls {health.stalls}  tasks {health.tasks}</code>"
+    )
+    for stall in reversed(health.recent[-3:]):
+        at = datetime.fromtimestamp(stall.at, timezone.utc).strftime('%H:%M:%S')
+        msg += f"\n<b>{at} UTC</b> <i>blocked {stall.lag_ms:,.0f} ms</i> {red_alert_emoji}"
+        # the innermost frames say what was blocking
+        for line in stall.stack[-3:]:
+            msg += f"\n<code>{html.escape(line)}</code>"
+    running = [stats.name for stats in collectors if stats.running]
+    if running:
+        msg += f"\n<i>collectors still running: {', '.join(running)}</i>"
+    return msg
+
+
+def get_peers_message(report: Optional[PeerReport], min_peers: int, limit: int = 15):
+    msg = f'<b><u>Peers:</u></b>'
+    if report is None:
+        return msg + '\n<i>No poll yet.</i>'
+    starving = report.connected < min_peers
+    p50 = f'{report.latency_p50_ms:,.0f} ms' if report.latency_p50_ms is not None else '-'
+    msg += (
+        f"\n<code>connected {report.connected}  syncing {report.syncing}  churn 1h {report.churn_1h}</code>"
+        f"{f' {red_alert_emoji}' if starving else ''}\n"
+        f"<code>handshake p50 {p50}</code>"
+    )
+    if report.added:
+        msg += f"\n<i>joined:</i> <code>{', '.join(report.added[:limit])}</code>"
+    if report.removed:
+        msg += f"\n<i>left:</i> <code>{', '.join(report.removed[:limit])}</code>"
+    # unreachable peers first, then the slowest
+    worst = sorted(
+        report.peers,
+        key=lambda peer: (peer.connected, -(peer.latency_ms or 0)),
+    )[:limit]
+    for peer in worst:
+        state = f'{peer.latency_ms:,.0f} ms' if peer.latency_ms is not None else ('up' if peer.connected else 'down')
+        msg += f"\n<code>{peer.address[:32]:<32} {state:>9}{' sync' if peer.syncing else ''}</code>"
+    if len(report.peers) > limit:
+        msg += f"\n<i>and {len(report.peers) - limit} more</i>"
+    if report.error:
+        msg += f"\n<i>{report.error[:120]}</i>"
+    return msg
+
+
+def get_network_message(board: Leaderboard, producer_name: str, limit: int = 8):
+    msg = f'<b><u>Network:</u></b>'
+    if board.missing == 0:
+        verdict = 'no scheduled producer is missing blocks'
+    elif board.chain_wide:
+        verdict = f'chain-wide, {board.missing}/{board.scheduled} scheduled producers missing blocks'
+    else:
+        verdict = f'{board.missing}/{board.scheduled} scheduled producers missing blocks'
+    rank = f'rank {board.rank} of {board.producers}' if board.rank else f'{producer_name} is not active'
+    msg += (
+        f"\n<i>{verdict}</i>{f' {red_alert_emoji}' if board.chain_wide else ''}"
+        f"\n<code>{rank}</code>"
+        f"\n<code>{'':<15} {'p50':>9} {'p90':>9} {'ours':>9} {'pos':>4}</code>"
+    )
+    for stats in board.columns:
+        ours = f'{stats.ours:,.6g}' if stats.ours is not None else '-'
+        position = f'{stats.position * 100:.0f}%' if stats.position is not None else '-'
+        msg += (
+            f"\n<code>{stats.column:<15} {stats.p50:>9,.6g} {stats.p90:>9,.6g} "
+            f"{ours:>9} {position:>4}</code>"
+        )
+    for outlier in board.outliers[:limit]:
+        line = f"<code>{outlier.owner:<12} {outlier.column:<15} {outlier.value:,.6g}</code>"
+        if outlier.owner == producer_name:
+            line = f"<b>{line}</b> {red_alert_emoji}"
+        msg += f"\n{line}"
+    return msg
+
+
+def get_resources_message(usages: list[ResourceUsage], warn_percent: float = 90):
+    msg = f'<b><u>Resources:</u></b>'
+    if not usages:
+        return msg + '\n<i>Not read yet.</i>'
+    for usage in usages:
+        msg += f"\n<b>{usage.account}</b>"
+        if usage.balance:
+            msg += f" <i>{usage.balance}</i>"
+        for resource in ('cpu', 'net', 'ram'):
+            percent = getattr(usage, f'{resource}_percent')
+            eta = getattr(usage, f'{resource}_eta_s')
+            trend = f'  out in {eta / 3600:.1f}h' if eta is not None else ''
+            warn = f' {red_alert_emoji}' if percent >= warn_percent else ''
+            msg += f"\n<code>{resource.upper()} {percent:6.2f} %{trend}</code>{warn}"
+    return msg
+
+
+def get_resource_error_message(error: Exception):
+    return f"<b>Not pushed:</b> <i>{error}</i> {red_alert_emoji}"
+
+
+def get_alerts_message(alerts: list[Alert]):
+    msg = f'<b><u>Alerts:</u></b>'
+    for alert in sorted(alerts, key=lambda alert: alert.score, reverse=True):
+        msg += f"\n<code>[{alert.score:.2f}]</code> <i>{alert.reason}</i>"
+    return msg
+
+
+def get_alert_states_message(entries: list):
+    msg = f'<b><u>Alert states:</u></b>'
+    for entry in entries:
+        acked = f' by {entry.acked_by}' if entry.acked_by else ''
+        msg += f"\n<code>{entry.key}</code> <i>{entry.state}{acked}</i>"
+    return msg
+
+
+def get_resolved_message(keys: list[str]):
+    return f"<b>Resolved:</b> <code>{', '.join(keys)}</code>"
+
+
+def get_latency_message(res: TxResult):
+    return f"<i><u>latency:</u></i> <code>{res.latency_ms:.0f} ms</code> <i>via {res.endpoint}</i>"
+
+
 def format_fixed_width(key, value, key_width=15, value_width=15):
     return f"{key:<{key_width}} {value:>{value_width}}"
 
@@ -138,10 +565,12 @@ def formatting(value):
     return locale.format_string('%d', value, grouping=True)
 
 
-def build_tags(users_alerted: str | None):
+def build_tags(users_alerted: str | list[str] | None):
     tags = f"\n{red_alert_emoji}\n"
     if users_alerted != None:
-        users = [item.strip() for item in users_alerted.split(',')]
+        users = users_alerted
+        if isinstance(users_alerted, str):
+            users = [item.strip() for item in users_alerted.split(',')]
         for user in users:
             tags += f"{user}\n"
     return tags
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+from typing import Optional
+from .types import *
+
+
+SCHEDULE_SIZE = 21
+STANDBY_SIZE = 42
+
+
+def vote_weight(total_votes) -> float:
+    '''Scales the raw `total_votes` of a producer row for display.'''
+    votes = int(float(total_votes))
+    return votes / 10000 if votes > 0 else 0
+
+
+def vote_delta(votes: float, old_votes: float) -> float:
+    return int(votes - old_votes) / 10000
+
+
+class VoteTracker:
+    """Keeps the last producer snapshot and diffs new ones against it.
+
+    A snapshot is the list of active producers sorted by votes, plus an
+    owner index, so each diff costs one O(n log n) sort and O(n) lookups.
+    """
+
+    @classmethod
+    def from_config(cls, config: Config):
+        return cls(config.producer_name, config.vote_warn_hours, config.vote_warn_margin)
+
+    def reconfigure(self, config: Config):
+        self.warn_after = config.vote_warn_hours * 60 * 60
+        self.warn_margin = config.vote_warn_margin
+
+    def __init__(
+        self,
+        producer_name: str,
+        warn_hours: float = 6,
+        warn_margin: float = 1.0,
+    ):
+        self.producer_name = producer_name
+        self.warn_after = warn_hours * 60 * 60
+        self.warn_margin = warn_margin
+        self.ranking: list[tuple[str, float]] = []
+        self.index: dict[str, tuple[int, float]] = {}
+        self.updated_at = None
+        self.last_diff: Optional[VoteDiff] = None
+        self.scheduled = False
+
+    def snapshot(self, rows: list[ProducerVotes]) -> list[tuple[str, float]]:
+        # owners are interned so consecutive snapshots share the strings
+        ranking = [
+            (sys.intern(row.owner), row.total_votes)
+            for row in rows if row.is_active
+        ]
+        ranking.sort(key=lambda item: (-item[1], item[0]))
+        return ranking
+
+    def update(self, rows: list[ProducerVotes], now: Optional[float] = None) -> VoteDiff:
+        if now is None:
+            now = time.time()
+        ranking = self.snapshot(rows)
+        index = {
+            owner: (rank, votes) for rank, (owner, votes) in enumerate(ranking, start=1)
+        }
+        elapsed = now - self.updated_at if self.updated_at is not None else 0
+
+        moves = []
+        for owner, (rank, votes) in index.items():
+            old_rank, old_votes = self.index.get(owner, (0, votes))
+            if old_rank != rank and self.index:
+                moves.append(RankMove(owner, old_rank, rank, vote_delta(votes, old_votes)))
+        for owner, (old_rank, _) in self.index.items():
+            if owner not in index:
+                moves.append(RankMove(owner, old_rank, 0, 0))
+        moves.sort(key=lambda move: move.new_rank or len(index) + move.old_rank)
+
+        def _top(ranking, size):
+            return {owner for owner, _ in ranking[:size]}
+
+        diff = VoteDiff(
+            elapsed_s=round(elapsed, 3),
+            moves=moves,
+            entered_top21=sorted(_top(ranking, SCHEDULE_SIZE) - _top(self.ranking, SCHEDULE_SIZE)) if self.index else [],
+            left_top21=sorted(_top(self.ranking, SCHEDULE_SIZE) - _top(ranking, SCHEDULE_SIZE)),
+            entered_top42=sorted(_top(ranking, STANDBY_SIZE) - _top(self.ranking, STANDBY_SIZE)) if self.index else [],
+            left_top42=sorted(_top(self.ranking, STANDBY_SIZE) - _top(ranking, STANDBY_SIZE)),
+        )
+        diff = self._position(diff, ranking, index, elapsed)
+        diff.alerts = self.alerts(diff)
+
+        self.ranking = ranking
+        self.index = index
+        self.updated_at = now
+        self.last_diff = diff
+        return diff
+
+    def _position(self, diff: VoteDiff, ranking, index, elapsed) -> VoteDiff:
+        if self.producer_name not in index:
+            return diff
+        rank, votes = index[self.producer_name]
+        old_votes = self.index.get(self.producer_name, (0, votes))[1]
+        diff.rank = rank
+        diff.votes = vote_weight(votes)
+        diff.votes_delta = vote_delta(votes, old_votes)
+
+        if rank > SCHEDULE_SIZE or len(ranking) <= SCHEDULE_SIZE:
+            return diff
+
+        # the first producer outside the schedule is the one that can push us out
+        challenger, challenger_votes = ranking[SCHEDULE_SIZE]
+        gap = votes - challenger_votes
+        diff.challenger = challenger
+        diff.margin = round(gap * 100 / votes, 4) if votes > 0 else 0
+        if elapsed > 0 and challenger in self.index:
+            closing = (challenger_votes - self.index[challenger][1]) - (votes - old_votes)
+            if closing > 0:
+                diff.eta_s = round(gap * elapsed / closing)
+        return diff
+
+    def alerts(self, diff: VoteDiff) -> list[Alert]:
+        if 0 < diff.rank <= SCHEDULE_SIZE:
+            self.scheduled = True
+        elif self.scheduled:
+            if not diff.rank:
+                # no longer active, e.g. after /u, it is raised once and
+                # not every cycle until the producer registers again
+                self.scheduled = False
+            return [Alert(**{
+                'metric': 'schedule',
+                'rule': 'rank',
+                'value': diff.rank,
+                'score': 2,
+                'reason': f'fell off the schedule, rank {diff.rank or "unranked"}'
+            })]
+        else:
+            return []
+
+        scores = []
+        if diff.margin is not None and self.warn_margin > 0:
+            scores.append((
+                self.warn_margin / max(diff.margin, 1e-9),
+                f'{diff.margin:.2f} % of votes ahead of {diff.challenger}'
+            ))
+        if diff.eta_s is not None:
+            scores.append((
+                self.warn_after / max(diff.eta_s, 1),
+                f'{diff.challenger} overtakes in ~{diff.eta_s / 3600:.1f} h at the current rate'
+            ))
+        fired = [score for score in scores if score[0] >= 1]
+        if not fired:
+            return []
+        return [Alert(**{
+            'metric': 'schedule',
+            'rule': 'votes',
+            'value': diff.rank,
+            'score': round(min(max(score for score, _ in fired), 99), 2),
+            'reason': '; '.join(reason for _, reason in fired)
+        })]
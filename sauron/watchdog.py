@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from typing import Optional
+from .types import *
+
+
+logger = logging.getLogger(__name__)
+
+
+# frames kept from the innermost one of a blocked loop
+STACK_LIMIT = 12
+
+
+class LoopWatchdog:
+    """Measures event loop scheduling lag and catches what blocks it.
+
+    A heartbeat sleeps `interval` seconds and records how late it wakes
+    up. A thread checks the heartbeat every `interval`: when it is more
+    than `threshold` late the loop thread is stuck in a callback, and its
+    stack is captured while still blocking. The stall is logged with that
+    stack once the loop runs again. Lags of the last minute and the last
+    `keep` stalls are kept for `report`.
+    """
+
+    def __init__(self, threshold: float = 0.25, interval: float = 0.1, keep: int = 10):
+        self.threshold = threshold
+        self.interval = interval
+        self.lags: deque[float] = deque(maxlen=int(60 / interval))
+        self.stalls: deque[Stall] = deque(maxlen=keep)
+        self.stall_count = 0
+        self.beat = time.monotonic()
+        self.caught: Optional[list[str]] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread_id: Optional[int] = None
+        self.stopped = threading.Event()
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.stopped.clear()
+        watcher = threading.Thread(target=self.watch, name='sauron-watchdog', daemon=True)
+        watcher.start()
+        try:
+            while True:
+                self.beat = time.monotonic()
+                await asyncio.sleep(self.interval)
+                self.record(time.monotonic() - self.beat - self.interval)
+        finally:
+            self.stopped.set()
+
+    def record(self, lag: float, now: Optional[float] = None):
+        lag = max(lag, 0)
+        self.lags.append(lag)
+        stack, self.caught = self.caught, None
+        if lag < self.threshold:
+            return
+        stall = Stall(
+            at=time.time() if now is None else now,
+            lag_ms=round(lag * 1000, 2),
+            stack=stack or [],
+        )
+        self.stalls.append(stall)
+        self.stall_count += 1
+        where = stall.stack[-1] if stall.stack else 'an unknown callback'
+        logger.warning(
+            'Event loop blocked for %.0f ms in %s',
+            stall.lag_ms,
+            where,
+            extra={'lag_ms': stall.lag_ms, 'stack': stall.stack},
+        )
+
+    def watch(self):
+        while not self.stopped.wait(self.interval):
+            if self.caught is None and time.monotonic() - self.beat - self.interval > self.threshold:
+                self.caught = self.capture()
+
+    def capture(self) -> list[str]:
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return []
+        return [
+            f'{os.path.basename(entry.filename)}:{entry.lineno} in {entry.name}: {entry.line}'
+            for entry in traceback.extract_stack(frame, limit=STACK_LIMIT)
+        ]
+
+    def report(self) -> LoopHealth:
+        lags = sorted(self.lags)
+
+        def quantile(q: float) -> float:
+            if not lags:
+                return 0
+            return round(lags[min(int(q * len(lags)), len(lags) - 1)] * 1000, 2)
+
+        return LoopHealth(
+            samples=len(lags),
+            lag_p50_ms=quantile(0.5),
+            lag_p99_ms=quantile(0.99),
+            lag_max_ms=quantile(1),
+            stalls=self.stall_count,
+            tasks=len(asyncio.all_tasks(self.loop)) if self.loop is not None else 0,
+            recent=list(self.stalls),
+        )
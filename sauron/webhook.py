@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import logging
+import hmac
+import asyncio
+from aiohttp import web
+from telebot.types import Update
+from telebot.async_telebot import AsyncTeleBot
+
+
+logger = logging.getLogger(__name__)
+
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """Embedded aiohttp server receiving Telegram updates.
+
+    Updates are verified against the secret token and queued into a
+    bounded queue drained by a fixed pool of workers, which dispatch them
+    to the handlers registered on `bot`. When the queue is full the
+    request is answered with 503 so Telegram retries it later.
+    """
+
+    def __init__(
+        self,
+        bot: AsyncTeleBot,
+        secret_token: str | None,
+        workers: int = 4,
+        queue_size: int = 100,
+        path: str = '/telegram',
+    ):
+        self.bot = bot
+        self.secret_token = secret_token
+        self.workers = workers
+        self.path = path
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks: list[asyncio.Task] = []
+        self._runner: web.AppRunner | None = None
+
+    def verify(self, request: web.Request) -> bool:
+        # without a secret anyone reaching the port could run /r and /u
+        if not self.secret_token:
+            return False
+        token = request.headers.get(SECRET_HEADER, '')
+        return hmac.compare_digest(token.encode(), self.secret_token.encode())
+
+    async def handle(self, request: web.Request):
+        if not self.verify(request):
+            return web.Response(status=401)
+        try:
+            update = Update.de_json(await request.text())
+        except Exception as e:
+            logger.warning('Invalid webhook update: %s', e)
+            return web.Response(status=400)
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            return web.Response(status=503)
+        return web.Response()
+
+    async def worker(self):
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.bot.process_new_updates([update])
+            except Exception as e:
+                logger.exception('An exception occurred while processing update: %s', e)
+            finally:
+                self.queue.task_done()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        app.on_startup.append(self._start_workers)
+        app.on_cleanup.append(self._stop_workers)
+        return app
+
+    async def _start_workers(self, app: web.Application):
+        self._tasks = [
+            asyncio.create_task(self.worker()) for _ in range(self.workers)
+        ]
+
+    async def _stop_workers(self, app: web.Application):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def start(self, host: str, port: int):
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def serve_webhook(bot: AsyncTeleBot, config):
+    '''Registers the webhook with Telegram and serves updates until
+    cancelled.
+    '''
+    if not config.webhook_secret:
+        raise ValueError('webhook_url needs a webhook_secret')
+    server = WebhookServer(
+        bot,
+        config.webhook_secret,
+        workers=config.webhook_workers,
+        queue_size=config.webhook_queue_size,
+        path=config.webhook_path,
+    )
+    await server.start(config.webhook_listen, config.webhook_port)
+    await bot.set_webhook(
+        url=config.webhook_url,
+        secret_token=config.webhook_secret,
+        max_connections=config.webhook_workers,
+    )
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await bot.remove_webhook()
+        await server.stop()
@@ -2,4 +2,11 @@
 
 uv lock
 
-nohup uv run sauron telegram config.ini >> /var/log/monitor/sauron_bot.log 2>&1 &
+# with log_file set sauron rotates its own log, nohup only keeps what is
+# printed before logging starts, in a file the rotation never touches
+out=/var/log/monitor/sauron_bot.log
+if grep -qE '^[[:space:]]*log_file[[:space:]]*=' config.ini; then
+    out=/var/log/monitor/sauron_bot.out
+fi
+
+nohup uv run sauron telegram config.ini >> "$out" 2>&1 &
@@ -0,0 +1,172 @@
+import struct
+from unittest.mock import MagicMock, patch
+
+import msgspec
+import pytest
+
+from sauron.abi import AbiDecoder, benchmark_table
+from sauron.service import get_all_producers
+from sauron.types import PaymentRow, ProducerRow, ProducerVotes
+
+
+# the producers and payments layouts of the Telos eosio abi
+ABI = {
+    'version': 'eosio::abi/1.1',
+    'types': [{'new_type_name': 'account_name', 'type': 'name'}],
+    'structs': [
+        {'name': 'producer_info', 'base': '', 'fields': [
+            {'name': 'owner', 'type': 'account_name'},
+            {'name': 'total_votes', 'type': 'float64'},
+            {'name': 'producer_key', 'type': 'public_key'},
+            {'name': 'is_active', 'type': 'bool'},
+            {'name': 'unreg_reason', 'type': 'string'},
+            {'name': 'url', 'type': 'string'},
+            {'name': 'unpaid_blocks', 'type': 'uint32'},
+            {'name': 'lifetime_produced_blocks', 'type': 'uint32'},
+            {'name': 'missed_blocks_per_rotation', 'type': 'uint32'},
+            {'name': 'lifetime_missed_blocks', 'type': 'uint32'},
+            {'name': 'last_claim_time', 'type': 'time_point'},
+            {'name': 'location', 'type': 'uint16'},
+            {'name': 'kick_reason_id', 'type': 'uint32'},
+            {'name': 'kick_reason', 'type': 'string'},
+            {'name': 'times_kicked', 'type': 'uint32'},
+            {'name': 'kick_penalty_hours', 'type': 'uint32'},
+            {'name': 'last_time_kicked', 'type': 'block_timestamp_type'},
+            {'name': 'unreg_count', 'type': 'uint32$'},
+        ]},
+        {'name': 'payment_info', 'base': '', 'fields': [
+            {'name': 'bp', 'type': 'name'},
+            {'name': 'pay', 'type': 'asset'},
+        ]},
+    ],
+    'tables': [
+        {'name': 'producers', 'type': 'producer_info', 'index_type': 'i64'},
+        {'name': 'payments', 'type': 'payment_info', 'index_type': 'i64'},
+    ],
+}
+
+
+def _name(text):
+    value = 0
+    for index in range(13):
+        char = '.12345abcdefghijklmnopqrstuvwxyz'.index(text[index]) if index < len(text) else 0
+        value |= (char & 0x1f) << (64 - 5 * (index + 1)) if index < 12 else char & 0x0f
+    return struct.pack('<Q', value)
+
+
+def _string(text):
+    return bytes([len(text)]) + text.encode()
+
+
+def _asset(amount, precision, code):
+    return struct.pack('<q', amount) + bytes([precision]) + code.encode().ljust(7, b'\0')
+
+
+def _producer(owner, votes, extension=True):
+    raw = (
+        _name(owner)
+        + struct.pack('<d', votes)
+        + bytes([0]) + bytes(33)
+        + struct.pack('<?', True)
+        + _string('')
+        + _string(f'https://{owner}.net')
+        + struct.pack('<IIII', 500, 100000, 2, 10)
+        + struct.pack('<q', 1700000000123000)
+        + struct.pack('<HI', 2001, 0)
+        + _string('')
+        + struct.pack('<III', 0, 0, 0)
+    )
+    return raw + struct.pack('<I', 3) if extension else raw
+
+
+def _json_producer(owner, votes):
+    return {
+        'owner': owner,
+        'total_votes': f'{votes:.17f}',
+        'producer_key': 'EOS5zxgsnHa27u',
+        'is_active': 1,
+        'url': f'https://{owner}.net',
+        'unpaid_blocks': 500,
+        'lifetime_produced_blocks': 100000,
+        'missed_blocks_per_rotation': 2,
+        'lifetime_missed_blocks': 10,
+        'last_claim_time': '2023-11-14T22:13:20.123',
+    }
+
+
+def test_rows_decode_to_structs_and_dicts():
+    abi = AbiDecoder({'account_name': 'eosio', 'abi': ABI})
+    row = abi.table_decoder('producers', dict)(_producer('openrepublic', 1.5e12))
+    assert row['owner'] == 'openrepublic'
+    assert row['producer_key'] is None
+    assert row['url'] == 'https://openrepublic.net'
+    assert row['last_claim_time'] == '2023-11-14T22:13:20.123'
+    assert row['last_time_kicked'] == '2000-01-01T00:00:00.000'
+    assert row['unreg_count'] == 3
+    # older rows lack the binary extension
+    assert 'unreg_count' not in abi.table_decoder('producers', dict)(_producer('bp', 1, extension=False))
+
+    assert abi.table_decoder('producers', ProducerRow)(_producer('openrepublic', 1.5e12)) == ProducerRow(
+        'openrepublic', 1.5e12, True, 100000, 10, 2, 500)
+    # decoding stops after is_active, the last field ProducerVotes declares
+    assert abi.table_decoder('producers', ProducerVotes)(_producer('bp', 2.0)[:51]) == ProducerVotes('bp', 2.0, True)
+
+    decode = abi.table_decoder('payments', PaymentRow)
+    assert decode(_name('openrepublic') + _asset(123400, 4, 'TLOS')) == PaymentRow('openrepublic', '12.3400 TLOS')
+    assert decode(_name('bp') + _asset(-5, 0, 'EOS')) == PaymentRow('bp', '-5 EOS')
+
+
+def test_keys_are_not_decoded_into_structs():
+    class KeyRow(msgspec.Struct):
+        owner: str
+        producer_key: str
+
+    with pytest.raises(ValueError, match='public_key'):
+        AbiDecoder(ABI).table_decoder('producers', KeyRow)
+
+
+def _table(rows, raw_rows):
+    '''Fake get_table_rows serving `rows` as JSON or `raw_rows` as hex.'''
+    requests = []
+
+    async def _post(url, json):
+        requests.append(json)
+        start = int(json['lower_bound'] or 0)
+        page = (rows if json['json'] else [raw.hex() for raw in raw_rows])[start:start + json['limit']]
+        more = start + json['limit'] < len(rows)
+        response = MagicMock()
+        response.content = msgspec.json.encode({
+            'rows': page,
+            'more': more,
+            'next_key': str(start + json['limit']) if more else '',
+        })
+        return response
+
+    return _post, requests
+
+
+@pytest.mark.asyncio
+async def test_binary_mode_reads_the_same_producers():
+    owners = [f'bp{chr(97 + i % 26)}{i // 26}'.replace('0', 'z') for i in range(150)]
+    rows = [_json_producer(owner, (150 - i) * 1e9) for i, owner in enumerate(owners)]
+    raw_rows = [_producer(owner, (150 - i) * 1e9) for i, owner in enumerate(owners)]
+    post, requests = _table(rows, raw_rows)
+    with patch('sauron.service.asks.post', side_effect=post):
+        as_json = await get_all_producers('http://node')
+        as_binary = await get_all_producers('http://node', abi=AbiDecoder(ABI))
+
+    assert as_binary == as_json
+    assert len(as_binary) == 150
+    assert [request['json'] for request in requests] == [True, True, False, False]
+
+
+@pytest.mark.asyncio
+async def test_benchmark_reports_both_modes():
+    rows = [_json_producer(f'bp{chr(97 + i)}', 1e9) for i in range(20)]
+    raw_rows = [_producer(f'bp{chr(97 + i)}', 1e9) for i in range(20)]
+    post, _ = _table(rows, raw_rows)
+    with patch('sauron.abi.asks.post', side_effect=post):
+        results = await benchmark_table('http://node', AbiDecoder(ABI), 'producers', ProducerRow, rounds=2)
+
+    assert [(result.mode, result.rows) for result in results] == [('json', 20), ('binary', 20)]
+    assert all(result.bytes > 0 and result.decode_ms >= 0 for result in results)
@@ -0,0 +1,78 @@
+import pytest
+
+from sauron.alerts import (
+    AlertManager, FIRING, ACKNOWLEDGED, parse_users
+)
+from sauron.types import Alert
+
+
+def _alert(metric='ram'):
+    return Alert(metric=metric, rule='limit', value=90, score=1.1, reason=f'{metric} high')
+
+
+@pytest.fixture
+def manager():
+    return AlertManager(
+        users=['@gollum'],
+        escalation_users=['@frodo'],
+        enter_after=2,
+        exit_after=2,
+        dedup_window=300,
+        escalate_after=600,
+    )
+
+
+def test_enter_hysteresis(manager):
+    assert manager.update([_alert()], now=0).users == []
+    notice = manager.update([_alert()], now=60)
+    assert notice.raised == ['ram']
+    assert notice.users == ['@gollum']
+    assert manager.entries['ram'].state == FIRING
+
+
+def test_pending_is_dropped_when_condition_clears(manager):
+    manager.update([_alert()], now=0)
+    manager.update([], now=60)
+    assert manager.entries == {}
+
+
+def test_dedup_window(manager):
+    manager.update([_alert()], now=0)
+    manager.update([_alert()], now=60)
+    assert manager.update([_alert()], now=120).users == []
+    assert manager.update([_alert()], now=360).users == ['@gollum']
+
+
+def test_exit_hysteresis(manager):
+    manager.update([_alert()], now=0)
+    manager.update([_alert()], now=60)
+    assert manager.update([], now=120).resolved == []
+    # flapping back resets the exit counter
+    manager.update([_alert()], now=180)
+    manager.update([], now=240)
+    assert manager.update([], now=300).resolved == ['ram']
+    assert manager.active() == []
+
+
+def test_escalation(manager):
+    manager.update([_alert()], now=0)
+    manager.update([_alert()], now=60)
+    notice = manager.update([_alert()], now=660)
+    assert notice.users == ['@gollum', '@frodo']
+    assert manager.update([_alert()], now=720).users == []
+
+
+def test_acknowledge_stops_pings(manager):
+    manager.update([_alert('ram'), _alert('disk')], now=0)
+    manager.update([_alert('ram'), _alert('disk')], now=60)
+    assert manager.acknowledge('@gollum', 'ram') == ['ram']
+    assert manager.entries['ram'].state == ACKNOWLEDGED
+    notice = manager.update([_alert('ram'), _alert('disk')], now=1000)
+    assert notice.users == ['@gollum', '@frodo']
+    assert manager.acknowledge('@gollum') == ['disk']
+    assert manager.update([_alert('ram'), _alert('disk')], now=2000).users == []
+
+
+def test_parse_users():
+    assert parse_users(' @a, @b ,') == ['@a', '@b']
+    assert parse_users(None) == []
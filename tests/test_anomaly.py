@@ -0,0 +1,77 @@
+import pytest
+
+from sauron.anomaly import AnomalyDetector, MetricState, system_metrics
+from sauron.types import CpuLoad, RamUsage, DiskUsage, MetricRule, System
+
+
+def _system(cpu=0.5, ram=50, disk=50):
+    return System(**{
+        'cpu_load': CpuLoad(min_1=cpu, min_5=cpu, min_15=cpu),
+        'ram_usage': RamUsage(percent=ram),
+        'disk_usage': DiskUsage(percent=disk),
+        'nodeos_status': 'is running.',
+    })
+
+
+def test_metric_state_is_constant_memory():
+    state = MetricState(MetricRule(window=5))
+    for i in range(1000):
+        state.push(float(i % 7), float(i))
+    assert len(state.ring) == 5
+    assert state.filled() == 5
+    assert state.total == pytest.approx(sum(state.ring))
+
+
+def test_limit_rule():
+    detector = AnomalyDetector({'ram': MetricRule(limit=90)})
+    assert detector.update('ram', 85, now=0) is None
+    alert = detector.update('ram', 95, now=60)
+    assert alert.rule == 'limit'
+    assert alert.score >= 1
+    assert 'limit 90.00' in alert.reason
+
+
+def test_zscore_rule_after_warmup():
+    detector = AnomalyDetector({
+        'ram': MetricRule(limit=None, warmup=5, z_max=3, min_std=0.5)
+    })
+    for i in range(20):
+        assert detector.update('ram', 40 + (i % 2), now=i * 60) is None
+    alert = detector.update('ram', 60, now=20 * 60)
+    assert alert.rule == 'zscore'
+    assert 'baseline' in alert.reason
+
+
+def test_rate_rule():
+    detector = AnomalyDetector({
+        'disk': MetricRule(limit=None, warmup=2, z_max=1000, rate_max=1.0)
+    })
+    for i in range(5):
+        detector.update('disk', 50, now=i * 60)
+    alert = detector.update('disk', 53, now=5 * 60)
+    assert alert.rule == 'rate'
+    assert alert.score == 3
+
+
+def test_disk_growing_by_whole_percents():
+    detector = AnomalyDetector()
+    # df rounds to whole percents, the disk steps up one every few samples
+    for i in range(40):
+        assert detector.update('disk', 50 + i // 4, now=i * 60) is None
+    alert = detector.update('disk', 66, now=40 * 60)
+    assert alert.rule == 'rate'
+    assert 'changing +7.00 %/min' in alert.reason
+
+
+def test_unknown_metric_is_ignored():
+    assert AnomalyDetector().update('swap', 100) is None
+
+
+def test_evaluate_system(monkeypatch):
+    monkeypatch.setattr('os.cpu_count', lambda: 4)
+    assert system_metrics(_system(cpu=2))['cpu'] == 50
+    alerts = AnomalyDetector().evaluate(_system(cpu=4, disk=95), now=0)
+    assert sorted(alert.metric for alert in alerts) == ['cpu', 'disk']
+    # remote samples are normalized by the cores of their host
+    system = System(cpu_load=CpuLoad(min_5=8), cpu_cores=16)
+    assert system_metrics(system)['cpu'] == 50
@@ -0,0 +1,89 @@
+import os
+from datetime import datetime, timezone
+
+import msgspec
+import pytest
+from click.testing import CliRunner
+
+from sauron.archive import COLUMNS, MetricArchive
+from sauron.cli import sauron
+from sauron.types import BlockProducer, CpuLoad, DiskUsage, Network, RamUsage, System
+
+
+DAY = 24 * 3600
+START = datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+def _sample(cpu, ping=10.0, missed=0):
+    system = System(CpuLoad(cpu, cpu, cpu), RamUsage(percent=40), DiskUsage(percent=50), 'is running.')
+    bp_status = BlockProducer('bp02', 1, 1000, 50, missed, 0, 3, 0)
+    return system, Network(ping, 100, 50), bp_status
+
+
+def _fill(archive, days=1, every=600):
+    for ts in range(int(START), int(START + days * DAY), every):
+        cpu = (ts - START) / 3600
+        archive.append(*_sample(cpu, ping=None if cpu == 1 else 10.0), ts=ts)
+
+
+def test_window_and_downsample(tmp_path):
+    archive = MetricArchive(str(tmp_path))
+    _fill(archive)
+
+    window = archive.window('cpu_5', START, START + 3 * 3600)
+    assert window.count == 18
+    assert (window.min, window.max, window.last) == (0, 17 / 6, 17 / 6)
+    assert window.mean == pytest.approx(sum(i / 6 for i in range(18)) / 18)
+
+    # NaN from a missing ping is skipped
+    assert archive.window('ping', START, START + 2 * 3600).count == 11
+    assert archive.window('nodeos_up', START, START + DAY).mean == 1
+
+    points = archive.downsample('cpu_5', START, START + 3 * 3600, 3600)
+    assert [ts for ts, _ in points] == [START, START + 3600, START + 7200]
+    assert points[1][1] == pytest.approx(sum(i / 6 for i in range(6, 12)) / 6)
+
+    empty = archive.window('cpu_5', START - DAY, START - 60)
+    assert (empty.count, empty.mean) == (0, None)
+    with pytest.raises(KeyError):
+        archive.window('cpu_42', START, START + DAY)
+
+
+def test_old_segments_are_compressed_and_queryable(tmp_path):
+    archive = MetricArchive(str(tmp_path), hot_days=2)
+    _fill(archive, days=4, every=3600)
+    assert archive.segments() == ['2026-01-01.zst', '2026-01-02.zst', '2026-01-03', '2026-01-04']
+
+    window = archive.window('cpu_1', START + DAY - 7200, START + DAY + 7200)
+    assert (window.count, window.min, window.max) == (4, 22, 25)
+    assert archive.window('cpu_1', START, START + 4 * DAY).count == 96
+
+
+def test_partial_rows_are_ignored(tmp_path):
+    archive = MetricArchive(str(tmp_path))
+    _fill(archive, every=3600)
+    archive.close()
+    with open(os.path.join(tmp_path, '2026-01-01', 'ts.f64'), 'ab') as file:
+        file.write(b'\x00' * 12)
+
+    assert archive.window('cpu_5', START, START + DAY).count == 24
+    # a restart truncates the partial row before appending
+    MetricArchive(str(tmp_path)).append(*_sample(99), ts=START + DAY - 1)
+    window = archive.window('cpu_5', START, START + DAY)
+    assert (window.count, window.last) == (25, 99)
+
+
+def test_archive_command(tmp_path, monkeypatch):
+    archive = MetricArchive(str(tmp_path))
+    _fill(archive, every=3600)
+    monkeypatch.setattr('time.time', lambda: START + DAY)
+
+    result = CliRunner().invoke(sauron, ['archive', str(tmp_path), 'missed_bpr', '--hours', '6', '--step', '3600'])
+    assert result.exit_code == 0, result.output
+    report = msgspec.json.decode(result.output)
+    assert report['window']['count'] == 6
+    assert len(report['points']) == 6
+
+    result = CliRunner().invoke(sauron, ['archive', str(tmp_path), 'nope'])
+    assert result.exit_code != 0
+    assert set(COLUMNS) >= {'cpu_5', 'ping', 'total_votes'}
@@ -0,0 +1,127 @@
+import zlib
+import struct
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import patch
+
+import pytest
+
+from sauron.archive import MetricArchive
+from sauron.chart import ChartRenderer, parse_window, render_chart
+from sauron.rpcstats import RpcStats
+from sauron.types import BlockProducer, CpuLoad, DiskUsage, Network, RamUsage, System
+
+
+def _decode_png(png):
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+    chunks = {}
+    offset = 8
+    while offset < len(png):
+        length, kind = struct.unpack('>I4s', png[offset:offset + 8])
+        data = png[offset + 8:offset + 8 + length]
+        assert struct.unpack('>I', png[offset + 8 + length:offset + 12 + length])[0] == zlib.crc32(kind + data)
+        chunks[kind] = data
+        offset += 12 + length
+    width, height = struct.unpack('>II', chunks[b'IHDR'][:8])
+    raw = zlib.decompress(chunks[b'IDAT'])
+    stride = width * 3 + 1
+    rows = [raw[y * stride + 1:(y + 1) * stride] for y in range(height)]
+    return width, height, rows
+
+
+def test_parse_window():
+    assert parse_window('30m') == 1800
+    assert parse_window('6h') == 6 * 3600
+    assert parse_window('1.5d') == 36 * 3600
+    for text in ('6', 'h', '0h', '31d', '6w'):
+        with pytest.raises(ValueError):
+            parse_window(text)
+
+
+def test_render_chart_draws_the_series():
+    points = [(i * 60.0, float(i)) for i in range(100)]
+    width, height, rows = _decode_png(render_chart(points, 200, 100))
+    assert (width, height) == (200, 100)
+    blue = bytes((33, 102, 172))
+    # the line rises left to right: low on the left, high on the right
+    left = [y for y, row in enumerate(rows) if row[13 * 3:14 * 3] == blue]
+    right = [y for y, row in enumerate(rows) if row[186 * 3:187 * 3] == blue]
+    assert min(left) > 80 and max(right) < 20
+
+    # gaps stay blank
+    gapped = points[:40] + [(ts + 3600, value) for ts, value in points[60:]]
+    _, _, rows = _decode_png(render_chart(gapped, 200, 100))
+    middle = 13 + (3600 + 50 * 60) * 173 // (3600 + 99 * 60)
+    assert not any(row[middle * 3:(middle + 1) * 3] == blue for row in rows)
+
+    assert _decode_png(render_chart([], 50, 20))[:2] == (50, 20)
+    assert _decode_png(render_chart([(0, 1.0)], 50, 20))[:2] == (50, 20)
+
+
+@pytest.mark.asyncio
+async def test_renders_are_cached_per_version(tmp_path):
+    archive = MetricArchive(str(tmp_path))
+    system = System(CpuLoad(1, 2, 3), RamUsage(), DiskUsage(), 'is running.')
+    for i in range(12):
+        archive.append(system, Network(), BlockProducer('bp02', 1, 1, 1, 1, 0, 0, 0), ts=1000 + i * 600)
+    charts = ChartRenderer(archive)
+    rendered = []
+
+    def _render(points, *args):
+        rendered.append(points)
+        return render_chart(points, 60, 30)
+
+    try:
+        with patch('sauron.chart.render_chart', new=_render), patch('time.time', return_value=1000 + 7200):
+            # runs in a thread pool here, the bot uses processes
+            charts.pool = ThreadPoolExecutor(1)
+            first, second = await asyncio.gather(
+                charts.render('cpu', 7200, 1),
+                charts.render('cpu', 7200, 1),
+            )
+            assert first == second
+            assert len(rendered) == 1
+            assert [value for _, value in first[1]] == [2.0] * 12
+            await charts.render('cpu', 7200, 2)
+            assert len(rendered) == 2
+            with pytest.raises(KeyError):
+                await charts.render('load', 7200, 2)
+            assert ('load', 7200, 2) not in charts.cache
+    finally:
+        charts.close()
+
+
+@pytest.mark.asyncio
+async def test_process_pool_render():
+    stats = RpcStats()
+    for i in range(6):
+        stats.record('https://node', 'get_info', 10 * (i + 1), now=i * 300)
+    charts = ChartRenderer(None, stats)
+    try:
+        with patch('time.time', return_value=5 * 300 + 1):
+            png, points = await charts.render('rpc', 3600, 1)
+        assert len(points) == 6
+        assert _decode_png(png)[:2] == (720, 320)
+    finally:
+        charts.close()
+
+
+@pytest.mark.asyncio
+async def test_broken_pool_is_replaced():
+    stats = RpcStats()
+    stats.record('https://node', 'get_info', 10, now=300)
+    charts = ChartRenderer(None, stats)
+    try:
+        with patch('time.time', return_value=301):
+            await charts.render('rpc', 3600, 1)
+            # a worker killed under the pool breaks it
+            for process in list(charts.pool._processes.values()):
+                process.kill()
+            with pytest.raises(BrokenProcessPool):
+                await charts.render('rpc', 3600, 2)
+            assert charts.pool is None
+            png, points = await charts.render('rpc', 3600, 3)
+        assert len(points) == 1
+    finally:
+        charts.close()
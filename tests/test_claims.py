@@ -0,0 +1,133 @@
+import time
+import asyncio
+
+import pytest
+
+from sauron.claims import ClaimScheduler, get_claimed_quantity, parse_time_point
+from sauron.types import TxResult
+
+
+CLAIM_RESPONSE = {
+    'transaction_id': 'abcd',
+    'processed': {
+        'action_traces': [{
+            'receiver': 'eosio',
+            'act': {'account': 'eosio', 'name': 'claimrewards', 'data': {'owner': 'openrepublic'}},
+            'inline_traces': [
+                {
+                    'receiver': 'eosio.token',
+                    'act': {'account': 'eosio.token', 'name': 'transfer', 'data': {
+                        'from': 'eosio.bpay', 'to': 'openrepublic', 'quantity': '10.5000 TLOS'}},
+                    'inline_traces': [{
+                        # notification to the producer, must not be counted twice
+                        'receiver': 'openrepublic',
+                        'act': {'account': 'eosio.token', 'name': 'transfer', 'data': {
+                            'from': 'eosio.bpay', 'to': 'openrepublic', 'quantity': '10.5000 TLOS'}},
+                    }]
+                },
+                {
+                    'receiver': 'eosio.token',
+                    'act': {'account': 'eosio.token', 'name': 'transfer', 'data': {
+                        'from': 'eosio.vpay', 'to': 'openrepublic', 'quantity': '1.0001 TLOS'}},
+                }
+            ]
+        }]
+    }
+}
+
+
+class FakePipeline:
+    def __init__(self, failures=0, error=ConnectionError('node down')):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    async def push(self, action):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return TxResult(
+            action=action, transaction_id='abcd', endpoint='http://node',
+            latency_ms=12.5, response=CLAIM_RESPONSE)
+
+
+def test_get_claimed_quantity():
+    assert get_claimed_quantity(CLAIM_RESPONSE, 'openrepublic') == '11.5001 TLOS'
+    assert get_claimed_quantity({}, 'openrepublic') == '0.0000 TLOS'
+    assert get_claimed_quantity({'processed': {'action_traces': [{}]}}, 'openrepublic') == '0.0000 TLOS'
+
+
+def test_parse_time_point():
+    assert parse_time_point('1970-01-02T00:00:00.000') == 86400
+
+
+@pytest.mark.asyncio
+async def test_claim_retries_with_backoff():
+    pipeline = FakePipeline(failures=2)
+    scheduler = ClaimScheduler(pipeline, 'openrepublic', lambda: 0, backoff=0.001)
+    record = await scheduler.claim()
+    assert record.attempts == 3
+    assert record.quantity == '11.5001 TLOS'
+    assert list(scheduler.history) == [record]
+
+
+@pytest.mark.asyncio
+async def test_claim_gives_up():
+    scheduler = ClaimScheduler(FakePipeline(failures=10), 'openrepublic', lambda: 0, retries=2, backoff=0.001)
+    with pytest.raises(ConnectionError):
+        await scheduler.claim()
+    assert not scheduler.history
+
+
+@pytest.mark.asyncio
+async def test_chain_rejections_are_not_retried():
+    pipeline = FakePipeline(failures=10, error=RuntimeError('already claimed'))
+    scheduler = ClaimScheduler(pipeline, 'openrepublic', lambda: 0, backoff=10)
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(scheduler.claim(), 1)
+    assert pipeline.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_rejected_claim_waits_for_the_hourly_check(monkeypatch, caplog):
+    pipeline = FakePipeline(failures=100, error=RuntimeError('already claimed'))
+    scheduler = ClaimScheduler(pipeline, 'openrepublic', lambda: 0, backoff=0.01)
+    task = asyncio.create_task(scheduler.run())
+    await asyncio.sleep(0.1)
+    # not pushed again every backoff
+    assert pipeline.calls == 1
+    assert scheduler.rejected == 0
+    task.cancel()
+    caplog.clear()
+
+    monkeypatch.setattr('sauron.claims.RECHECK_INTERVAL', 0.02)
+    pipeline = FakePipeline(failures=100, error=RuntimeError('already claimed'))
+    scheduler = ClaimScheduler(pipeline, 'openrepublic', lambda: 0, backoff=0.01)
+    with caplog.at_level('DEBUG', logger='sauron.claims'):
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.15)
+        task.cancel()
+    assert pipeline.calls > 2
+    rejected = [record for record in caplog.records if record.levelname == 'ERROR']
+    assert len(rejected) == 1
+
+
+@pytest.mark.asyncio
+async def test_manual_claim_does_not_wait_out_the_backoff():
+    pipeline = FakePipeline(failures=1)
+    scheduler = ClaimScheduler(pipeline, 'openrepublic', lambda: 0, backoff=10)
+    background = asyncio.create_task(scheduler.claim())
+    await asyncio.sleep(0.01)
+    # the background claim is backing off, the lock is free
+    record = await asyncio.wait_for(scheduler.claim(), 1)
+    assert record.attempts == 1
+    background.cancel()
+
+
+@pytest.mark.asyncio
+async def test_next_claim_in():
+    now = time.time()
+    scheduler = ClaimScheduler(FakePipeline(), 'openrepublic', lambda: now - 3600)
+    assert 82700 < await scheduler.next_claim_in() <= 82800
+    scheduler = ClaimScheduler(FakePipeline(), 'openrepublic', lambda: now - 90000)
+    assert await scheduler.next_claim_in() == 0
@@ -0,0 +1,106 @@
+import os
+import math
+import time
+import asyncio
+
+import pytest
+
+from sauron.collectors import CollectorError, CollectorRunner
+
+
+@pytest.mark.asyncio
+async def test_thread_collector_deadline():
+    runner = CollectorRunner(workers=2)
+    runner.register('slow', time.sleep, 0.1)
+    runner.register('fast', math.sqrt, 1)
+    try:
+        start = time.perf_counter()
+        with pytest.raises(TimeoutError):
+            await runner.run('slow', 0.5)
+        assert time.perf_counter() - start < 0.3
+        # the stuck call keeps its thread, a second one is refused
+        with pytest.raises(CollectorError):
+            await runner.run('slow', 0)
+        assert await runner.run('fast', 9) == 3
+
+        await asyncio.sleep(0.5)
+        assert await runner.run('slow', 0) is None
+        stats = {stats.name: stats for stats in runner.report()}
+        assert (stats['slow'].runs, stats['slow'].timeouts, stats['slow'].failures) == (2, 1, 1)
+        assert not stats['slow'].running
+        assert stats['fast'].runs == 1 and stats['fast'].last_error is None
+    finally:
+        runner.close()
+
+
+@pytest.mark.asyncio
+async def test_isolated_collector_is_killed_and_restarted():
+    runner = CollectorRunner()
+    runner.register('speedtest', time.sleep, 3, isolated=True)
+    runner.register('sqrt', math.sqrt, 30, isolated=True)
+    try:
+        # the first call also pays for starting the worker
+        assert await runner.run('sqrt', 16) == 4
+        with pytest.raises(CollectorError):
+            await runner.run('sqrt', -1)
+        assert await runner.run('sqrt', 25) == 5
+
+        runner.set_timeout('speedtest', 0.5)
+        await runner.run('speedtest', 0)
+        worker = runner.collectors['speedtest'][2]
+        stuck = worker.process
+        start = time.perf_counter()
+        with pytest.raises(TimeoutError):
+            await runner.run('speedtest', 60)
+        assert time.perf_counter() - start < 2
+        assert not stuck.is_alive()
+        runner.set_timeout('speedtest', 30)
+        assert await runner.run('speedtest', 0) is None
+
+        stats = {stats.name: stats for stats in runner.report()}
+        assert (stats['speedtest'].timeouts, stats['speedtest'].restarts) == (1, 1)
+        assert stats['sqrt'].failures == 1
+        assert stats['sqrt'].last_error.startswith('ValueError')
+    finally:
+        runner.close()
+
+
+@pytest.mark.asyncio
+async def test_isolated_worker_exiting_on_its_own():
+    runner = CollectorRunner()
+    runner.register('exit', os._exit, 30, isolated=True)
+    try:
+        with pytest.raises(CollectorError, match='exited'):
+            await runner.run('exit', 1)
+        worker = runner.collectors['exit'][2]
+        assert worker.conn is None
+        worker.start()
+        conn = worker.conn
+        worker.process.kill()
+        worker.process.join(5)
+        # a restart closes the pipe of the dead worker
+        worker.start()
+        assert conn.closed
+    finally:
+        runner.close()
+
+
+@pytest.mark.asyncio
+async def test_failures_are_alerted_until_a_success():
+    runner = CollectorRunner()
+    runner.register('ntp', asyncio.sleep, 0.1)
+    runner.register('sqrt', math.sqrt, 1)
+    try:
+        # coroutine collectors are cancelled at their deadline
+        with pytest.raises(TimeoutError):
+            await runner.run('ntp', 60)
+        with pytest.raises(ValueError):
+            await runner.run('sqrt', -1)
+        alerts = {alert.metric: alert for alert in runner.alerts()}
+        assert alerts['collector.ntp'].rule == 'timeout'
+        assert alerts['collector.sqrt'].reason.startswith('sqrt collector: ValueError')
+
+        assert await runner.run('ntp', 0) is None
+        assert [alert.metric for alert in runner.alerts()] == ['collector.sqrt']
+    finally:
+        runner.close()
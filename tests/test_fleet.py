@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from sauron.fleet import FleetAgent, FleetReceiver
+from sauron.types import (
+    Cache, CpuLoad, DiskUsage, HostSample, RamUsage, System
+)
+
+
+def _system(disk=50, nodeos='is running.'):
+    return System(**{
+        'cpu_load': CpuLoad(min_1=0.1, min_5=0.1, min_15=0.1),
+        'ram_usage': RamUsage(percent=40),
+        'disk_usage': DiskUsage(percent=disk),
+        'nodeos_status': nodeos,
+        'updated_at': '12:00:00',
+    })
+
+
+def _samples(host, *systems):
+    return [HostSample(host, 1000.0 + i, system) for i, system in enumerate(systems)]
+
+
+@pytest.mark.asyncio
+async def test_ingest_per_host_caches():
+    cache = Cache()
+    receiver = FleetReceiver(cache, 'secret')
+    agent = FleetAgent('http://central/fleet', 'backup', 'secret')
+
+    assert await receiver.ingest(agent.encode(_samples('backup', _system(), _system(disk=95)))) == 2
+    assert await receiver.ingest(agent.encode(_samples('api1', _system()))) == 1
+
+    assert sorted(cache.hosts) == ['api1', 'backup']
+    assert cache.hosts['backup'].system.disk_usage.percent == 95
+    assert [alert.metric for alert in cache.hosts['backup'].alerts] == ['disk']
+    assert not cache.hosts['api1'].alert
+    assert not cache.alert
+
+
+@pytest.mark.asyncio
+async def test_ingest_measures_rates_between_samples():
+    cache = Cache()
+    receiver = FleetReceiver(cache, 'secret')
+    agent = FleetAgent('', 'backup', 'secret')
+    # samples two minutes apart arrive in one batch, disk grows 0.5%/min
+    samples = [HostSample('backup', 1000.0 + i * 120, _system(disk=50 + (i == 11))) for i in range(12)]
+    await receiver.ingest(agent.encode(samples))
+    assert not cache.hosts['backup'].alert
+
+
+@pytest.mark.asyncio
+async def test_ingest_rejects_bad_token():
+    receiver = FleetReceiver(Cache(), 'secret')
+    agent = FleetAgent('http://central/fleet', 'backup', 'nope')
+    with pytest.raises(PermissionError):
+        await receiver.ingest(agent.encode(_samples('backup', _system())))
+
+
+@pytest.mark.asyncio
+async def test_ingest_needs_a_token():
+    receiver = FleetReceiver(Cache())
+    with pytest.raises(PermissionError):
+        await receiver.ingest(FleetAgent('', 'backup').encode(_samples('backup', _system())))
+    with pytest.raises(ValueError):
+        await receiver.start('127.0.0.1', 0)
+
+
+@pytest.mark.asyncio
+async def test_ingest_limits_hosts():
+    cache = Cache()
+    receiver = FleetReceiver(cache, 'secret', max_hosts=2)
+    agent = FleetAgent('', 'backup', 'secret')
+    samples = [HostSample(host, 1000.0, _system()) for host in ('api1', 'api2', 'api3', 'api1')]
+    assert await receiver.ingest(agent.encode(samples)) == 3
+    assert sorted(cache.hosts) == ['api1', 'api2']
+
+    cache = Cache()
+    receiver = FleetReceiver(cache, 'secret', hosts=['backup'])
+    assert await receiver.ingest(agent.encode(samples + _samples('backup', _system()))) == 1
+    assert list(cache.hosts) == ['backup']
+
+
+@pytest.mark.asyncio
+async def test_check_stale():
+    cache = Cache()
+    receiver = FleetReceiver(cache, 'secret', stale_after=60)
+    await receiver.ingest(FleetAgent('', 'api1', 'secret').encode(_samples('api1', _system())))
+    receiver.check_stale(now=1030)
+    assert not cache.hosts['api1'].alert
+    receiver.check_stale(now=1120)
+    assert cache.hosts['api1'].alerts[0].metric == 'stale'
+
+
+@pytest.mark.asyncio
+async def test_agent_pushes_over_http():
+    cache = Cache()
+    receiver = FleetReceiver(cache, 'secret')
+    app = web.Application()
+    app.router.add_post('/fleet', receiver.handle)
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    try:
+        agent = FleetAgent(str(client.make_url('/fleet')), 'backup', 'secret', batch_size=2)
+        agent.buffer.extend(_samples('backup', _system(), _system(nodeos='is NOT running.')))
+        await agent.flush()
+        assert not agent.buffer
+        assert cache.hosts['backup'].alerts[0].metric == 'nodeos'
+
+        res = await client.post('/fleet', data=b'garbage')
+        assert res.status == 400
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_agent_pushes_over_udp():
+    cache = Cache()
+    receiver = FleetReceiver(cache, 'secret')
+    transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: receiver, local_addr=('127.0.0.1', 0))
+    try:
+        port = transport.get_extra_info('sockname')[1]
+        agent = FleetAgent(f'udp://127.0.0.1:{port}', 'api2', 'secret')
+        await agent.send(_samples('api2', _system()))
+        for _ in range(50):
+            if 'api2' in cache.hosts:
+                break
+            await asyncio.sleep(0.01)
+        assert 'api2' in cache.hosts
+    finally:
+        transport.close()
@@ -0,0 +1,79 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import msgspec
+import pytest
+
+from sauron.leaderboard import ProducerLeaderboard
+from sauron.types import ProducerRow
+from sauron.utils import get_network_message
+
+
+def _rows(count, missing=(), missed_rotation=1):
+    return [
+        ProducerRow(
+            f'bp{i}',
+            total_votes=(count - i) * 10000,
+            lifetime_produced_blocks=100000,
+            lifetime_missed_blocks=100 + i,
+            missed_blocks_per_rotation=missed_rotation if i in missing else 0,
+            unpaid_blocks=1000 + i,
+        )
+        for i in range(count)
+    ]
+
+
+def test_our_misses_are_outliers():
+    board = ProducerLeaderboard('http://node', 'bp3').update(_rows(42, missing={3}, missed_rotation=12), now=0)
+    assert (board.producers, board.scheduled, board.rank) == (42, 21, 4)
+    assert board.missing == 1
+    assert not board.chain_wide
+    columns = {stats.column: stats for stats in board.columns}
+    assert columns['missed_rotation'].p50 == 0
+    assert columns['missed_rotation'].ours == 12
+    assert columns['missed_rotation'].position == 1
+    assert columns['unpaid'].position == pytest.approx(4 / 42, abs=1e-4)
+    assert columns['votes'].ours == 39
+    assert [(o.owner, o.column) for o in board.outliers] == [('bp3', 'missed_rotation')]
+    assert '1/21 scheduled' in get_network_message(board, 'bp3')
+
+
+def test_chain_wide_event_and_snapshot_cache():
+    leaderboard = ProducerLeaderboard('http://node', 'bp3')
+    board = leaderboard.update(_rows(42, missing=set(range(0, 21, 2))), now=0)
+    assert board.missing == 11
+    assert board.chain_wide
+    assert 'chain-wide' in get_network_message(board, 'bp3')
+
+    # the same table is not ranked again
+    assert leaderboard.update(_rows(42, missing=set(range(0, 21, 2))), now=60) is board
+    assert leaderboard.update(_rows(42), now=60) is not board
+
+
+@pytest.mark.asyncio
+async def test_table_is_streamed_once_for_concurrent_callers():
+    rows = [msgspec.structs.asdict(row) | {'is_active': 1, 'url': ''} for row in _rows(150)]
+    rows += [{'owner': 'old', 'total_votes': '1.0', 'is_active': 0}]
+    calls = []
+
+    async def _post(url, json):
+        calls.append(json['lower_bound'])
+        await asyncio.sleep(0.01)
+        start = int(json['lower_bound'] or 0)
+        more = start + json['limit'] < len(rows)
+        response = MagicMock()
+        response.content = msgspec.json.encode({
+            'rows': rows[start:start + json['limit']],
+            'more': more,
+            'next_key': str(start + json['limit']) if more else '',
+        })
+        return response
+
+    leaderboard = ProducerLeaderboard('http://node', 'bp7')
+    with patch('sauron.service.asks.post', side_effect=_post):
+        first, second = await asyncio.gather(leaderboard.get(), leaderboard.get())
+        assert await leaderboard.get() is first
+    assert first is second
+    assert calls == ['', '100']
+    assert first.producers == 150
+    assert first.rank == 8
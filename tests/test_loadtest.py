@@ -0,0 +1,79 @@
+import json
+import urllib.request
+from unittest.mock import patch
+
+import pytest
+
+from sauron.loadtest import CallCounter, current_command, run_load
+from sauron.rpcstats import RpcStats
+from sauron.types import Config
+
+
+@pytest.fixture
+def mock_config():
+    return Config(**{
+        'abi_path': './eosio.abi',
+        'bot_token': '726:ck',
+        'chat_id': '-1042',
+        'claimer_permission': 'claimer',
+        'claimer_private_key': '5JBk',
+        'location': '2001',
+        'node_url': 'https://testnet.telos.net',
+        'local_node_url': 'http://127.0.0.1:8888',
+        'producer_name': 'openrepublic',
+        'producer_url': 'https://openrepublic.net',
+        'producer_public_key': 'EOS5zxgsnHa27u...',
+        'register_permission': 'register',
+        'register_private_key': '5HwdBtW',
+        'users_alerted': '@gollum',
+        'peer_net_api': False,
+    })
+
+
+class BlockingCleos:
+    '''Blocking `get_table` over HTTP, as the cleos client does it.'''
+
+    def __init__(self, endpoint=None, **kwargs):
+        self.endpoint = endpoint
+
+    def get_table(self, account, scope, table, **kwargs):
+        body = json.dumps({'code': account, 'scope': scope, 'table': table, 'json': True, **kwargs})
+        request = urllib.request.Request(
+            f'{self.endpoint}/v1/chain/get_table_rows',
+            data=body.encode(),
+            headers={'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return json.loads(response.read())['rows']
+
+
+def test_calls_are_counted_per_command():
+    stats = RpcStats()
+    with CallCounter(stats) as counter:
+        stats.record('http://node', 'get_info', 5)
+        token = current_command.set('/s')
+        stats.record('http://node', 'get_table', 5)
+        stats.record('http://node', 'get_table', 5)
+        current_command.reset(token)
+    stats.record('http://node', 'get_table', 5)
+    assert counter.calls == {None: {'get_info': 1}, '/s': {'get_table': 2}}
+    assert 'record' not in vars(stats)
+
+
+@pytest.mark.asyncio
+async def test_handlers_under_load(mock_config):
+    with patch('sauron.telegram.CLEOS', BlockingCleos):
+        report = await run_load(mock_config, updates=30, concurrency=10, interval=1, rpc_latency=0.005, warmup=1)
+
+    assert report.updates == 30
+    assert report.throughput > 0
+    commands = {command.command: command for command in report.commands}
+    assert set(commands) == {'/s', '/schedule', '/history'}
+    assert all(command.updates == 10 and command.unanswered == 0 for command in commands.values())
+    # /s answers from the snapshot, /schedule pages the producers table
+    assert commands['/s'].calls == {'sendMessage': 1}
+    assert commands['/schedule'].calls['get_table_rows'] >= 1
+    assert commands['/history'].calls == {'sendMessage': 1}
+    assert report.background_calls['get_table'] >= 2
+    assert report.baseline.cycles == 1
+    assert report.under_load.cycles >= 1
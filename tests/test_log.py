@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+
+import pytest
+import zstandard
+
+from sauron.log import (
+    JsonFormatter, ZstdRotatingFileHandler, check_levels, parse_levels, set_levels,
+    setup_logging, stop_listener
+)
+
+
+def test_json_formatter():
+    logger = logging.getLogger('sauron.test')
+    record = logger.makeRecord(
+        'sauron.test', logging.WARNING, __file__, 1, 'claim %s failed', ('x',),
+        None, extra={'attempt': 2})
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['level'] == 'WARNING'
+    assert entry['logger'] == 'sauron.test'
+    assert entry['msg'] == 'claim x failed'
+    assert entry['attempt'] == 2
+
+
+def test_check_levels():
+    check_levels('info', 'service:DEBUG')
+    with pytest.raises(ValueError, match='LOUD'):
+        check_levels('INFO', 'service:LOUD')
+    with pytest.raises(ValueError, match='VERBOSE'):
+        check_levels('verbose')
+
+
+def test_parse_levels():
+    assert parse_levels('service:debug, telegram:WARNING,bad') == {
+        'service': 'DEBUG', 'telegram': 'WARNING'}
+    assert parse_levels(None) == {}
+
+
+def test_size_rotation_compresses(tmp_path):
+    path = str(tmp_path / 'sauron.log')
+    handler = ZstdRotatingFileHandler(path, max_bytes=200, interval=0, backup_count=2)
+    handler.setFormatter(JsonFormatter())
+    logger = logging.getLogger('sauron.test.rotation')
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        for i in range(20):
+            logger.warning('x' * 50)
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+    assert sorted(os.listdir(tmp_path)) == ['sauron.log', 'sauron.log.1.zst', 'sauron.log.2.zst']
+    with open(tmp_path / 'sauron.log.1.zst', 'rb') as file:
+        lines = zstandard.ZstdDecompressor().stream_reader(file).read().decode().splitlines()
+    assert json.loads(lines[0])['msg'] == 'x' * 50
+
+
+def test_time_rotation(tmp_path):
+    path = str(tmp_path / 'sauron.log')
+    handler = ZstdRotatingFileHandler(path, max_bytes=0, interval=3600, backup_count=2)
+    record = logging.makeLogRecord({'msg': 'hello'})
+    assert not handler.shouldRollover(record)
+    handler.rollover_at = 0
+    assert handler.shouldRollover(record)
+    handler.close()
+
+
+def test_setup_logging_queue(tmp_path):
+    path = str(tmp_path / 'sauron.log')
+    listener = setup_logging('INFO', 'service:ERROR', filename=path)
+    try:
+        logging.getLogger('sauron.service').warning('filtered')
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            logging.getLogger('sauron.telegram').exception('failed %d', 1)
+    finally:
+        stop_listener(listener)
+        logging.getLogger('sauron').handlers.clear()
+
+    with open(path) as file:
+        entries = [json.loads(line) for line in file]
+    assert len(entries) == 1
+    assert entries[0]['msg'] == 'failed 1'
+    assert 'ValueError: boom' in entries[0]['exc']
+
+
+def test_set_levels_resets_overrides():
+    set_levels('INFO', 'service:DEBUG')
+    assert logging.getLogger('sauron.service').level == logging.DEBUG
+    set_levels('WARNING', 'telegram:ERROR')
+    assert logging.getLogger('sauron').level == logging.WARNING
+    assert logging.getLogger('sauron.service').level == logging.NOTSET
+    assert logging.getLogger('sauron.telegram').level == logging.ERROR
+    set_levels('INFO')
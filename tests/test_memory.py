@@ -0,0 +1,81 @@
+import gc
+import resource
+import tracemalloc
+
+import msgspec
+
+from sauron.alerts import AlertManager
+from sauron.anomaly import AnomalyDetector
+from sauron.types import (
+    BlockProducer, Cache, CpuLoad, DiskUsage, ProducerVotes, RamUsage, System,
+    TablePage
+)
+from sauron.votes import VoteTracker
+
+
+page_decoder = msgspec.json.Decoder(TablePage[ProducerVotes], strict=False)
+
+
+def _page(cycle: int) -> bytes:
+    # a few producers trade places every cycle, unknown fields are dropped
+    rows = [{
+        'owner': f'bp{i:02d}',
+        'total_votes': f'{(60 - i) * 1e9 + (cycle * (i + 1)) % 7 * 2e9:.17f}',
+        'producer_key': 'EOS' + 'x' * 50,
+        'url': f'https://bp{i:02d}.example',
+        'is_active': 1,
+    } for i in range(60)]
+    return msgspec.json.encode({'rows': rows, 'more': False, 'next_key': ''})
+
+
+def _cycle(cycle: int, pages: list[bytes], cache, detector, manager, tracker):
+    load = 20.0 if cycle % 50 < 5 else 0.5
+    cache.system = System(
+        cpu_load=CpuLoad(load, load, load),
+        ram_usage=RamUsage(percent=40 + cycle % 3),
+        disk_usage=DiskUsage(percent=50),
+        nodeos_status='is running.',
+        updated_at='00:00:00',
+    )
+    cache.alerts = detector.evaluate(cache.system, cycle * 60.0)
+    manager.update(cache.alerts, cycle * 60.0)
+    tracker.update(page_decoder.decode(pages[cycle % len(pages)]).rows, cycle * 60.0)
+    BlockProducer('bp05', 1, 0, cycle, 0, 0, 0, 0)
+
+
+def test_hot_path_structs_are_not_gc_tracked():
+    system = System(cpu_load=CpuLoad(1, 1, 1))
+    rows = page_decoder.decode(_page(0)).rows
+    assert not gc.is_tracked(system)
+    assert not gc.is_tracked(rows[0])
+    assert not gc.is_tracked(BlockProducer('bp', 1, 0, 0, 0, 0, 0, 0))
+    assert not hasattr(rows[0], 'producer_key')
+
+
+def test_soak_memory_is_flat():
+    pages = [_page(cycle) for cycle in range(7)]
+    cache = Cache()
+    detector = AnomalyDetector()
+    manager = AlertManager(['@ops'], dedup_window=0)
+    tracker = VoteTracker('bp05')
+
+    # warm up every ring buffer, alert key and interned owner
+    for cycle in range(500):
+        _cycle(cycle, pages, cache, detector, manager, tracker)
+    gc.collect()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        for cycle in range(500, 2500):
+            _cycle(cycle, pages, cache, detector, manager, tracker)
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    assert current - baseline < 64 * 1024
+    assert peak - baseline < 1024 * 1024
+    assert rss_after - rss_before < 16 * 1024
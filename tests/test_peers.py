@@ -0,0 +1,138 @@
+import socket
+import asyncio
+from unittest.mock import patch
+
+import msgspec
+import pytest
+from aiohttp import web
+
+from sauron.peers import PeerMonitor, split_address
+from sauron.utils import get_peers_message
+
+
+async def _fake_peers(count):
+    async def _accept(reader, writer):
+        writer.close()
+
+    servers = [await asyncio.start_server(_accept, '127.0.0.1', 0) for _ in range(count)]
+    addresses = [f"127.0.0.1:{server.sockets[0].getsockname()[1]}" for server in servers]
+    return servers, addresses
+
+
+def _closed_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def _close(servers):
+    for server in servers:
+        server.close()
+        await server.wait_closed()
+
+
+def test_split_address():
+    assert split_address('peer.telos.net:9876') == ('peer.telos.net', 9876)
+    assert split_address('[::1]:9877') == ('::1', 9877)
+    assert split_address('peer.telos.net') == ('peer.telos.net', 9876)
+
+
+@pytest.mark.asyncio
+async def test_probes_are_bounded_and_timed():
+    servers, addresses = await _fake_peers(150)
+    down = f'127.0.0.1:{_closed_port()}'
+    in_flight = 0
+    most = 0
+    connect = asyncio.open_connection
+
+    async def _counted(*args):
+        nonlocal in_flight, most
+        in_flight += 1
+        most = max(most, in_flight)
+        try:
+            await asyncio.sleep(0.005)
+            return await connect(*args)
+        finally:
+            in_flight -= 1
+
+    monitor = PeerMonitor(None, addresses + [down], min_peers=3, concurrency=16)
+    try:
+        with patch('sauron.peers.asyncio.open_connection', new=_counted):
+            report = await monitor.poll(now=0)
+    finally:
+        await _close(servers)
+
+    assert most == 16
+    assert report.connected == 150
+    assert report.latency_p50_ms is not None
+    assert [peer.address for peer in report.peers if not peer.connected] == [down]
+    assert monitor.alerts() == []
+
+
+@pytest.mark.asyncio
+async def test_churn_and_starvation():
+    servers, addresses = await _fake_peers(4)
+    monitor = PeerMonitor(None, addresses, min_peers=3, timeout=1)
+    try:
+        first = await monitor.poll(now=0)
+        assert (first.connected, first.added, first.churn_1h) == (4, [], 0)
+
+        await _close(servers[:2])
+        second = await monitor.poll(now=60)
+        assert second.connected == 2
+        assert second.removed == sorted(addresses[:2])
+        assert second.churn_1h == 2
+        [alert] = monitor.alerts()
+        assert (alert.metric, alert.rule, alert.score) == ('peers', 'starvation', 1)
+        assert 'left' in get_peers_message(second, 3)
+
+        # churn older than an hour is forgotten
+        assert (await monitor.poll(now=3700)).churn_1h == 0
+    finally:
+        await _close(servers[2:])
+
+
+@pytest.mark.asyncio
+async def test_net_api_connections():
+    servers, addresses = await _fake_peers(1)
+    connections = [
+        {'peer': addresses[0], 'connecting': False, 'syncing': False, 'is_socket_open': True,
+         'last_handshake': {'p2p_address': addresses[0], 'head_num': 1000, 'agent': 'EOS Test Agent', 'key': 'x'}},
+        {'peer': '', 'connecting': False, 'syncing': True, 'is_socket_open': True,
+         'last_handshake': {'p2p_address': 'incoming.telos.net:9876 - 1a2b3c4', 'head_num': 990}},
+        {'peer': 'dead.telos.net:9876', 'connecting': True, 'syncing': False, 'is_socket_open': False},
+    ]
+
+    async def _connections(request):
+        return web.Response(body=msgspec.json.encode(connections), content_type='application/json')
+
+    app = web.Application()
+    app.router.add_post('/v1/net/connections', _connections)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+    try:
+        monitor = PeerMonitor(url, [addresses[0]], min_peers=3)
+        report = await monitor.poll(now=0)
+    finally:
+        await runner.cleanup()
+        await _close(servers)
+
+    assert report.error is None
+    assert report.connected == 2
+    assert report.syncing == 1
+    peers = {peer.address: peer for peer in report.peers}
+    assert peers[addresses[0]].head_num == 1000
+    assert peers[addresses[0]].latency_ms is not None
+    assert not peers['dead.telos.net:9876'].connected
+    assert monitor.alerts()[0].value == 2
+
+
+@pytest.mark.asyncio
+async def test_missing_net_api_does_not_alert():
+    monitor = PeerMonitor(f'http://127.0.0.1:{_closed_port()}', [], timeout=1)
+    report = await monitor.poll(now=0)
+    assert report.error is not None
+    assert monitor.alerts() == []
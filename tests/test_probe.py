@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import subprocess
+from unittest.mock import patch
+
+import msgspec
+import pytest
+
+from sauron.probe import CRITICAL, OK, UNKNOWN, WARNING, collect_status, get_summary
+from sauron.types import (
+    BlockProducer, Config, CpuLoad, DiskUsage, ProducerVotes, RamUsage,
+    StatusReport, System
+)
+
+
+@pytest.fixture
+def mock_config():
+    return Config(**{
+        'abi_path': './eosio.abi',
+        'bot_token': '726_ck',
+        'chat_id': '-1042',
+        'claimer_permission': 'claimer',
+        'claimer_private_key': '5JBk',
+        'location': '2001',
+        'node_url': 'https://testnet.telos.net',
+        'local_node_url': 'http://127.0.0.1:8888',
+        'producer_name': 'bp02',
+        'producer_url': 'https://openrepublic.net',
+        'producer_public_key': 'EOS5zxgsnHa27u...',
+        'register_permission': 'register',
+        'register_private_key': '5HwdBtW',
+        'users_alerted': '@gollum',
+    })
+
+
+def _system(disk=50, nodeos='is running.'):
+    return System(CpuLoad(), RamUsage(percent=40), DiskUsage(percent=disk), nodeos)
+
+
+def _collectors(system=None, missed=0, clock='Synced', delay=0):
+    async def _producers(url):
+        return [ProducerVotes(f'bp{i:02d}', 100.0 - i) for i in range(1, 30)]
+
+    def _system_sample():
+        time.sleep(delay)
+        return system or _system()
+
+    bp_status = BlockProducer('bp02', 1, 10, 1000, 1, missed, 0, 0, alert=missed > 0)
+    return [
+        patch('sauron.probe.collect_system', new=_system_sample),
+        patch('sauron.probe.get_producer_status', return_value=(bp_status, missed)),
+        patch('sauron.probe.get_all_producers', new=_producers),
+        patch('sauron.probe.get_clock_offset', return_value=clock),
+    ]
+
+
+async def _collect(config, deadline=5, **kwargs):
+    patches = _collectors(**kwargs)
+    for item in patches:
+        item.start()
+    try:
+        return await collect_status(config, deadline)
+    finally:
+        for item in patches:
+            item.stop()
+
+
+@pytest.mark.asyncio
+async def test_ok_report(mock_config):
+    report = await _collect(mock_config)
+    assert report.exit_code == OK
+    assert report.rank == 2
+    assert (report.rotation.prev_bp, report.rotation.next_bp) == ('bp01', 'bp03')
+    decoded = msgspec.json.decode(msgspec.json.encode(report), type=StatusReport)
+    assert decoded == report
+    assert get_summary(report).startswith('OK - bp02 rank 2')
+
+
+@pytest.mark.asyncio
+async def test_exit_codes_follow_alerts(mock_config):
+    assert (await _collect(mock_config, system=_system(disk=85))).exit_code == WARNING
+    assert (await _collect(mock_config, clock='Desynced')).exit_code == WARNING
+    assert (await _collect(mock_config, missed=3)).exit_code == CRITICAL
+    report = await _collect(mock_config, system=_system(nodeos='is NOT running.'))
+    assert report.exit_code == CRITICAL
+    assert report.state == 'critical'
+
+
+@pytest.mark.asyncio
+async def test_deadline_reports_unknown(mock_config):
+    start = time.perf_counter()
+    report = await _collect(mock_config, deadline=0.2, delay=2)
+    assert time.perf_counter() - start < 1
+    assert report.exit_code == UNKNOWN
+    assert report.system is None
+    assert report.rank == 2
+    assert 'system' in report.errors
+
+
+def test_status_does_not_import_the_bot():
+    code = (
+        'import sys, sauron.probe, sauron.cli\n'
+        'assert not [name for name in sys.modules if name.split(".")[0] in ("telebot", "speedtest")]'
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=root)
@@ -0,0 +1,123 @@
+import os
+
+import pytest
+
+from sauron.alerts import FIRING, AlertManager
+from sauron.reload import ConfigWatcher
+from sauron.service import get_config
+from sauron.transactions import TransactionPipeline
+from sauron.types import Alert
+
+
+CONFIG = '''[config]
+abi_path = ./eosio.abi
+bot_token = 726_ck
+chat_id = -1042
+claimer_permission = claimer
+claimer_private_key = 5JBk
+location = 2001
+node_url = {node_url}
+local_node_url = http://127.0.0.1:8888
+producer_name = openrepublic
+producer_url = https://openrepublic.net
+producer_public_key = EOS5zxgsnHa27u
+register_permission = register
+register_private_key = 5HwdBtW
+users_alerted = {users}
+{extra}
+'''
+
+
+def _write(path, extra='', mtime=None, node_url='https://testnet.telos.net', users='@gollum'):
+    path.write_text(CONFIG.format(extra=extra, node_url=node_url, users=users))
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+
+def _watcher(path, on_change=None):
+    applied = []
+
+    def _apply(old, new):
+        if on_change is not None:
+            on_change(old, new)
+        applied.append(new)
+
+    watcher = ConfigWatcher(str(path), get_config(str(path)), get_config, _apply)
+    return watcher, applied
+
+
+def test_unchanged_file_is_not_parsed(tmp_path):
+    path = tmp_path / 'config.ini'
+    _write(path)
+    watcher, applied = _watcher(path)
+    watcher.load = None
+    assert watcher.check() == []
+    assert applied == []
+
+
+def test_change_is_validated_and_swapped(tmp_path):
+    path = tmp_path / 'config.ini'
+    _write(path, mtime=1_000_000_000)
+    watcher, applied = _watcher(path)
+    old = watcher.config
+
+    _write(path, node_url='http://backup:8888', users='@gollum, @sam', mtime=2_000_000_000)
+    assert watcher.check() == ['node_url', 'users_alerted']
+    assert applied == [watcher.config]
+    assert watcher.config is not old
+    assert watcher.config.users_alerted == '@gollum, @sam'
+
+
+def test_invalid_file_keeps_running_config(tmp_path):
+    path = tmp_path / 'config.ini'
+    _write(path, mtime=1_000_000_000)
+    watcher, applied = _watcher(path)
+    old = watcher.config
+
+    _write(path, 'status_interval = often', mtime=2_000_000_000)
+    assert watcher.check() == []
+    _write(path, 'status_interval = 30\nstatus_interval = 40', mtime=2_500_000_000)
+    assert watcher.check() == []
+    _write(path, 'log_levels = service:LOUD', mtime=2_700_000_000)
+    assert watcher.check() == []
+    _write(path, 'webhook_url = https://bot.example/telegram', mtime=2_800_000_000)
+    assert watcher.check() == []
+    _write(path, 'fleet_port = 9100', mtime=2_900_000_000)
+    assert watcher.check() == []
+
+    # a failing apply is rolled back as well
+    def _reject(old, new):
+        raise ValueError('bad producer name')
+
+    watcher.on_change = _reject
+    _write(path, 'status_interval = 30', mtime=3_000_000_000)
+    assert watcher.check() == []
+    assert watcher.config is old
+    assert applied == []
+
+
+def test_live_components_keep_state(tmp_path):
+    path = tmp_path / 'config.ini'
+    _write(path)
+    config = get_config(str(path))
+
+    manager = AlertManager.from_config(config)
+    manager.update([Alert('cpu', 'limit', 95, 1.2, 'cpu high')], now=0)
+    pipeline = TransactionPipeline.from_config(config)
+    local = pipeline.clients['http://127.0.0.1:8888']
+
+    _write(path, node_url='http://backup:8888', users='@sam')
+    new = get_config(str(path))
+    manager.reconfigure(new)
+    pipeline.reconfigure(new)
+
+    assert manager.users == ['@sam']
+    assert manager.entries['cpu'].state == FIRING
+    assert list(pipeline.clients) == ['http://backup:8888', 'http://127.0.0.1:8888']
+    assert pipeline.clients['http://127.0.0.1:8888'] is local
+    assert pipeline.tapos.clients == list(pipeline.clients.values())
+
+    new.producer_name = 'Bad Name'
+    with pytest.raises(ValueError):
+        pipeline.reconfigure(new)
+    assert 'http://backup:8888' in pipeline.clients
@@ -0,0 +1,146 @@
+import pytest
+from unittest.mock import MagicMock
+
+from sauron.replay import (
+    Recorder, RecordingCleos, ReplayCleos, read_cycles, replay
+)
+from sauron.types import (
+    Alert, Cache, Config, CpuLoad, DiskUsage, PeerReport, ProducerRow, RamUsage,
+    ResourceUsage, System
+)
+
+
+@pytest.fixture
+def mock_config():
+    return Config(**{
+        'abi_path': './eosio.abi',
+        'bot_token': '726_ck',
+        'chat_id': '-1042',
+        'claimer_permission': 'claimer',
+        'claimer_private_key': '5JBk',
+        'location': '2001',
+        'node_url': 'https://testnet.telos.net',
+        'local_node_url': 'https://testnet.telos.net',
+        'producer_name': 'openrepublic',
+        'producer_url': 'https://openrepublic.net',
+        'producer_public_key': 'EOS5zxgsnHa27u...',
+        'register_permission': 'register',
+        'register_private_key': '5HwdBtW',
+        'users_alerted': '@gollum',
+    })
+
+
+def _producer_row(missed=0):
+    return [{
+        'owner': 'openrepublic',
+        'is_active': 1,
+        'total_votes': '100000',
+        'lifetime_produced_blocks': 10000,
+        'lifetime_missed_blocks': missed,
+        'missed_blocks_per_rotation': missed,
+        'unpaid_blocks': 50
+    }]
+
+
+PRODUCERS = [
+    ProducerRow('bp1', 3e9),
+    ProducerRow('openrepublic', 2e9),
+    ProducerRow('bp2', 1e9),
+]
+
+
+def _record_day(path, incident_at=600, peers=None, resources=[], failures=[]):
+    '''Records one simulated day, one cycle per minute, with missed blocks
+    during a single rotation at `incident_at`.
+    '''
+    recorder = Recorder(path)
+    cleos = RecordingCleos(MagicMock(), recorder)
+    for minute in range(1440):
+        missed = 12 if incident_at <= minute < incident_at + 3 else 0
+        recorder.start_cycle(ts=1_700_000_000 + minute * 60)
+        cleos.cleos.get_table.side_effect = [
+            _producer_row(missed), [{'bp': 'openrepublic', 'pay': '1.0000 TLOS'}]]
+        cleos.get_table(account='eosio', scope='eosio', table='producers', limit=1)
+        cleos.get_table(account='eosio', scope='eosio', table='payments', limit=10000)
+        cache = Cache(system=System(
+            cpu_load=CpuLoad(0.1, 0.1, 0.1),
+            ram_usage=RamUsage(percent=40),
+            disk_usage=DiskUsage(percent=50),
+            nodeos_status='is running.',
+        ))
+        recorder.record_cycle(
+            cache, 'Synced', PRODUCERS, peers, resources, failures, ts=1_700_000_000 + minute * 60)
+    recorder.close()
+
+
+def test_recording_roundtrip(tmp_path):
+    path = str(tmp_path / 'day.rec')
+    _record_day(path)
+    cycles = list(read_cycles(path))
+    assert len(cycles) == 1440
+    assert [frame.kind for frame in cycles[0]] == [
+        'rpc', 'rpc', 'system', 'network', 'hosts', 'clock', 'producers',
+        'peers', 'resources', 'failures', 'cycle']
+
+    cleos = ReplayCleos(cycles[600])
+    assert cleos.get_table(table='payments')[0]['bp'] == 'openrepublic'
+    assert cleos.get_table(table='producers')[0]['missed_blocks_per_rotation'] == 12
+    with pytest.raises(LookupError):
+        cleos.get_table(table='producers')
+
+
+def test_failed_cycle_is_dropped(tmp_path):
+    path = str(tmp_path / 'failed.rec')
+    recorder = Recorder(path)
+    cleos = RecordingCleos(MagicMock(), recorder)
+    # the first cycle read the producers table, then failed
+    recorder.start_cycle()
+    cleos.cleos.get_table.return_value = _producer_row(12)
+    cleos.get_table(account='eosio', scope='eosio', table='producers', limit=1)
+    recorder.start_cycle()
+    cleos.cleos.get_table.return_value = _producer_row(0)
+    cleos.get_table(account='eosio', scope='eosio', table='producers', limit=1)
+    recorder.record_cycle(Cache(), 'Synced', PRODUCERS)
+    recorder.close()
+
+    [cycle] = read_cycles(path)
+    assert [frame.kind for frame in cycle][:2] == ['rpc', 'system']
+    assert ReplayCleos(cycle).get_table(table='producers')[0]['missed_blocks_per_rotation'] == 0
+
+
+def test_truncated_recording(tmp_path):
+    path = tmp_path / 'day.rec'
+    _record_day(str(path))
+    data = path.read_bytes()
+    path.write_bytes(data[:-3])
+    assert len(list(read_cycles(str(path)))) == 1439
+
+
+@pytest.mark.asyncio
+async def test_replay_day_of_traffic(tmp_path, mock_config):
+    path = str(tmp_path / 'day.rec')
+    _record_day(path)
+    report = await replay(path, mock_config)
+    assert report.cycles == 1440
+    assert report.span_s == 1439 * 60
+    assert report.speedup > 1000
+    assert report.notices[0].raised == ['missed_blocks']
+    assert report.notices[0].users == ['@gollum']
+    assert report.notices[-1].resolved == ['missed_blocks']
+
+
+@pytest.mark.asyncio
+async def test_replay_rebuilds_every_alert(tmp_path, mock_config):
+    path = str(tmp_path / 'day.rec')
+    _record_day(
+        path,
+        peers=PeerReport(updated_at=1_700_000_000, connected=0),
+        resources=[ResourceUsage('openrepublic', 100, 10, 10)],
+        failures=[Alert('collector.ntp', 'timeout', 0, 1, 'ntp collector: no answer within 20s')],
+    )
+    report = await replay(path, mock_config, messages=True)
+    first = report.notices[0]
+    assert first.raised == ['peers', 'openrepublic.cpu', 'collector.ntp']
+    assert 'only 0 p2p peers connected' in first.message
+    assert 'Ranking:' in first.message and ' 2' in first.message.split('Ranking:')[1].split('\n')[0]
+    assert any(notice.raised == ['missed_blocks'] for notice in report.notices)
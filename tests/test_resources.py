@@ -0,0 +1,140 @@
+import time
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import msgspec
+import pytest
+from aiohttp import web
+
+from sauron.claims import ClaimScheduler
+from sauron.resources import ResourceError, ResourceMonitor
+from sauron.transactions import TransactionPipeline
+from sauron.types import AccountResources, Config, ResourceLimit
+from sauron.utils import get_resources_message
+
+
+@pytest.fixture
+def mock_config():
+    return Config(**{
+        'abi_path': './eosio.abi',
+        'bot_token': '726_ck',
+        'chat_id': '-1042',
+        'claimer_permission': 'claimer',
+        'claimer_private_key': '5JBk',
+        'location': '2001',
+        'node_url': 'https://testnet.telos.net',
+        'local_node_url': 'http://127.0.0.1:8888',
+        'producer_name': 'openrepublic',
+        'producer_url': 'https://openrepublic.net',
+        'producer_public_key': 'EOS5zxgsnHa27u...',
+        'register_permission': 'register',
+        'register_private_key': '5HwdBtW',
+        'users_alerted': '@gollum',
+        'resource_accounts': 'claimer.bp, openrepublic',
+    })
+
+
+def _account(name, cpu=10, net=10, ram=10):
+    return AccountResources(
+        name,
+        ram_quota=1000,
+        ram_usage=ram * 10,
+        cpu_limit=ResourceLimit(cpu * 100, (100 - cpu) * 100, 10000),
+        net_limit=ResourceLimit(net * 100, (100 - net) * 100, 10000),
+        core_liquid_balance='12.0000 TLOS',
+    )
+
+
+def test_accounts_come_from_the_config(mock_config):
+    monitor = ResourceMonitor.from_config(mock_config)
+    assert monitor.accounts == ['openrepublic', 'claimer.bp']
+    assert monitor.max_age == 60
+
+
+@pytest.mark.asyncio
+async def test_accounts_are_fetched_concurrently_once(mock_config):
+    requests = []
+
+    async def _get_account(request):
+        body = await request.json()
+        requests.append(body['account_name'])
+        await asyncio.sleep(0.1)
+        account = _account(body['account_name'])
+        # unknown fields are skipped by the decoder
+        payload = msgspec.structs.asdict(account) | {'permissions': [], 'head_block_num': 1}
+        return web.Response(body=msgspec.json.encode(payload), content_type='application/json')
+
+    app = web.Application()
+    app.router.add_post('/v1/chain/get_account', _get_account)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+    try:
+        monitor = ResourceMonitor(url, [f'bp{i}' for i in range(5)])
+        start = time.perf_counter()
+        first, second = await asyncio.gather(monitor.get(), monitor.get())
+        assert time.perf_counter() - start < 0.4
+        assert sorted(requests) == [f'bp{i}' for i in range(5)]
+        assert first['bp3'].cpu_percent == 10
+        assert first['bp3'].balance == '12.0000 TLOS'
+
+        # answered from the cache until max_age
+        await monitor.get()
+        assert len(requests) == 5
+    finally:
+        await runner.cleanup()
+
+
+def test_trend_and_alerts():
+    monitor = ResourceMonitor('http://node', ['bp'], warn_percent=90, warn_hours=6)
+    monitor.update(_account('bp', cpu=10), now=0)
+    assert monitor.alerts() == []
+
+    # 10 % more cpu per half hour, 70 % left: 3.5h
+    usage = monitor.update(_account('bp', cpu=20), now=1800)
+    usage = monitor.update(_account('bp', cpu=30, ram=95), now=3600)
+    assert usage.cpu_eta_s == pytest.approx(3.5 * 3600, rel=0.01)
+    assert usage.net_eta_s is None
+    alerts = {alert.metric: alert for alert in monitor.alerts()}
+    assert alerts['bp.cpu'].rule == 'trend'
+    assert alerts['bp.ram'].rule == 'usage'
+    assert 'bp.net' not in alerts
+    assert 'out in 3.5h' in get_resources_message(list(monitor.usage.values()))
+
+
+@pytest.mark.asyncio
+async def test_exhausted_account_is_not_pushed(mock_config):
+    monitor = ResourceMonitor('http://node', ['openrepublic'])
+    pipeline = TransactionPipeline.from_config(mock_config)
+    pipeline.guard = monitor.check
+    pipeline.tapos.get = MagicMock(side_effect=AssertionError('no chain call expected'))
+    monitor.update(_account('openrepublic', cpu=100), now=time.time())
+    monitor.get_account = AsyncMock(return_value=_account('openrepublic', cpu=100))
+
+    with pytest.raises(ResourceError, match='no CPU left'):
+        await pipeline.push('regproducer')
+
+    scheduler = ClaimScheduler(pipeline, 'openrepublic', lambda: 0, backoff=60)
+    start = time.perf_counter()
+    with pytest.raises(ResourceError):
+        await scheduler.claim()
+    assert time.perf_counter() - start < 1
+
+    # stale usage doesn't block
+    assert monitor.blocker('openrepublic', now=time.time() + 3600) is None
+
+
+@pytest.mark.asyncio
+async def test_refusal_is_confirmed_on_a_fresh_read():
+    monitor = ResourceMonitor('http://node', ['openrepublic'])
+    monitor.update(_account('openrepublic', cpu=100), now=time.time() - 120)
+    monitor.get_account = AsyncMock(return_value=_account('openrepublic', cpu=20))
+    assert monitor.blocker('openrepublic') is not None
+    assert await monitor.check('openrepublic') is None
+    assert monitor.usage['openrepublic'].cpu_percent == 20
+
+    monitor.get_account = AsyncMock(side_effect=ResourceError('get_account openrepublic answered 500'))
+    monitor.update(_account('openrepublic', cpu=100), now=time.time())
+    assert await monitor.check('openrepublic') is None
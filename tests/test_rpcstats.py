@@ -0,0 +1,112 @@
+import pytest
+
+from sauron.rpcstats import (
+    BUCKETS, EndpointStats, InstrumentedCleos, RpcStats, bucket_index, bucket_value
+)
+
+
+def test_buckets_cover_latency_range():
+    assert bucket_index(0.1) == 0
+    assert bucket_index(120_000) == BUCKETS - 1
+    for latency in (1, 12.5, 250, 4000):
+        index = bucket_index(latency)
+        assert bucket_value(index - 1) < latency <= bucket_value(index) * 1.0001
+
+
+def test_quantiles_within_bucket_error():
+    stats = EndpointStats()
+    for i in range(1, 1001):
+        stats.record(float(i), True, now=1000)
+    assert stats.quantile(0.5, now=1000) == pytest.approx(500, rel=0.2)
+    assert stats.quantile(0.99, now=1000) == pytest.approx(990, rel=0.2)
+    # older than an hour
+    assert stats.quantile(0.5, now=1000 + 3 * 60 * 60) is None
+
+
+def test_windows_and_memory_are_bounded():
+    stats = EndpointStats()
+    size = sum(len(array) * array.itemsize for array in (
+        stats.slots, stats.requests, stats.errors, stats.hist_slots, stats.histograms))
+    for minute in range(3 * 24 * 60):
+        stats.record(10, minute % 10 != 0, now=minute * 60.0)
+    now = 3 * 24 * 60 * 60 - 60.0
+    requests, errors = stats.window(60 * 60, now)
+    assert requests == 60
+    assert errors == 6
+    assert stats.window(24 * 60 * 60, now) == (24 * 60, 144)
+    assert sum(len(array) * array.itemsize for array in (
+        stats.slots, stats.requests, stats.errors, stats.hist_slots, stats.histograms)) == size
+
+
+def test_report_availability_and_burn():
+    stats = RpcStats()
+    for i in range(100):
+        stats.record('http://node', 'get_table_rows', 20, ok=i >= 2, now=0,
+                     error=None if i >= 2 else TimeoutError('timed out'))
+    [report] = stats.report(availability_target=99, now=0)
+    assert report.requests_1h == 100
+    assert report.availability_1h == 98
+    assert report.burn_1h == 2
+    assert report.last_error == 'TimeoutError: timed out'
+
+
+@pytest.mark.asyncio
+async def test_timed_calls_record_failures():
+    stats = RpcStats()
+
+    async def _fail():
+        raise ConnectionError('refused')
+
+    with pytest.raises(ConnectionError):
+        await stats.call('http://node', 'get_table_rows', _fail)
+    assert await stats.call('http://node', 'get_table_rows', _ok) == 'ok'
+    [report] = stats.report()
+    assert report.requests_1h == 2
+    assert report.availability_1h == 50
+
+
+async def _ok():
+    return 'ok'
+
+
+def test_instrumented_cleos_times_rpc_methods_only():
+    class FakeCleos:
+        endpoint = 'http://node'
+
+        def get_info(self):
+            return {'head_block_num': 1}
+
+        def load_abi(self, account, abi):
+            return None
+
+    stats = RpcStats()
+    cleos = InstrumentedCleos(FakeCleos(), 'http://node', stats)
+    assert cleos.get_info() == {'head_block_num': 1}
+    cleos.load_abi('eosio', {})
+    assert cleos.endpoint == 'http://node'
+    assert list(stats.endpoints) == [('http://node', 'get_info')]
+
+
+@pytest.mark.asyncio
+async def test_telegram_long_poll_keeps_out_of_latency(monkeypatch):
+    from telebot import asyncio_helper
+    from sauron.telegram import instrument_telegram
+
+    async def _request(token, url, *args, **kwargs):
+        if url == 'getUpdates' and kwargs.get('fail'):
+            raise ConnectionError('reset')
+        return []
+
+    monkeypatch.setattr(asyncio_helper, '_process_request', _request)
+    stats = RpcStats()
+    instrument_telegram(stats)
+    await asyncio_helper._process_request('726:ck', 'getUpdates')
+    with pytest.raises(ConnectionError):
+        await asyncio_helper._process_request('726:ck', 'getUpdates', fail=True)
+    await asyncio_helper._process_request('726:ck', 'sendMessage')
+
+    reports = {report.method: report for report in stats.report()}
+    assert reports['getUpdates'].requests_1h == 2
+    assert reports['getUpdates'].availability_1h == 50
+    assert reports['getUpdates'].p99_ms is None
+    assert reports['sendMessage'].p99_ms is not None
@@ -6,6 +6,7 @@ import subprocess
 from unittest.mock import patch, MagicMock
 
 import locale
+import msgspec
 from ntplib import NTPClient
 from leap.cleos import CLEOS
 
@@ -21,7 +22,10 @@ from sauron.service import (
     get_config,
     get_timestamp_utcnow,
     health_check,
-    call_with_retry
+    call_with_retry,
+    iter_table_rows,
+    get_all_producers,
+    find_producer_rank,
 )
 from sauron.utils import (
     build_producer_status_message,
@@ -34,7 +38,8 @@ from sauron.utils import (
     get_clock_offset
 )
 from sauron.types import (
-    CpuLoad, RamUsage, DiskUsage, BlockProducer, Cache, Config, System, Network
+    CpuLoad, RamUsage, DiskUsage, BlockProducer, Cache, Config, System, Network,
+    ProducerVotes
 )
 
 # -------------------------------------------------------------------
@@ -198,6 +203,72 @@ async def test_call_with_retry():
     result = await call_with_retry(_fail_once)
     assert result == 'success'
 
+def _paged_table(rows):
+    '''Fake get_table_rows endpoint paginating `rows` with next_key.'''
+    calls = []
+
+    async def _post(url, json):
+        calls.append(json)
+        start = int(json['lower_bound'] or 0)
+        page = rows[start:start + json['limit']]
+        more = start + json['limit'] < len(rows)
+        response = MagicMock()
+        response.content = msgspec.json.encode({
+            'rows': page,
+            'more': more,
+            'next_key': str(start + json['limit']) if more else ''
+        })
+        return response
+
+    return _post, calls
+
+def _producers(count, inactive=0):
+    return [
+        {'owner': f'bp{i}', 'total_votes': f'{count - i}.0', 'is_active': 1}
+        for i in range(count)
+    ] + [
+        {'owner': f'old{i}', 'total_votes': '1.0', 'is_active': 0}
+        for i in range(inactive)
+    ]
+
+@pytest.mark.asyncio
+async def test_iter_table_rows_follows_next_key():
+    post, calls = _paged_table(_producers(95))
+    with patch('sauron.service.asks.post', side_effect=post):
+        rows = [row async for row in iter_table_rows(
+            'http://node', 'eosio', 'eosio', 'producers', limit=10)]
+    assert [row['owner'] for row in rows] == [f'bp{i}' for i in range(95)]
+    assert [call['lower_bound'] for call in calls] == ['', *[str(i) for i in range(10, 100, 10)]]
+
+@pytest.mark.asyncio
+async def test_iter_table_rows_stops_on_stuck_cursor():
+    async def _post(url, json):
+        response = MagicMock()
+        response.content = msgspec.json.encode(
+            {'rows': [{'owner': 'bp0'}], 'more': True, 'next_key': '5'})
+        return response
+
+    with patch('sauron.service.asks.post', side_effect=_post):
+        rows = [row async for row in iter_table_rows(
+            'http://node', 'eosio', 'eosio', 'producers', lower_bound='5')]
+    assert len(rows) == 1
+
+@pytest.mark.asyncio
+async def test_get_all_producers_skips_inactive():
+    post, calls = _paged_table(_producers(150, inactive=30))
+    with patch('sauron.service.asks.post', side_effect=post):
+        producers = await get_all_producers('http://node')
+    assert len(producers) == 150
+    assert producers[0] == ProducerVotes('bp0', 150.0)
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_find_producer_rank_stops_early():
+    post, calls = _paged_table(_producers(500))
+    with patch('sauron.service.asks.post', side_effect=post):
+        assert await find_producer_rank('http://node', 'bp42') == 43
+    assert len(calls) == 1
+
 # -------------------------------------------------------------------
 # BP Status + build_producer_status_message tests
 # (similar to your existing 'test_status_message.py' but with expansions)
@@ -335,6 +406,7 @@ async def test_missed_block_status_message_alert(
     assert bp_status.alert
 
 @pytest.mark.asyncio
+@patch('os.cpu_count', new=lambda: 5)
 @patch('sauron.service.get_cpu_load')
 @patch('sauron.service.get_ram_usage')
 @patch('sauron.service.get_disk_usage')
@@ -411,6 +483,8 @@ async def test_cpu_overload_status_message_alert(
         mock_config,
     )
     assert mock_cache.alert
+    assert mock_cache.alerts[0].metric == 'cpu'
+    assert 'Alerts:' in message
 
 @pytest.mark.asyncio
 @patch('sauron.service.get_cpu_load')
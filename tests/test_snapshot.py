@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from sauron.snapshot import SnapshotStore
+from sauron.types import BlockProducer, Cache, Rotation, StatusContext, StatusSnapshot
+
+
+def _collector(delay=0.05):
+    calls = []
+
+    async def collect():
+        calls.append(None)
+        store.mark('system')
+        await asyncio.sleep(delay)
+        return (
+            BlockProducer('bp', 1, 0, len(calls), 0, 0, 0, 0),
+            Cache(),
+            StatusContext('Synced', 5, Rotation(False)),
+        )
+
+    store = SnapshotStore(collect)
+    return store, calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_gets_share_one_refresh():
+    store, calls = _collector()
+    snapshots = await asyncio.gather(*[store.get() for _ in range(20)])
+    assert len(calls) == 1
+    assert {snapshot.version for snapshot in snapshots} == {1}
+    assert 'system' in snapshots[0].updated_at
+
+
+@pytest.mark.asyncio
+async def test_get_serves_stale_snapshot_immediately():
+    store, calls = _collector(delay=10)
+    first = StatusSnapshot(0, BlockProducer('bp', 1, 0, 0, 0, 0, 0, 0), Cache(),
+                           StatusContext('Synced', 5, Rotation(False)))
+    store.snapshot = first
+
+    # stale, so a background refresh starts but the caller does not wait
+    assert await asyncio.wait_for(store.get(), 0.1) is first
+    await asyncio.sleep(0)
+    assert await store.get() is first
+    assert len(calls) == 1
+    store._refreshing.cancel()
+
+
+@pytest.mark.asyncio
+async def test_refresh_bumps_version_and_survives_cancelled_caller():
+    store, calls = _collector()
+    waiter = asyncio.create_task(store.refresh())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    snapshot = await store.refresh()
+    assert snapshot.version == 1
+    assert len(calls) == 1
+    assert (await store.refresh()).version == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_is_retried():
+    attempts = []
+
+    async def collect():
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise ConnectionError('node down')
+        return BlockProducer('bp', 1, 0, 0, 0, 0, 0, 0), Cache(), StatusContext('Synced', 1, Rotation(False))
+
+    store = SnapshotStore(collect)
+    with pytest.raises(ConnectionError):
+        await store.get()
+    assert (await store.get()).version == 1
@@ -0,0 +1,117 @@
+import time
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from sauron.alerts import AlertManager
+from sauron.service import get_config
+from sauron.subscriptions import Fanout, RateLimiter, SubscriptionRegistry
+from sauron.types import Alert, Subscription, View
+from sauron.utils import get_alerts_view_message
+
+
+def _at(hour, day=1):
+    return datetime(2026, 1, day, hour, 30, tzinfo=timezone.utc).timestamp()
+
+
+def test_chats_with_equal_views_share_a_group():
+    registry = SubscriptionRegistry([
+        Subscription('ops'),
+        Subscription('oncall-a', 'alerts', users='@a', metrics='nodeos, missed_blocks'),
+        Subscription('oncall-b', 'alerts', users='@a', metrics='nodeos,missed_blocks'),
+        Subscription('mgmt', 'daily', daily_at=8, metrics='ignored'),
+    ])
+    assert registry.groups == {
+        View('full'): ['ops'],
+        View('alerts', ('nodeos', 'missed_blocks'), ('@a',)): ['oncall-a', 'oncall-b'],
+        View('daily', daily_at=8): ['mgmt'],
+    }
+
+
+def test_daily_view_is_due_once_a_day():
+    registry = SubscriptionRegistry([Subscription('ops'), Subscription('mgmt', 'daily', daily_at=8)])
+    assert list(registry.due(_at(7))) == [View('full')]
+    assert View('daily', daily_at=8) in registry.due(_at(8))
+    assert View('daily', daily_at=8) not in registry.due(_at(8) + 60)
+    assert View('daily', daily_at=8) in registry.due(_at(8, day=2))
+
+
+def test_invalid_subscriptions():
+    with pytest.raises(ValueError):
+        SubscriptionRegistry([Subscription('ops', 'weekly')])
+    with pytest.raises(ValueError):
+        SubscriptionRegistry([Subscription('ops', 'daily', daily_at=24)])
+
+
+def test_chat_sections_are_parsed(tmp_path):
+    path = tmp_path / 'config.ini'
+    path.write_text('''[config]
+abi_path = ./eosio.abi
+bot_token = 726_ck
+chat_id = -1042
+claimer_permission = claimer
+claimer_private_key = 5JBk
+location = 2001
+node_url = https://testnet.telos.net
+local_node_url = http://127.0.0.1:8888
+producer_name = openrepublic
+producer_url = https://openrepublic.net
+producer_public_key = EOS5zxgsnHa27u
+register_permission = register
+register_private_key = 5HwdBtW
+users_alerted = @gollum
+
+[chat.oncall]
+chat_id = 42
+view = alerts
+daily_at = 7
+''')
+    config = get_config(str(path))
+    assert config.chats == {'oncall': Subscription('42', 'alerts', daily_at=7)}
+    assert SubscriptionRegistry.from_config(config).groups == {View('alerts'): ['42']}
+
+
+def test_alerts_view_only_sends_selected_keys():
+    manager = AlertManager(['@ops'])
+    view = View('alerts', ('nodeos',), ('@oncall',))
+    manager.update([Alert('cpu', 'limit', 95, 1.2, 'cpu high')], now=0)
+    assert get_alerts_view_message(view, manager) is None
+    assert get_alerts_view_message(View('alerts'), manager).endswith('@ops\n')
+
+    manager.update([
+        Alert('cpu', 'limit', 95, 1.2, 'cpu high'),
+        Alert('nodeos', 'state', 0, 1, 'nodeos is NOT running.'),
+    ], now=60)
+    msg = get_alerts_view_message(view, manager)
+    assert 'nodeos is NOT running.' in msg
+    assert 'cpu high' not in msg
+    assert msg.endswith('@oncall\n')
+
+
+@pytest.mark.asyncio
+async def test_fanout_is_concurrent_and_ordered_per_chat():
+    received = []
+
+    async def _send(chat_id, text):
+        if chat_id == 'broken':
+            raise ConnectionError('blocked by user')
+        await asyncio.sleep(0.05)
+        received.append((chat_id, text))
+
+    fanout = Fanout(_send, rate=1000, chat_interval=0.01, concurrency=20)
+    messages = [(f'chat{i}', 'status') for i in range(20)]
+    messages += [('broken', 'status'), ('chat0', 'second')]
+    start = time.perf_counter()
+    assert await fanout.deliver(messages) == 21
+    assert time.perf_counter() - start < 0.5
+    assert [text for chat_id, text in received if chat_id == 'chat0'] == ['status', 'second']
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_spaces_acquisitions():
+    limiter = RateLimiter(rate=50, burst=1)
+    start = time.perf_counter()
+    for _ in range(6):
+        await limiter.acquire()
+    assert time.perf_counter() - start >= 0.09
@@ -0,0 +1,124 @@
+import time
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from sauron.transactions import (
+    TaposCache, TransactionPipeline, build_actions, first_success,
+    get_push_endpoints
+)
+from sauron.types import Config
+
+
+@pytest.fixture
+def mock_config():
+    return Config(**{
+        'abi_path': './eosio.abi',
+        'bot_token': '726_ck',
+        'chat_id': '-1042',
+        'claimer_permission': 'claimer',
+        'claimer_private_key': '5JBk',
+        'location': '2001',
+        'node_url': 'https://testnet.telos.net',
+        'local_node_url': 'http://127.0.0.1:8888',
+        'producer_name': 'openrepublic',
+        'producer_url': 'https://openrepublic.net',
+        'producer_public_key': 'EOS5zxgsnHa27u...',
+        'register_permission': 'register',
+        'register_private_key': '5HwdBtW',
+        'users_alerted': '@gollum',
+    })
+
+
+def test_build_actions(mock_config):
+    actions = build_actions(mock_config)
+    assert actions['regproducer'].data == [
+        'openrepublic', 'EOS5zxgsnHa27u...', 'https://openrepublic.net', 2001]
+    assert actions['unregprod'].permission == 'register'
+    assert actions['claimrewards'].key == '5JBk'
+
+
+def test_build_actions_validates(mock_config):
+    mock_config.producer_name = 'OpenRepublic'
+    with pytest.raises(ValueError):
+        build_actions(mock_config)
+
+
+def test_get_push_endpoints(mock_config):
+    assert get_push_endpoints(mock_config) == [
+        'https://testnet.telos.net', 'http://127.0.0.1:8888']
+    mock_config.push_endpoints = 'http://a, http://b,http://a'
+    assert get_push_endpoints(mock_config) == ['http://a', 'http://b']
+
+
+@pytest.mark.asyncio
+async def test_first_success():
+    async def _fail():
+        raise ValueError('down')
+
+    async def _slow():
+        await asyncio.sleep(1)
+        return 'slow'
+
+    async def _fast():
+        await asyncio.sleep(0.01)
+        return 'fast'
+
+    assert await first_success([_fail(), _slow(), _fast()]) == 'fast'
+    with pytest.raises(ValueError):
+        await first_success([_fail(), _fail()])
+    with pytest.raises(ValueError, match='No endpoints'):
+        await first_success([])
+
+
+@pytest.mark.asyncio
+@patch('sauron.transactions.get_tapos_info', return_value=(1, 2))
+async def test_tapos_cache(mock_tapos):
+    client = MagicMock()
+    client.get_info.return_value = {'last_irreversible_block_id': 'abcd'}
+    tapos = TaposCache([client])
+    assert await tapos.get() == (1, 2)
+    assert await tapos.get() == (1, 2)
+    assert client.get_info.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_pipeline_first_endpoint_wins(mock_config):
+    mock_config.push_endpoints = 'http://slow,http://down,http://fast'
+    pipeline = TransactionPipeline.from_config(mock_config)
+    pipeline.tapos.ref_block_num, pipeline.tapos.ref_block_prefix = 1, 2
+    pipeline.tapos.updated_at = time.monotonic()
+
+    def _slow(**kwargs):
+        time.sleep(0.2)
+        return {'transaction_id': 'slow'}
+
+    pipeline.clients['http://slow'].push_action = MagicMock(side_effect=_slow)
+    pipeline.clients['http://down'].push_action = MagicMock(side_effect=ConnectionError)
+    pipeline.clients['http://fast'].push_action = MagicMock(
+        return_value={'transaction_id': 'fast'})
+
+    res = await pipeline.push('unregprod')
+    assert res.transaction_id == 'fast'
+    assert res.endpoint == 'http://fast'
+    assert res.latency_ms >= 0
+    kwargs = pipeline.clients['http://fast'].push_action.call_args.kwargs
+    assert kwargs['action'] == 'unregprod'
+    assert kwargs['ref_block_num'] == 1
+
+
+@patch('sauron.transactions.CLEOS')
+def test_pipeline_clients_get_the_abi(mock_cleos, mock_config):
+    mock_cleos.side_effect = lambda endpoint: MagicMock(name=endpoint)
+    pipeline = TransactionPipeline.from_config(mock_config)
+    abi = {'version': 'eosio::abi/1.1'}
+    pipeline.load_abi('eosio', abi)
+    for client in pipeline.clients.values():
+        client.cleos.load_abi.assert_called_once_with('eosio', abi)
+
+    # endpoints added by a reload start with the abi loaded
+    mock_config.push_endpoints = 'https://testnet.telos.net,http://backup'
+    pipeline.reconfigure(mock_config)
+    pipeline.clients['http://backup'].cleos.load_abi.assert_called_once_with('eosio', abi)
+    pipeline.clients['https://testnet.telos.net'].cleos.load_abi.assert_called_once_with('eosio', abi)
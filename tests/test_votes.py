@@ -0,0 +1,77 @@
+from sauron.types import ProducerVotes
+from sauron.votes import VoteTracker, vote_weight
+
+
+def _rows(votes: dict):
+    return [ProducerVotes(owner, value) for owner, value in votes.items()]
+
+
+def _table(**overrides):
+    # bp01 has the most votes, bp30 the least
+    votes = {f'bp{i:02d}': (31 - i) * 1_000_000_000.0 for i in range(1, 31)}
+    votes.update(overrides)
+    return votes
+
+
+def test_vote_weight():
+    assert vote_weight('100000.00000000000000000') == 10
+    assert vote_weight('0.00000000000000000') == 0
+
+
+def test_first_snapshot_has_no_moves():
+    tracker = VoteTracker('bp05')
+    diff = tracker.update(_rows(_table()), now=0)
+    assert diff.moves == []
+    assert diff.entered_top21 == []
+    assert diff.rank == 5
+    assert diff.challenger == 'bp22'
+
+
+def test_rank_moves_and_schedule_changes():
+    tracker = VoteTracker('bp05')
+    tracker.update(_rows(_table()), now=0)
+    votes = _table(bp22=20_500_000_000.0)
+    del votes['bp30']
+    diff = tracker.update(_rows(votes), now=60)
+    assert diff.elapsed_s == 60
+    assert [(move.owner, move.old_rank, move.new_rank) for move in diff.moves] == [
+        ('bp22', 22, 11), *[(f'bp{i:02d}', i, i + 1) for i in range(11, 22)], ('bp30', 30, 0)]
+    assert diff.entered_top21 == ['bp22']
+    assert diff.left_top21 == ['bp21']
+    assert diff.left_top42 == ['bp30']
+
+
+def test_about_to_fall_off_schedule():
+    tracker = VoteTracker('bp21', warn_hours=6, warn_margin=0.1)
+    tracker.update(_rows(_table()), now=0)
+    assert tracker.last_diff.alerts == []
+    # bp22 gains half the gap in one hour, we keep our votes
+    diff = tracker.update(_rows(_table(bp22=9_500_000_000.0)), now=3600)
+    assert diff.eta_s == 3600
+    assert diff.alerts[0].metric == 'schedule'
+    assert diff.alerts[0].score == 6
+    assert 'bp22 overtakes' in diff.alerts[0].reason
+
+
+def test_fell_off_schedule():
+    tracker = VoteTracker('bp21', warn_margin=0)
+    tracker.update(_rows(_table()), now=0)
+    diff = tracker.update(_rows(_table(bp22=10_500_000_000.0)), now=60)
+    assert diff.rank == 22
+    assert diff.alerts[0].rule == 'rank'
+    # keeps alerting while we stay out
+    diff = tracker.update(_rows(_table(bp22=10_500_000_000.0)), now=120)
+    assert diff.alerts[0].rule == 'rank'
+
+
+def test_unregistered_alerts_once():
+    tracker = VoteTracker('bp05', warn_margin=0)
+    tracker.update(_rows(_table()), now=0)
+    rows = [row if row.owner != 'bp05' else ProducerVotes('bp05', row.total_votes, False) for row in _rows(_table())]
+    diff = tracker.update(rows, now=60)
+    assert diff.rank == 0
+    assert diff.alerts[0].rule == 'rank'
+    assert tracker.update(rows, now=120).alerts == []
+    # registering again arms the alert again
+    tracker.update(_rows(_table()), now=180)
+    assert tracker.update(rows, now=240).alerts[0].rule == 'rank'
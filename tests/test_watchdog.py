@@ -0,0 +1,51 @@
+import time
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from sauron.utils import get_perf_message
+from sauron.watchdog import LoopWatchdog
+
+
+def blocking_call(seconds):
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_stall_is_caught_with_its_stack():
+    watchdog = LoopWatchdog(threshold=0.15, interval=0.02)
+    task = asyncio.create_task(watchdog.run())
+    try:
+        await asyncio.sleep(0.2)
+        assert watchdog.stall_count == 0
+        with patch('sauron.watchdog.logger') as log:
+            blocking_call(0.4)
+            await asyncio.sleep(0.1)
+
+        health = watchdog.report()
+        assert health.stalls == 1
+        stall = health.recent[0]
+        assert stall.lag_ms >= 300
+        assert 'blocking_call' in stall.stack[-1]
+        assert health.lag_max_ms == pytest.approx(stall.lag_ms, abs=1)
+        assert health.lag_p50_ms < 150
+        assert 'blocking_call' in log.warning.call_args.args[0] % log.warning.call_args.args[1:]
+        assert log.warning.call_args.kwargs['extra']['stack'] == stall.stack
+
+        msg = get_perf_message(health)
+        assert 'blocked' in msg and 'time.sleep(seconds)' in msg
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    assert watchdog.stopped.is_set()
+
+
+def test_short_lags_are_not_stalls():
+    watchdog = LoopWatchdog(threshold=0.25)
+    for lag in (0.001, 0.01, 0.2, -0.001):
+        watchdog.record(lag, now=0)
+    health = watchdog.report()
+    assert (health.samples, health.stalls, health.lag_max_ms) == (4, 0, 200)
+    watchdog.record(0.5, now=0)
+    assert watchdog.report().recent[0].stack == []
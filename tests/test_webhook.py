@@ -0,0 +1,97 @@
+import json
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from telebot.async_telebot import AsyncTeleBot
+
+from sauron.webhook import WebhookServer, SECRET_HEADER
+
+
+# A recorded `/s` update as sent by Telegram
+RECORDED_UPDATE = {
+    'update_id': 10001,
+    'message': {
+        'message_id': 42,
+        'date': 1700000000,
+        'chat': {'id': -1042, 'type': 'group', 'title': 'ops'},
+        'from': {'id': 7, 'is_bot': False, 'first_name': 'Gollum', 'username': 'gollum'},
+        'text': '/s',
+        'entities': [{'offset': 0, 'length': 2, 'type': 'bot_command'}]
+    }
+}
+
+
+@pytest.fixture
+def bot():
+    bot = AsyncTeleBot('726:ck')
+    bot.received = []
+
+    @bot.message_handler(commands=['s'])
+    async def request_producer_status(message):
+        bot.received.append(message.text)
+
+    return bot
+
+
+async def _client(server: WebhookServer):
+    client = TestClient(TestServer(server.app()))
+    await client.start_server()
+    return client
+
+
+@pytest.mark.asyncio
+async def test_webhook_dispatches_to_handlers(bot):
+    client = await _client(WebhookServer(bot, 'secret'))
+    try:
+        res = await client.post(
+            '/telegram',
+            data=json.dumps(RECORDED_UPDATE),
+            headers={SECRET_HEADER: 'secret'})
+        assert res.status == 200
+        for _ in range(50):
+            if bot.received:
+                break
+            await asyncio.sleep(0.01)
+        assert bot.received == ['/s']
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_bad_secret(bot):
+    client = await _client(WebhookServer(bot, 'secret'))
+    try:
+        res = await client.post(
+            '/telegram',
+            data=json.dumps(RECORDED_UPDATE),
+            headers={SECRET_HEADER: 'nope'})
+        assert res.status == 401
+        res = await client.post('/telegram', data=json.dumps(RECORDED_UPDATE))
+        assert res.status == 401
+    finally:
+        await client.close()
+
+    # a server without a secret accepts nothing
+    client = await _client(WebhookServer(bot, None))
+    try:
+        res = await client.post('/telegram', data=json.dumps(RECORDED_UPDATE))
+        assert res.status == 401
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_webhook_backpressure(bot):
+    server = WebhookServer(bot, 'secret', workers=0, queue_size=1)
+    client = await _client(server)
+    headers = {SECRET_HEADER: 'secret'}
+    try:
+        res = await client.post('/telegram', data=json.dumps(RECORDED_UPDATE), headers=headers)
+        assert res.status == 200
+        res = await client.post('/telegram', data=json.dumps(RECORDED_UPDATE), headers=headers)
+        assert res.status == 503
+        res = await client.post('/telegram', data='not json', headers=headers)
+        assert res.status == 400
+    finally:
+        await client.close()